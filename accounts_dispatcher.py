@@ -0,0 +1,109 @@
+"""
+Módulo de disparo conjunto de contas a receber e contas a pagar
+Busca as duas listas em uma única consulta e envia as duas mensagens no mesmo processo
+"""
+import logging
+from datetime import date
+from typing import List, Dict, Tuple
+
+from clients import create_postgres_client, create_whatsapp_client
+from queries import OPEN_ACCOUNTS_BY_DUE_DATE_QUERY
+from accounts_receivable_dispatcher import AccountsReceivableDispatcher
+from accounts_payable_dispatcher import AccountsPayableDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class AccountsDispatcher:
+    """Sistema de disparo conjunto de contas a receber e a pagar"""
+    
+    def __init__(self):
+        """Inicializa o dispatcher com clientes compartilhados pelos dois relatórios"""
+        self.postgres_client = create_postgres_client()
+        self.whatsapp_client = create_whatsapp_client()
+        self.receivable_dispatcher = AccountsReceivableDispatcher(self.postgres_client, self.whatsapp_client)
+        self.payable_dispatcher = AccountsPayableDispatcher(self.postgres_client, self.whatsapp_client)
+    
+    def get_open_accounts_by_due_date(self, due_date: date) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Busca contas a receber e resumo de contas a pagar com vencimento em uma data,
+        em uma única consulta
+        
+        As contas a receber vêm linha a linha (a mensagem lista cada título); as
+        contas a pagar já vêm agregadas por empresa, com uma linha por empresa.
+        
+        Args:
+            due_date: Data de vencimento para buscar
+            
+        Returns:
+            Tupla (contas a receber, resumo de contas a pagar), nos mesmos formatos de
+            get_accounts_receivable_by_due_date e get_accounts_payable_summary_for_today
+        """
+        results = self.postgres_client.execute_prepared(
+            'open_accounts_by_due_date', OPEN_ACCOUNTS_BY_DUE_DATE_QUERY, (due_date,), row_mode='compact'
+        )
+        
+        receivables = []
+        payables_summary = []
+        for row in results:
+            if row['account_type'] == 'asset_receivable':
+                receivables.append(row)
+            else:
+                payables_summary.append({
+                    'company_name': row['company_name'],
+                    'account_count': row['account_count'],
+                    'total_amount': row['total_amount'],
+                })
+        return receivables, payables_summary
+    
+    def dispatch_today(self, force: bool = False) -> bool:
+        """
+        Busca e envia contas a receber e a pagar com vencimento para hoje
+        
+        Args:
+            force: Se True, envia mesmo que os relatórios já tenham sido enviados
+            
+        Returns:
+            True se os dois relatórios foram enviados (ou não havia o que enviar)
+        """
+        today = date.today()
+        
+        # O ledger compara o conteúdo de cada relatório, então a consulta é feita sempre;
+        # cada dispatcher ignora o envio se o seu relatório já foi entregue igual
+        try:
+            logger.info(f"Buscando contas a receber e a pagar com vencimento em {today} (consulta única)")
+            receivables, payables_summary = self.get_open_accounts_by_due_date(today)
+        except Exception as e:
+            logger.error(f"Erro ao buscar contas com vencimento em {today}: {e}", exc_info=True)
+            return False
+        
+        payables_count = sum(data['account_count'] for data in payables_summary)
+        logger.info(f"Encontradas {len(receivables)} conta(s) a receber e {payables_count} conta(s) a pagar")
+        
+        # Os dois dispatchers compartilham o outbox: reenvia as pendências uma vez só
+        self.receivable_dispatcher.drain_outbox()
+        
+        receivables_ok = self.receivable_dispatcher.send_accounts_receivable_notification(
+            today, is_today=True, force=force, accounts=receivables, drain=False
+        )
+        payables_ok = self.payable_dispatcher.send_accounts_payable_summary(
+            force=force, summary=payables_summary, drain=False
+        )
+        return receivables_ok and payables_ok
+    
+    def close(self):
+        """Fecha conexões"""
+        self.receivable_dispatcher.close()
+        self.payable_dispatcher.close()
+        if self.postgres_client:
+            self.postgres_client.close()
+        if self.whatsapp_client:
+            self.whatsapp_client.close()
+    
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
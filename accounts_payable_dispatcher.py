@@ -4,15 +4,14 @@ Dispara resumo de todas as contas a pagar com vencimento para hoje
 """
 import logging
 from datetime import date
-from typing import List, Dict
-from config import (
-    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB,
-    POSTGRES_USER, POSTGRES_PASSWORD,
-    EVOLUTION_API_URL, EVOLUTION_API_KEY, EVOLUTION_INSTANCE,
-    WHATSAPP_NUMBER
-)
+from typing import List, Dict, Optional, Iterable
+from config import settings
+from formatting import MessageBuilder, format_brl, format_date
+from outbox import split_failed_recipients
 from postgres_client import PostgresClient
+from queries import ACCOUNTS_PAYABLE_BY_DUE_DATE_QUERY, ACCOUNTS_PAYABLE_SUMMARY_BY_DUE_DATE_QUERY
 from whatsapp_client import WhatsAppClient
+from clients import create_postgres_client, create_whatsapp_client, create_async_whatsapp_client, get_outbox, get_dispatch_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -20,20 +19,22 @@ logger = logging.getLogger(__name__)
 class AccountsPayableDispatcher:
     """Sistema de disparo de contas a pagar"""
     
-    def __init__(self):
-        """Inicializa o dispatcher"""
-        self.postgres_client = PostgresClient(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD
-        )
-        self.whatsapp_client = WhatsAppClient(
-            api_url=EVOLUTION_API_URL,
-            api_key=EVOLUTION_API_KEY,
-            instance=EVOLUTION_INSTANCE
-        )
+    def __init__(self, postgres_client: PostgresClient = None, whatsapp_client: WhatsAppClient = None):
+        """
+        Inicializa o dispatcher
+        
+        Args:
+            postgres_client: Cliente PostgreSQL compartilhado (opcional; criado se não informado)
+            whatsapp_client: Cliente WhatsApp compartilhado (opcional; criado se não informado)
+        """
+        # Clientes recebidos de fora pertencem a quem os criou e não são fechados aqui
+        self._owns_postgres_client = postgres_client is None
+        self._owns_whatsapp_client = whatsapp_client is None
+        self.postgres_client = postgres_client or create_postgres_client()
+        self.whatsapp_client = whatsapp_client or create_whatsapp_client()
+        self.async_whatsapp_client = create_async_whatsapp_client(self.whatsapp_client)
+        self.outbox = get_outbox()
+        self.ledger = get_dispatch_ledger()
     
     def get_accounts_payable_for_today(self) -> List[Dict]:
         """
@@ -41,144 +42,202 @@ class AccountsPayableDispatcher:
         
         Returns:
             Lista de contas a pagar
+            
+        Raises:
+            QueryTimeoutError: Se a consulta exceder o statement timeout
+            ConnectionLostError: Se a conexão com o banco não puder ser restabelecida
         """
         today = date.today()
         
-        query = """
-            SELECT 
-                aml.id,
-                aml.move_id,
-                aml.partner_id,
-                rp.name as partner_name,
-                am.company_id,
-                rc.name as company_name,
-                aml.date_maturity,
-                aml.date,
-                aml.name as line_name,
-                aml.debit,
-                aml.credit,
-                aml.amount_residual,
-                aml.amount_residual_currency,
-                am.name as move_name,
-                am.move_type,
-                am.state as move_state,
-                am.ref as move_ref,
-                am.invoice_date
-            FROM account_move_line aml
-            INNER JOIN account_move am ON aml.move_id = am.id
-            LEFT JOIN res_partner rp ON aml.partner_id = rp.id
-            LEFT JOIN res_company rc ON am.company_id = rc.id
-            INNER JOIN account_account aa ON aml.account_id = aa.id
-            WHERE aa.account_type = 'liability_payable'
-              AND aml.date_maturity = %s
-              AND am.state = 'posted'
-              AND aml.reconciled = false
-              AND aml.credit > 0
-            ORDER BY rc.name, aml.date_maturity, rp.name, aml.name
+        try:
+            results = self.postgres_client.execute_prepared(
+                'accounts_payable_for_today', ACCOUNTS_PAYABLE_BY_DUE_DATE_QUERY, (today,), row_mode='compact'
+            )
+            return results
+        except Exception as e:
+            logger.error(f"Erro ao buscar contas a pagar para hoje: {e}")
+            raise
+    
+    def get_accounts_payable_summary_for_today(self) -> List[Dict]:
+        """
+        Busca o resumo por empresa das contas a pagar com vencimento para hoje
+        
+        A agregação é feita no banco: apenas uma linha por empresa trafega pela
+        rede, em vez de todas as linhas de lançamento. A listagem detalhada de
+        get_accounts_payable_for_today fica reservada para relatórios de detalhe.
+        
+        Returns:
+            Lista de dicts com company_name, account_count e total_amount,
+            ordenada pelo valor total (maior primeiro) e pelo nome da empresa
+            
+        Raises:
+            QueryTimeoutError: Se a consulta exceder o statement timeout
+            ConnectionLostError: Se a conexão com o banco não puder ser restabelecida
         """
+        today = date.today()
         
         try:
-            results = self.postgres_client.execute_query(query, (today,))
+            results = self.postgres_client.execute_prepared(
+                'accounts_payable_summary_for_today', ACCOUNTS_PAYABLE_SUMMARY_BY_DUE_DATE_QUERY, (today,), row_mode='compact'
+            )
             return results
         except Exception as e:
-            logger.error(f"Erro ao buscar contas a pagar para hoje: {e}")
-            return []
+            logger.error(f"Erro ao buscar resumo de contas a pagar para hoje: {e}")
+            raise
     
-    def format_accounts_payable_message(self, accounts: List[Dict]) -> str:
+    def summarize_accounts_payable(self, accounts: Iterable[Dict]) -> List[Dict]:
         """
-        Formata mensagem de resumo de contas a pagar agrupado por empresa
+        Agrega contas a pagar detalhadas por empresa, no mesmo formato de
+        get_accounts_payable_summary_for_today
         
         Args:
-            accounts: Lista de contas a pagar
+            accounts: Contas a pagar (linhas de get_accounts_payable_for_today,
+                em lista ou em streaming)
             
         Returns:
-            Mensagem formatada (resumo compacto por empresa)
+            Resumo por empresa
         """
-        if not accounts:
-            return None
-        
-        today = date.today()
-        data_formatada = today.strftime('%d/%m/%Y')
-        
-        # Agrupa por company (empresa do Odoo)
         by_company = {}
         for acc in accounts:
             company_name = acc.get('company_name', 'Sem empresa')
             if company_name not in by_company:
                 by_company[company_name] = {
-                    'count': 0,
-                    'total': 0,
-                    'partners': set()
+                    'company_name': company_name,
+                    'account_count': 0,
+                    'total_amount': 0
                 }
             
             amount = abs(acc.get('amount_residual') or acc.get('credit', 0))
-            by_company[company_name]['count'] += 1
-            by_company[company_name]['total'] += amount
-            partner_name = acc.get('partner_name', '')
-            if partner_name:
-                by_company[company_name]['partners'].add(partner_name)
+            by_company[company_name]['account_count'] += 1
+            by_company[company_name]['total_amount'] += amount
+        
+        return list(by_company.values())
+    
+    def format_accounts_payable_message(self, accounts: Iterable[Dict]) -> str:
+        """
+        Formata mensagem de resumo de contas a pagar a partir das contas detalhadas
         
-        # Calcula total geral
-        total_geral = sum(data['total'] for data in by_company.values())
-        total_str = f"R$ {total_geral:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        Args:
+            accounts: Contas a pagar (lista ou iterável, lido em uma única passada)
+            
+        Returns:
+            Mensagem formatada (resumo compacto por empresa)
+        """
+        return self.format_accounts_payable_summary_message(self.summarize_accounts_payable(accounts))
+    
+    def format_accounts_payable_summary_message(self, summary: List[Dict]) -> str:
+        """
+        Formata mensagem de resumo de contas a pagar agrupado por empresa
+        
+        Args:
+            summary: Resumo por empresa (ver get_accounts_payable_summary_for_today)
+            
+        Returns:
+            Mensagem formatada (resumo compacto por empresa)
+        """
+        if not summary:
+            return None
+        
+        today = date.today()
+        data_formatada = format_date(today)
+        
+        # Calcula totais gerais
+        total_contas = sum(data['account_count'] for data in summary)
+        total_geral = sum(data['total_amount'] or 0 for data in summary)
+        total_str = format_brl(total_geral)
         
-        # Ordena empresas por valor total (maior primeiro)
+        # Ordena empresas por valor total (maior primeiro) e, no empate, pelo nome
         sorted_companies = sorted(
-            by_company.items(),
-            key=lambda x: x[1]['total'],
-            reverse=True
+            summary,
+            key=lambda x: (-(x['total_amount'] or 0), x['company_name'] or '')
         )
         
         # Monta mensagem resumida
-        message = f"💰 *Contas a Pagar - Hoje*\n"
-        message += f"📅 {data_formatada}\n"
-        message += f"📊 {len(accounts)} conta(s) | {len(by_company)} empresa(s)\n"
-        message += f"💵 Total: {total_str}\n\n"
+        message = MessageBuilder()
+        message.line(f"💰 *Contas a Pagar - Hoje*")
+        message.line(f"📅 {data_formatada}")
+        message.line(f"📊 {total_contas} conta(s) | {len(summary)} empresa(s)")
+        message.line(f"💵 Total: {total_str}")
+        message.line()
         
-        message += "*Resumo por Empresa:*\n"
+        message.line("*Resumo por Empresa:*")
         
-        for company_name, data in sorted_companies:
-            company_total_str = f"R$ {data['total']:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-            message += f"• *{company_name}*: {company_total_str} ({data['count']} conta(s))\n"
+        for data in sorted_companies:
+            company_total_str = format_brl(data['total_amount'])
+            message.line(f"• *{data['company_name']}*: {company_total_str} ({data['account_count']} conta(s))")
         
-        message += f"\n⚠️ Total: {total_str}"
+        message.add(f"\n⚠️ Total: {total_str}")
         
-        return message
+        return message.build()
     
-    def send_accounts_payable_summary(self) -> bool:
+    def send_accounts_payable_summary(self, force: bool = False, summary: Optional[List[Dict]] = None,
+                                      drain: bool = True) -> bool:
         """
         Busca e envia resumo de contas a pagar para hoje
         
+        Args:
+            force: Se True, envia mesmo que o relatório já tenha sido enviado
+            summary: Resumo por empresa já buscado (opcional); se informado, não consulta o banco
+            drain: Se True, reenvia antes as mensagens pendentes do outbox
+        
         Returns:
             True se enviou com sucesso, False caso contrário
         """
         try:
-            logger.info("Buscando contas a pagar para hoje")
+            # Reenvia mensagens que falharam em execuções anteriores
+            if drain:
+                self.drain_outbox()
+            
+            report_type = 'payables'
+            today = date.today()
             
-            # Busca contas
-            accounts = self.get_accounts_payable_for_today()
+            # Busca o resumo agregado no banco (a menos que já tenha vindo da consulta conjunta)
+            if summary is None:
+                logger.info("Buscando resumo de contas a pagar para hoje")
+                summary = self.get_accounts_payable_summary_for_today()
             
-            if not accounts:
+            if not summary:
                 logger.info("Nenhuma conta a pagar encontrada para hoje")
                 return True  # Não é erro, apenas não há contas
             
-            logger.info(f"Encontradas {len(accounts)} conta(s) a pagar para hoje")
+            total_contas = sum(data['account_count'] for data in summary)
+            logger.info(f"Encontradas {total_contas} conta(s) a pagar para hoje em {len(summary)} empresa(s)")
             
             # Formata mensagem
-            message = self.format_accounts_payable_message(accounts)
+            message = self.format_accounts_payable_summary_message(summary)
             
             if not message:
                 logger.warning("Mensagem vazia, não enviando notificação")
                 return False
             
+            # Reexecução do agendador: se este mesmo resumo já foi entregue, não reenvia
+            if not force and self.ledger.already_dispatched(report_type, today, settings.WHATSAPP_RECIPIENTS, message):
+                logger.info("Resumo de contas a pagar de hoje já enviado com este conteúdo; nada a fazer (use --force para reenviar)")
+                return True
+            
             # Envia mensagem
-            if not WHATSAPP_NUMBER:
+            if not settings.WHATSAPP_RECIPIENTS:
                 logger.warning("WHATSAPP_NUMBER não configurado. Mensagem não enviada.")
                 logger.info(f"Mensagem que seria enviada:\n{message}")
                 return False
             
-            logger.info(f"Enviando resumo de contas a pagar para {WHATSAPP_NUMBER}")
-            self.whatsapp_client.send_message(WHATSAPP_NUMBER, message)
+            logger.info(f"Enviando resumo de contas a pagar para {', '.join(settings.WHATSAPP_RECIPIENTS)}")
+            batch = self.outbox.deliver(
+                self.async_whatsapp_client, report_type, message, settings.WHATSAPP_RECIPIENTS, force=force
+            )
+            
+            # Registra quem recebeu, inclusive em falha parcial, para não duplicar na reexecução
+            failed = {r['number'] for r in batch.failures}
+            delivered = [number for number in settings.WHATSAPP_RECIPIENTS if number not in failed]
+            self.ledger.record(report_type, today, delivered, message)
+            
+            if not batch.ok:
+                pending, discarded = split_failed_recipients(batch)
+                if pending:
+                    logger.error(f"Falha no envio para {len(pending)} de {len(settings.WHATSAPP_RECIPIENTS)} destinatário(s): {', '.join(pending)}. Mensagem mantida no outbox para reenvio")
+                if discarded:
+                    logger.error(f"Mensagem descartada no outbox para {len(discarded)} destinatário(s): {', '.join(discarded)}. Não haverá reenvio automático; use --force para reenviar")
+                return False
             
             logger.info("Resumo de contas a pagar enviado com sucesso")
             return True
@@ -187,10 +246,21 @@ class AccountsPayableDispatcher:
             logger.error(f"Erro ao enviar resumo de contas a pagar: {e}", exc_info=True)
             return False
     
+    def drain_outbox(self):
+        """Reenvia as mensagens pendentes do outbox sem interromper o disparo atual"""
+        try:
+            self.outbox.drain(self.async_whatsapp_client)
+        except Exception as e:
+            logger.error(f"Erro ao reenviar mensagens pendentes do outbox: {e}")
+    
     def close(self):
         """Fecha conexões"""
-        if self.postgres_client:
+        if self.postgres_client and self._owns_postgres_client:
             self.postgres_client.close()
+        if self.async_whatsapp_client:
+            self.async_whatsapp_client.close()
+        if self.whatsapp_client and self._owns_whatsapp_client:
+            self.whatsapp_client.close()
     
     def __enter__(self):
         """Context manager entry"""
@@ -4,16 +4,18 @@ Dispara notificações de contas a receber com vencimento próximo
 """
 import logging
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable
 
-from config import (
-    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB,
-    POSTGRES_USER, POSTGRES_PASSWORD,
-    EVOLUTION_API_URL, EVOLUTION_API_KEY, EVOLUTION_INSTANCE,
-    WHATSAPP_NUMBER
-)
-from postgres_client import PostgresClient
+from config import settings
+from formatting import MessageBuilder, format_brl, format_date
+from outbox import split_failed_recipients
+from postgres_client import PostgresClient, RowStream
+from queries import ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY
 from whatsapp_client import WhatsAppClient
+from clients import (
+    create_postgres_client, create_whatsapp_client, create_async_whatsapp_client, create_message_segmenter,
+    get_outbox, get_dispatch_ledger
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,20 +23,23 @@ logger = logging.getLogger(__name__)
 class AccountsReceivableDispatcher:
     """Sistema de disparo de contas a receber"""
     
-    def __init__(self):
-        """Inicializa o dispatcher"""
-        self.postgres_client = PostgresClient(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD
-        )
-        self.whatsapp_client = WhatsAppClient(
-            api_url=EVOLUTION_API_URL,
-            api_key=EVOLUTION_API_KEY,
-            instance=EVOLUTION_INSTANCE
-        )
+    def __init__(self, postgres_client: PostgresClient = None, whatsapp_client: WhatsAppClient = None):
+        """
+        Inicializa o dispatcher
+        
+        Args:
+            postgres_client: Cliente PostgreSQL compartilhado (opcional; criado se não informado)
+            whatsapp_client: Cliente WhatsApp compartilhado (opcional; criado se não informado)
+        """
+        # Clientes recebidos de fora pertencem a quem os criou e não são fechados aqui
+        self._owns_postgres_client = postgres_client is None
+        self._owns_whatsapp_client = whatsapp_client is None
+        self.postgres_client = postgres_client or create_postgres_client()
+        self.whatsapp_client = whatsapp_client or create_whatsapp_client()
+        self.async_whatsapp_client = create_async_whatsapp_client(self.whatsapp_client)
+        self.outbox = get_outbox()
+        self.ledger = get_dispatch_ledger()
+        self.segmenter = create_message_segmenter()
     
     def get_accounts_receivable_by_due_date(self, due_date: date) -> List[Dict]:
         """
@@ -45,137 +50,203 @@ class AccountsReceivableDispatcher:
             
         Returns:
             Lista de contas a receber
+            
+        Raises:
+            QueryTimeoutError: Se a consulta exceder o statement timeout
+            ConnectionLostError: Se a conexão com o banco não puder ser restabelecida
         """
-        query = """
-            SELECT 
-                aml.id,
-                aml.move_id,
-                aml.partner_id,
-                rp.name as partner_name,
-                aml.date_maturity,
-                aml.date,
-                aml.name as line_name,
-                aml.debit,
-                aml.credit,
-                aml.amount_residual,
-                aml.amount_residual_currency,
-                am.name as move_name,
-                am.move_type,
-                am.state as move_state,
-                am.ref as move_ref,
-                am.invoice_date
-            FROM account_move_line aml
-            INNER JOIN account_move am ON aml.move_id = am.id
-            LEFT JOIN res_partner rp ON aml.partner_id = rp.id
-            INNER JOIN account_account aa ON aml.account_id = aa.id
-            WHERE aa.account_type = 'asset_receivable'
-              AND aml.date_maturity = %s
-              AND am.state = 'posted'
-              AND aml.reconciled = false
-              AND aml.debit > 0
-            ORDER BY aml.date_maturity, rp.name, aml.name
-        """
-        
         try:
-            results = self.postgres_client.execute_query(query, (due_date,))
+            results = self.postgres_client.execute_prepared(
+                'accounts_receivable_by_due_date', ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY, (due_date,), row_mode='compact'
+            )
             return results
         except Exception as e:
             logger.error(f"Erro ao buscar contas a receber para vencimento {due_date}: {e}")
-            return []
+            raise
     
-    def format_accounts_receivable_message(self, accounts: List[Dict], due_date: date, is_today: bool = True) -> str:
+    def stream_accounts_receivable_by_due_date(self, due_date: date) -> RowStream:
         """
-        Formata mensagem de contas a receber
+        Busca contas a receber com vencimento em uma data, linha a linha
+        
+        Usa cursor do lado do servidor: a memória não cresce com o número de
+        contas. Erros de banco são levantados durante a iteração.
+        
+        Args:
+            due_date: Data de vencimento para buscar
+            
+        Returns:
+            RowStream com as contas a receber
+        """
+        return self.postgres_client.stream_query(ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY, (due_date,), row_mode='compact')
+    
+    def format_accounts_receivable_blocks(self, accounts: Iterable[Dict], due_date: date,
+                                          is_today: bool = True) -> Optional[List[str]]:
+        """
+        Formata a mensagem de contas a receber em blocos: cabeçalho, um bloco por conta e rodapé
+        
+        As contas são lidas em uma única passada, então aceita tanto uma lista
+        quanto o RowStream de stream_accounts_receivable_by_due_date. Os blocos
+        são os pontos em que a mensagem pode ser dividida (ver MessageSegmenter).
         
         Args:
-            accounts: Lista de contas a receber
+            accounts: Contas a receber (lista ou iterável)
             due_date: Data de vencimento
             is_today: Se True, vencimento é hoje; se False, é amanhã
             
         Returns:
-            Mensagem formatada
+            Blocos da mensagem, na ordem (None se não houver contas)
         """
-        if not accounts:
-            return None
-        
         data_text = "hoje" if is_today else "amanhã"
-        data_formatada = due_date.strftime('%d/%m/%Y')
-        
-        # Calcula total
-        total = sum(
-            (acc.get('amount_residual') or acc.get('debit', 0)) 
-            for acc in accounts
-        )
-        
-        # Formata valor
-        total_str = f"R$ {total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        
-        # Monta mensagem
-        message = f"📋 *Contas a Receber - Vencimento {data_text.upper()}*\n"
-        message += f"📅 Data: {data_formatada}\n"
-        message += f"💰 Total: {total_str}\n"
-        message += f"📊 Quantidade: {len(accounts)} conta(s)\n\n"
-        
-        message += "*Detalhes:*\n"
-        message += "─" * 30 + "\n"
+        data_formatada = format_date(due_date)
         
+        # Detalhes, total e quantidade são acumulados na mesma passada
+        details = []
+        total = 0
+        count = 0
         for idx, acc in enumerate(accounts, 1):
             partner = acc.get('partner_name', 'N/A')
             move_name = acc.get('move_name', acc.get('line_name', 'N/A'))
             amount = acc.get('amount_residual') or acc.get('debit', 0)
-            amount_str = f"R$ {amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            amount_str = format_brl(amount)
+            total += amount
+            count = idx
             
             # Referência se houver
             ref = acc.get('move_ref', '')
             ref_text = f" ({ref})" if ref else ""
             
-            message += f"{idx}. *{partner}*\n"
-            message += f"   Doc: {move_name}{ref_text}\n"
-            message += f"   Valor: {amount_str}\n\n"
+            details.append(
+                f"{idx}. *{partner}*\n"
+                f"   Doc: {move_name}{ref_text}\n"
+                f"   Valor: {amount_str}\n\n"
+            )
+        
+        if not count:
+            return None
+        
+        # Formata valor
+        total_str = format_brl(total)
         
-        message += "─" * 30 + "\n"
-        message += f"⚠️ Total a receber {data_text}: {total_str}"
+        # Monta mensagem
+        header = MessageBuilder()
+        header.line(f"📋 *Contas a Receber - Vencimento {data_text.upper()}*")
+        header.line(f"📅 Data: {data_formatada}")
+        header.line(f"💰 Total: {total_str}")
+        header.line(f"📊 Quantidade: {count} conta(s)")
+        header.line()
+        
+        header.line("*Detalhes:*")
+        header.line("─" * 30)
+        
+        footer = MessageBuilder()
+        footer.line("─" * 30)
+        footer.add(f"⚠️ Total a receber {data_text}: {total_str}")
+        
+        return [header.build(), *details, footer.build()]
+    
+    def format_accounts_receivable_message(self, accounts: Iterable[Dict], due_date: date, is_today: bool = True) -> str:
+        """
+        Formata mensagem de contas a receber
+        
+        Args:
+            accounts: Contas a receber (lista ou iterável)
+            due_date: Data de vencimento
+            is_today: Se True, vencimento é hoje; se False, é amanhã
+        
+        Returns:
+            Mensagem formatada, sem limite de tamanho (None se não houver contas)
+        """
+        blocks = self.format_accounts_receivable_blocks(accounts, due_date, is_today)
+        return ''.join(blocks) if blocks else None
+    
+    def format_accounts_receivable_parts(self, accounts: Iterable[Dict], due_date: date,
+                                         is_today: bool = True) -> Optional[List[str]]:
+        """
+        Formata mensagem de contas a receber dividida no limite de tamanho do WhatsApp
         
-        return message
+        Args:
+            accounts: Contas a receber (lista ou iterável)
+            due_date: Data de vencimento
+            is_today: Se True, vencimento é hoje; se False, é amanhã
+        
+        Returns:
+            Partes da mensagem, na ordem de envio (uma só se couber no limite;
+            None se não houver contas)
+        """
+        blocks = self.format_accounts_receivable_blocks(accounts, due_date, is_today)
+        return self.segmenter.split(blocks) if blocks else None
     
-    def send_accounts_receivable_notification(self, due_date: date, is_today: bool = True) -> bool:
+    def send_accounts_receivable_notification(self, due_date: date, is_today: bool = True, force: bool = False,
+                                              accounts: Optional[List[Dict]] = None, drain: bool = True) -> bool:
         """
         Busca e envia notificação de contas a receber
         
         Args:
             due_date: Data de vencimento
             is_today: Se True, vencimento é hoje; se False, é amanhã
+            force: Se True, envia mesmo que o relatório já tenha sido enviado
+            accounts: Contas já buscadas (opcional; ex.: pela consulta conjunta de
+                AccountsDispatcher); se informadas, não consulta o banco
+            drain: Se True, reenvia antes as mensagens pendentes do outbox
             
         Returns:
             True se enviou com sucesso, False caso contrário
         """
         try:
-            logger.info(f"Buscando contas a receber com vencimento em {due_date}")
+            # Reenvia mensagens que falharam em execuções anteriores
+            if drain:
+                self.drain_outbox()
+            
+            report_type = 'receivables_today' if is_today else 'receivables_tomorrow'
+            
+            # Busca contas em streaming (a menos que já tenham sido buscadas na consulta conjunta)
+            if accounts is None:
+                logger.info(f"Buscando contas a receber com vencimento em {due_date}")
+                rows = self.stream_accounts_receivable_by_due_date(due_date)
+            else:
+                rows = RowStream(accounts)
             
-            # Busca contas
-            accounts = self.get_accounts_receivable_by_due_date(due_date)
+            # Formata mensagem consumindo as linhas conforme chegam do banco
+            with rows:
+                parts = self.format_accounts_receivable_parts(rows, due_date, is_today)
             
-            if not accounts:
+            if not parts:
                 logger.info(f"Nenhuma conta a receber encontrada com vencimento em {due_date}")
                 return True  # Não é erro, apenas não há contas
             
-            logger.info(f"Encontradas {len(accounts)} conta(s) a receber com vencimento em {due_date}")
+            logger.info(f"Encontradas {rows.count} conta(s) a receber com vencimento em {due_date}")
+            message = ''.join(parts)
             
-            # Formata mensagem
-            message = self.format_accounts_receivable_message(accounts, due_date, is_today)
-            
-            if not message:
-                logger.warning("Mensagem vazia, não enviando notificação")
-                return False
+            # Reexecução do agendador: se este mesmo relatório já foi entregue, não reenvia
+            if not force and self.ledger.already_dispatched(report_type, due_date, settings.WHATSAPP_RECIPIENTS, message):
+                logger.info(f"Notificação de contas a receber com vencimento em {due_date} já enviada com este conteúdo; nada a fazer (use --force para reenviar)")
+                return True
             
             # Envia mensagem
-            if not WHATSAPP_NUMBER:
+            if not settings.WHATSAPP_RECIPIENTS:
                 logger.warning("WHATSAPP_NUMBER não configurado. Mensagem não enviada.")
-                logger.info(f"Mensagem que seria enviada:\n{message}")
+                logger.info(f"Mensagem que seria enviada:\n" + "\n\n".join(parts))
                 return False
             
-            logger.info(f"Enviando notificação de contas a receber para {WHATSAPP_NUMBER}")
-            self.whatsapp_client.send_message(WHATSAPP_NUMBER, message)
+            logger.info(f"Enviando notificação de contas a receber para {', '.join(settings.WHATSAPP_RECIPIENTS)}")
+            if len(parts) > 1:
+                logger.info(f"Mensagem dividida em {len(parts)} partes, enviadas em ordem a cada destinatário")
+            batch = self.outbox.deliver(
+                self.async_whatsapp_client, report_type, parts, settings.WHATSAPP_RECIPIENTS, force=force
+            )
+            
+            # Registra quem recebeu (todas as partes), inclusive em falha parcial, para não duplicar na reexecução
+            failed = {r['number'] for r in batch.failures}
+            delivered = [number for number in settings.WHATSAPP_RECIPIENTS if number not in failed]
+            self.ledger.record(report_type, due_date, delivered, message)
+            
+            if not batch.ok:
+                pending, discarded = split_failed_recipients(batch)
+                if pending:
+                    logger.error(f"Falha no envio para {len(pending)} de {len(settings.WHATSAPP_RECIPIENTS)} destinatário(s): {', '.join(pending)}. Mensagem mantida no outbox para reenvio")
+                if discarded:
+                    logger.error(f"Mensagem descartada no outbox para {len(discarded)} destinatário(s): {', '.join(discarded)}. Não haverá reenvio automático; use --force para reenviar")
+                return False
             
             logger.info("Notificação enviada com sucesso")
             return True
@@ -184,22 +255,33 @@ class AccountsReceivableDispatcher:
             logger.error(f"Erro ao enviar notificação de contas a receber: {e}", exc_info=True)
             return False
     
-    def dispatch_today_receivables(self):
+    def dispatch_today_receivables(self, force: bool = False):
         """Dispara notificação de contas a receber com vencimento para hoje"""
         today = date.today()
         logger.info(f"Disparando contas a receber com vencimento para hoje ({today})")
-        return self.send_accounts_receivable_notification(today, is_today=True)
+        return self.send_accounts_receivable_notification(today, is_today=True, force=force)
     
-    def dispatch_tomorrow_receivables(self):
+    def dispatch_tomorrow_receivables(self, force: bool = False):
         """Dispara notificação de contas a receber com vencimento para amanhã"""
         tomorrow = date.today() + timedelta(days=1)
         logger.info(f"Disparando contas a receber com vencimento para amanhã ({tomorrow})")
-        return self.send_accounts_receivable_notification(tomorrow, is_today=False)
+        return self.send_accounts_receivable_notification(tomorrow, is_today=False, force=force)
+    
+    def drain_outbox(self):
+        """Reenvia as mensagens pendentes do outbox sem interromper o disparo atual"""
+        try:
+            self.outbox.drain(self.async_whatsapp_client)
+        except Exception as e:
+            logger.error(f"Erro ao reenviar mensagens pendentes do outbox: {e}")
     
     def close(self):
         """Fecha conexões"""
-        if self.postgres_client:
+        if self.postgres_client and self._owns_postgres_client:
             self.postgres_client.close()
+        if self.async_whatsapp_client:
+            self.async_whatsapp_client.close()
+        if self.whatsapp_client and self._owns_whatsapp_client:
+            self.whatsapp_client.close()
     
     def __enter__(self):
         """Context manager entry"""
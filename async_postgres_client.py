@@ -0,0 +1,201 @@
+"""
+Cliente assíncrono para consultas ao PostgreSQL do Odoo
+Executa as consultas do PostgresClient em paralelo, sobre o pool de conexões
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+from postgres_client import PostgresClient
+from queries import (
+    ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY, ACCOUNTS_PAYABLE_BY_DUE_DATE_QUERY,
+    ACCOUNTS_PAYABLE_SUMMARY_BY_DUE_DATE_QUERY, PURCHASES_UPDATED_TODAY_QUERY,
+    purchases_updated_params
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPostgresClient:
+    """
+    Cliente asyncio para as consultas dos relatórios
+    
+    Usa as mesmas queries, prepared statements, reconexão e timeouts do
+    PostgresClient, executando cada consulta em um pool de threads limitado a
+    `concurrency` consultas simultâneas, cada uma com sua conexão do pool.
+    Várias consultas disparadas juntas levam o tempo da mais lenta, e não da
+    soma de todas.
+    """
+    
+    def __init__(self, client: PostgresClient, concurrency: int = 4):
+        """
+        Inicializa o cliente assíncrono
+        
+        Args:
+            client: Cliente PostgreSQL síncrono usado nas consultas
+            concurrency: Máximo de consultas simultâneas
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concorrência inválida: {concurrency}")
+        if client.pool is None and concurrency > 1:
+            # Sem pool, todas as consultas dividiriam a mesma conexão (e a mesma transação)
+            logger.warning("PostgresClient sem pool de conexões; consultas assíncronas serão executadas uma por vez")
+            concurrency = 1
+        elif client.pool is not None and concurrency > client.pool.max_size:
+            logger.warning(
+                f"Concorrência de consultas ({concurrency}) maior que o pool PostgreSQL "
+                f"({client.pool.max_size}); consultas excedentes aguardarão conexão livre"
+            )
+        self.client = client
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency,
+            thread_name_prefix="postgres-query"
+        )
+    
+    async def _run(self, func, *args, **kwargs):
+        """Executa uma chamada bloqueante do cliente síncrono no pool de threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def execute_query(self, query: str, params: tuple = None, row_mode: Optional[str] = None,
+                            timeout: Optional[float] = None, retry: bool = True) -> List[Dict]:
+        """
+        Executa uma query SQL (ver PostgresClient.execute_query)
+        
+        Returns:
+            Lista de dicionários (ou de CompactRow, no modo compacto) com os resultados
+        """
+        return await self._run(
+            self.client.execute_query, query, params, row_mode=row_mode, timeout=timeout, retry=retry
+        )
+    
+    async def execute_prepared(self, name: str, query: str, params: tuple = None,
+                               row_mode: Optional[str] = None, timeout: Optional[float] = None,
+                               retry: bool = True) -> List[Dict]:
+        """
+        Executa uma query fixa como prepared statement (ver PostgresClient.execute_prepared)
+        
+        Returns:
+            Lista de dicionários (ou de CompactRow, no modo compacto) com os resultados
+        """
+        return await self._run(
+            self.client.execute_prepared, name, query, params, row_mode=row_mode, timeout=timeout, retry=retry
+        )
+    
+    async def get_recent_moves(self, hours: int = 24, limit: int = 100) -> List[Dict]:
+        """Busca lançamentos recentes (ver PostgresClient.get_recent_moves)"""
+        return await self._run(self.client.get_recent_moves, hours, limit)
+    
+    async def get_moves_by_date_range(self, start_date: datetime, end_date: datetime, limit: int = 100) -> List[Dict]:
+        """Busca lançamentos por intervalo de datas (ver PostgresClient.get_moves_by_date_range)"""
+        return await self._run(self.client.get_moves_by_date_range, start_date, end_date, limit)
+    
+    async def get_moves_by_type(self, move_type: str, state: str = 'posted', limit: int = 100) -> List[Dict]:
+        """Busca lançamentos por tipo (ver PostgresClient.get_moves_by_type)"""
+        return await self._run(self.client.get_moves_by_type, move_type, state, limit)
+    
+    async def get_moves_by_ids(self, move_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Busca vários lançamentos por ID, em lotes (ver PostgresClient.get_moves_by_ids)"""
+        return await self._run(self.client.get_moves_by_ids, list(move_ids))
+    
+    async def get_move_by_id(self, move_id: int) -> Dict:
+        """Busca um lançamento por ID (ver PostgresClient.get_move_by_id)"""
+        return await self._run(self.client.get_move_by_id, move_id)
+    
+    async def get_accounts_receivable_by_due_date(self, due_date: date) -> List[Dict]:
+        """
+        Busca contas a receber com vencimento em uma data
+        (mesma consulta de AccountsReceivableDispatcher.get_accounts_receivable_by_due_date)
+        
+        Args:
+            due_date: Data de vencimento para buscar
+        
+        Returns:
+            Lista de contas a receber
+        """
+        return await self.execute_prepared(
+            'accounts_receivable_by_due_date', ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY, (due_date,), row_mode='compact'
+        )
+    
+    async def get_accounts_payable_for_today(self) -> List[Dict]:
+        """
+        Busca as contas a pagar com vencimento para hoje, linha a linha
+        (mesma consulta de AccountsPayableDispatcher.get_accounts_payable_for_today)
+        
+        Returns:
+            Lista de contas a pagar
+        """
+        return await self.execute_prepared(
+            'accounts_payable_for_today', ACCOUNTS_PAYABLE_BY_DUE_DATE_QUERY, (date.today(),), row_mode='compact'
+        )
+    
+    async def get_accounts_payable_summary_for_today(self) -> List[Dict]:
+        """
+        Busca o resumo por empresa das contas a pagar com vencimento para hoje
+        (mesma consulta de AccountsPayableDispatcher.get_accounts_payable_summary_for_today)
+        
+        Returns:
+            Lista de dicts com company_name, account_count e total_amount
+        """
+        return await self.execute_prepared(
+            'accounts_payable_summary_for_today', ACCOUNTS_PAYABLE_SUMMARY_BY_DUE_DATE_QUERY,
+            (date.today(),), row_mode='compact'
+        )
+    
+    async def get_purchases_updated_today(self) -> List[Dict]:
+        """
+        Busca compras atualizadas no dia de hoje
+        (mesma consulta de PurchasesDispatcher.get_purchases_updated_today)
+        
+        Returns:
+            Lista de compras atualizadas
+        """
+        return await self.execute_prepared(
+            'purchases_updated_today', PURCHASES_UPDATED_TODAY_QUERY,
+            purchases_updated_params(date.today()), row_mode='compact'
+        )
+    
+    async def gather(self, fetches: Dict[str, Awaitable], return_exceptions: bool = False) -> Dict[str, Any]:
+        """
+        Aguarda várias consultas disparadas em paralelo
+        
+        Args:
+            fetches: Consultas nomeadas, ex.: {'payables': client.get_accounts_payable_summary_for_today()}
+            return_exceptions: Se True, uma consulta que falha tem a exceção como
+                resultado, sem interromper as demais; se False, a primeira falha é levantada
+        
+        Returns:
+            Dicionário nome -> resultado (ou exceção), com os mesmos nomes de fetches
+        """
+        names = list(fetches)
+        results = await asyncio.gather(*fetches.values(), return_exceptions=return_exceptions)
+        return dict(zip(names, results))
+    
+    def gather_sync(self, fetches: Dict[str, Awaitable], return_exceptions: bool = False) -> Dict[str, Any]:
+        """
+        Versão síncrona de gather, para uso a partir de código não assíncrono
+        
+        Args:
+            fetches: Consultas nomeadas (corrotinas deste cliente)
+            return_exceptions: Ver gather
+        
+        Returns:
+            Dicionário nome -> resultado (ou exceção)
+        """
+        return asyncio.run(self.gather(fetches, return_exceptions=return_exceptions))
+    
+    def close(self):
+        """Encerra o pool de threads de consulta (o PostgresClient não é fechado)"""
+        self._executor.shutdown(wait=True)
+    
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
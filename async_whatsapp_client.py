@@ -0,0 +1,221 @@
+"""
+Cliente assíncrono para envio de mensagens WhatsApp em lote
+Executa os envios do WhatsAppClient em paralelo com limite de concorrência
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from whatsapp_client import WhatsAppClient
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSendResult:
+    """Resultado de um envio em lote, com o resultado individual de cada mensagem"""
+    
+    def __init__(self, results: List[Dict]):
+        """
+        Args:
+            results: Resultados por mensagem, na ordem de entrada. Cada item contém
+                index, number, success, response e error (e skipped, quando a
+                mensagem não foi enviada porque a anterior da sequência falhou;
+                no envio pelo outbox, as falhas trazem discarded, se o outbox
+                desistiu da mensagem)
+        """
+        self.results = results
+    
+    @property
+    def sent(self) -> int:
+        """Quantidade de mensagens enviadas com sucesso"""
+        return sum(1 for r in self.results if r['success'])
+    
+    @property
+    def failed(self) -> int:
+        """Quantidade de mensagens que falharam"""
+        return len(self.results) - self.sent
+    
+    @property
+    def failures(self) -> List[Dict]:
+        """Resultados das mensagens que falharam"""
+        return [r for r in self.results if not r['success']]
+    
+    @property
+    def discarded(self) -> List[Dict]:
+        """Resultados das falhas que o outbox descartou (não serão reenviadas)"""
+        return [r for r in self.results if not r['success'] and r.get('discarded')]
+    
+    @property
+    def ok(self) -> bool:
+        """True se todas as mensagens foram enviadas"""
+        return self.failed == 0
+    
+    def __repr__(self) -> str:
+        return f"BatchSendResult(sent={self.sent}, failed={self.failed})"
+
+
+class AsyncWhatsAppClient:
+    """
+    Cliente asyncio para enviar mensagens via Evolution API
+    
+    Usa o mesmo payload, descoberta de endpoints e sessão HTTP do WhatsAppClient,
+    executando cada envio em um pool de threads limitado a `concurrency` envios
+    simultâneos. O tempo de um lote passa a ser próximo do envio mais lento,
+    e não da soma de todos.
+    """
+    
+    def __init__(self, client: WhatsAppClient, concurrency: int = 5):
+        """
+        Inicializa o cliente assíncrono
+        
+        Args:
+            client: Cliente WhatsApp síncrono usado para os envios
+            concurrency: Máximo de envios simultâneos
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concorrência inválida: {concurrency}")
+        self.client = client
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency,
+            thread_name_prefix="whatsapp-send"
+        )
+        if concurrency > client.pool_maxsize:
+            logger.warning(
+                f"Concorrência de envio ({concurrency}) maior que o pool HTTP "
+                f"({client.pool_maxsize}); envios excedentes aguardarão conexão livre"
+            )
+    
+    async def send_message(self, number: str, message: str) -> Dict:
+        """
+        Envia uma mensagem de texto via WhatsApp
+        
+        Args:
+            number: Número do destinatário (formato: 5511999999999)
+            message: Texto da mensagem
+            
+        Returns:
+            Resposta da API
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.client.send_message, number, message)
+    
+    async def _send_one(self, index: int, number: str, message: str) -> Dict:
+        """Envia uma mensagem do lote, capturando o erro no resultado"""
+        try:
+            response = await self.send_message(number, message)
+            return {'index': index, 'number': number, 'success': True, 'response': response, 'error': None}
+        except Exception as e:
+            logger.error(f"Falha no envio {index + 1} para {number}: {e}")
+            return {'index': index, 'number': number, 'success': False, 'response': None, 'error': e}
+    
+    async def send_many(self, messages: Iterable[Tuple[str, str]]) -> BatchSendResult:
+        """
+        Envia várias mensagens em paralelo
+        
+        Falhas individuais não interrompem o lote; cada mensagem tem seu resultado.
+        
+        Args:
+            messages: Pares (número, mensagem)
+            
+        Returns:
+            Resultado do lote, na mesma ordem das mensagens
+        """
+        tasks = [
+            self._send_one(index, number, message)
+            for index, (number, message) in enumerate(messages)
+        ]
+        results = await asyncio.gather(*tasks)
+        batch = BatchSendResult(list(results))
+        
+        if batch.ok:
+            logger.info(f"Lote enviado: {batch.sent} mensagem(ns)")
+        else:
+            logger.warning(f"Lote enviado parcialmente: {batch.sent} ok, {batch.failed} falha(s)")
+        
+        rate_stats = self.client.rate_limit_stats()
+        if rate_stats:
+            logger.debug(f"Espera no limitador de envio: {rate_stats}")
+        return batch
+    
+    def send_many_sync(self, messages: Iterable[Tuple[str, str]]) -> BatchSendResult:
+        """
+        Versão síncrona de send_many, para uso a partir de código não assíncrono
+        
+        Args:
+            messages: Pares (número, mensagem)
+            
+        Returns:
+            Resultado do lote
+        """
+        return asyncio.run(self.send_many(messages))
+    
+    async def _send_sequence(self, sequence: List[Tuple[int, str, str]]) -> List[Dict]:
+        """Envia as mensagens de uma sequência uma após a outra, parando na primeira falha"""
+        results = []
+        for index, number, message in sequence:
+            if results and not results[-1]['success']:
+                # Mensagem seguinte a uma falha não é enviada, para não chegar fora de ordem
+                results.append({
+                    'index': index, 'number': number, 'success': False, 'response': None,
+                    'error': 'não enviada: mensagem anterior da sequência falhou', 'skipped': True
+                })
+                continue
+            results.append(await self._send_one(index, number, message))
+        return results
+    
+    async def send_sequences(self, sequences: Iterable[List[Tuple[str, str]]]) -> BatchSendResult:
+        """
+        Envia sequências de mensagens que precisam chegar em ordem
+        
+        As mensagens de uma sequência (ex.: as partes de um relatório para um
+        destinatário) são enviadas uma após a outra: o WhatsApp não garante a
+        ordem de mensagens enviadas ao mesmo tempo para o mesmo chat. As
+        sequências são enviadas em paralelo entre si. Se uma mensagem falhar, as
+        seguintes da mesma sequência não são enviadas e voltam com 'skipped'.
+        
+        Args:
+            sequences: Listas de pares (número, mensagem), cada uma na ordem de envio
+        
+        Returns:
+            Resultado do lote, na ordem das sequências e das mensagens dentro delas
+        """
+        indexed = []
+        index = 0
+        for sequence in sequences:
+            indexed.append([(index + offset, number, message) for offset, (number, message) in enumerate(sequence)])
+            index += len(sequence)
+        
+        sequence_results = await asyncio.gather(*(self._send_sequence(sequence) for sequence in indexed))
+        batch = BatchSendResult([result for results in sequence_results for result in results])
+        
+        if batch.ok:
+            logger.info(f"Lote enviado: {batch.sent} mensagem(ns) em {len(indexed)} sequência(s)")
+        else:
+            logger.warning(f"Lote enviado parcialmente: {batch.sent} ok, {batch.failed} falha(s)")
+        return batch
+    
+    def send_sequences_sync(self, sequences: Iterable[List[Tuple[str, str]]]) -> BatchSendResult:
+        """
+        Versão síncrona de send_sequences, para uso a partir de código não assíncrono
+        
+        Args:
+            sequences: Listas de pares (número, mensagem), cada uma na ordem de envio
+        
+        Returns:
+            Resultado do lote
+        """
+        return asyncio.run(self.send_sequences(sequences))
+    
+    def close(self):
+        """Encerra o pool de threads de envio"""
+        self._executor.shutdown(wait=True)
+    
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
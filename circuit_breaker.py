@@ -0,0 +1,159 @@
+"""
+Circuit breaker para dependências externas (Evolution API e PostgreSQL do Odoo)
+Faz as execuções falharem rápido quando uma dependência está fora do ar
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos, apenas entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Exceção lançada quando o circuito está aberto e a chamada é recusada"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker com estado compartilhado entre processos
+    
+    Após `failure_threshold` falhas consecutivas o circuito abre e as chamadas
+    falham imediatamente com CircuitOpenError. Passado `reset_timeout`, uma
+    única chamada de teste (half-open) é liberada: se der certo o circuito
+    fecha, se falhar abre de novo.
+    
+    Com `state_file`, o estado fica em um arquivo JSON protegido por flock,
+    então os cron jobs que rodam em paralelo enxergam o mesmo circuito.
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60,
+                 state_file: Optional[str] = None):
+        """
+        Inicializa o circuit breaker
+        
+        Args:
+            name: Nome da dependência protegida (usado em logs)
+            failure_threshold: Falhas consecutivas para abrir o circuito
+            reset_timeout: Segundos com o circuito aberto antes de liberar a chamada de teste
+            state_file: Arquivo JSON para compartilhar o estado entre processos (None: só memória)
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._memory_state = self._initial_state()
+        
+        if self.state_file:
+            directory = os.path.dirname(self.state_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def _initial_state() -> Dict:
+        """Estado inicial: circuito fechado e sem falhas"""
+        return {'state': STATE_CLOSED, 'failures': 0, 'opened_at': 0.0, 'probe_started': 0.0}
+    
+    @contextmanager
+    def _locked_state(self):
+        """Fornece o estado atual para leitura/alteração sob lock e o persiste ao final"""
+        with self._lock:
+            if not self.state_file:
+                yield self._memory_state
+                return
+            
+            with open(self.state_file, 'a+', encoding='utf-8') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    content = f.read()
+                    try:
+                        state = json.loads(content) if content.strip() else self._initial_state()
+                    except ValueError:
+                        logger.warning(f"Estado do circuito {self.name} corrompido, reiniciando")
+                        state = self._initial_state()
+                    before = dict(state)
+                    
+                    yield state
+                    
+                    if state != before:
+                        f.seek(0)
+                        f.truncate()
+                        json.dump(state, f)
+                        f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def before_call(self):
+        """
+        Verifica se a chamada pode prosseguir
+        
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto (ou com teste em andamento)
+        """
+        now = time.time()
+        with self._locked_state() as state:
+            if state['state'] == STATE_CLOSED:
+                return
+            
+            if state['state'] == STATE_HALF_OPEN and now - state['probe_started'] < self.reset_timeout:
+                raise CircuitOpenError(f"Circuito {self.name} em teste; chamada recusada")
+            
+            if state['state'] == STATE_OPEN and now - state['opened_at'] < self.reset_timeout:
+                retry_in = self.reset_timeout - (now - state['opened_at'])
+                raise CircuitOpenError(
+                    f"Circuito {self.name} aberto após {state['failures']} falha(s); "
+                    f"nova tentativa liberada em {retry_in:.0f}s"
+                )
+            
+            # Tempo de espera esgotado (ou teste anterior travado): libera uma chamada de teste
+            state['state'] = STATE_HALF_OPEN
+            state['probe_started'] = now
+            logger.info(f"Circuito {self.name} em half-open: liberando chamada de teste")
+    
+    def record_success(self):
+        """Registra uma chamada bem-sucedida, fechando o circuito"""
+        with self._locked_state() as state:
+            if state['state'] != STATE_CLOSED:
+                logger.info(f"Circuito {self.name} fechado: dependência respondeu novamente")
+            state.update(self._initial_state())
+    
+    def record_failure(self):
+        """Registra uma falha, abrindo o circuito ao atingir o limite"""
+        now = time.time()
+        with self._locked_state() as state:
+            state['failures'] += 1
+            if state['state'] == STATE_HALF_OPEN or state['failures'] >= self.failure_threshold:
+                if state['state'] != STATE_OPEN:
+                    logger.error(
+                        f"Circuito {self.name} aberto após {state['failures']} falha(s); "
+                        f"chamadas serão recusadas por {self.reset_timeout:.0f}s"
+                    )
+                state['state'] = STATE_OPEN
+                state['opened_at'] = now
+    
+    def stats(self) -> Dict:
+        """
+        Retorna o estado atual do circuito
+        
+        Returns:
+            Dicionário com state, failures e opened_at
+        """
+        with self._locked_state() as state:
+            return dict(state)
@@ -0,0 +1,276 @@
+"""
+Fábricas dos clientes PostgreSQL e WhatsApp a partir das configurações
+Centraliza a criação para que dispatchers e scripts compartilhem recursos
+"""
+import os
+from typing import Optional
+
+from config import settings
+from postgres_client import PostgresClient, MoveCache, get_shared_pool
+from async_postgres_client import AsyncPostgresClient
+from whatsapp_client import WhatsAppClient, EndpointCache
+from async_whatsapp_client import AsyncWhatsAppClient
+from message_segmenter import MessageSegmenter
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+from circuit_breaker import CircuitBreaker
+from outbox import Outbox
+from dispatch_ledger import DispatchLedger
+from watermark import Watermark
+
+# Cache de endpoints e limitador compartilhados por todos os clientes WhatsApp do processo
+_endpoint_cache = None
+_rate_limiter = None
+_circuit_breakers = {}
+_outbox = None
+_dispatch_ledger = None
+_move_cache = None
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Retorna o circuit breaker da dependência, com estado em STATE_DIR
+    
+    Args:
+        name: 'postgres' ou 'evolution'
+    
+    Returns:
+        Circuit breaker compartilhado entre os clientes do processo e, via
+        arquivo de estado, entre os processos
+    """
+    if name not in _circuit_breakers:
+        if name == 'postgres':
+            threshold, reset_timeout = settings.POSTGRES_CIRCUIT_FAILURE_THRESHOLD, settings.POSTGRES_CIRCUIT_RESET_TIMEOUT
+        else:
+            threshold, reset_timeout = settings.EVOLUTION_CIRCUIT_FAILURE_THRESHOLD, settings.EVOLUTION_CIRCUIT_RESET_TIMEOUT
+        _circuit_breakers[name] = CircuitBreaker(
+            name=name,
+            failure_threshold=threshold,
+            reset_timeout=reset_timeout,
+            state_file=os.path.join(settings.STATE_DIR, f"circuit_{name}.json")
+        )
+    return _circuit_breakers[name]
+
+
+def get_endpoint_cache() -> EndpointCache:
+    """
+    Retorna o cache de endpoints da Evolution API do processo
+    
+    Returns:
+        Cache carregado de EVOLUTION_ENDPOINT_CACHE_FILE
+    """
+    global _endpoint_cache
+    if _endpoint_cache is None:
+        _endpoint_cache = EndpointCache(settings.EVOLUTION_ENDPOINT_CACHE_FILE)
+    return _endpoint_cache
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Retorna o limitador de taxa de envio do processo
+    
+    Todos os clientes do processo compartilham o mesmo balde, para que o
+    limite valha para o total enviado à Evolution API.
+    
+    Returns:
+        Limitador configurado por WHATSAPP_RATE_LIMIT_*
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            rate=settings.WHATSAPP_RATE_LIMIT_PER_SECOND,
+            burst=settings.WHATSAPP_RATE_LIMIT_BURST,
+            per_recipient_interval=settings.WHATSAPP_MIN_INTERVAL_PER_RECIPIENT
+        )
+    return _rate_limiter
+
+
+def get_outbox() -> Outbox:
+    """
+    Retorna o outbox de mensagens do processo
+    
+    Returns:
+        Outbox gravado em OUTBOX_FILE
+    """
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(
+            settings.OUTBOX_FILE,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+            max_age_hours=settings.OUTBOX_MAX_AGE_HOURS
+        )
+    return _outbox
+
+
+def get_dispatch_ledger() -> DispatchLedger:
+    """
+    Retorna o ledger de disparos do processo
+    
+    Returns:
+        Ledger gravado em DISPATCH_LEDGER_FILE
+    """
+    global _dispatch_ledger
+    if _dispatch_ledger is None:
+        _dispatch_ledger = DispatchLedger(settings.DISPATCH_LEDGER_FILE)
+    return _dispatch_ledger
+
+
+def get_purchases_watermark() -> Watermark:
+    """
+    Retorna a marca d'água do feed incremental de compras
+    
+    Returns:
+        Marca d'água gravada em PURCHASES_WATERMARK_FILE
+    """
+    return Watermark(settings.PURCHASES_WATERMARK_FILE)
+
+
+def get_move_cache() -> Optional[MoveCache]:
+    """
+    Retorna o cache de lançamentos compartilhado pelos clientes PostgreSQL do processo
+    
+    Returns:
+        Cache LRU com POSTGRES_MOVE_CACHE_SIZE lançamentos, ou None se desativado
+    """
+    global _move_cache
+    if _move_cache is None and settings.POSTGRES_MOVE_CACHE_SIZE > 0:
+        _move_cache = MoveCache(max_size=settings.POSTGRES_MOVE_CACHE_SIZE, ttl=settings.POSTGRES_MOVE_CACHE_TTL)
+    return _move_cache
+
+
+def create_postgres_client() -> PostgresClient:
+    """
+    Cria um cliente PostgreSQL com as configurações do ambiente
+    
+    Com POSTGRES_POOL_ENABLED (padrão), o cliente usa o pool compartilhado
+    do processo, reaproveitando conexões entre dispatchers. Leituras que
+    perdem a conexão são repetidas com reconexão (POSTGRES_RETRY_*).
+    
+    A sessão é de relatório: somente leitura e em autocommit (POSTGRES_READ_ONLY,
+    POSTGRES_AUTOCOMMIT), identificada por POSTGRES_APPLICATION_NAME e, se
+    POSTGRES_REPLICA_HOST estiver configurado, conectada à réplica de leitura.
+    
+    Returns:
+        Cliente PostgreSQL
+    """
+    host, port = settings.POSTGRES_HOST, settings.POSTGRES_PORT
+    if settings.POSTGRES_REPLICA_HOST:
+        host, port = settings.POSTGRES_REPLICA_HOST, settings.POSTGRES_REPLICA_PORT
+    
+    pool = None
+    if settings.POSTGRES_POOL_ENABLED:
+        pool = get_shared_pool(
+            host=host,
+            port=port,
+            database=settings.POSTGRES_DB,
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            min_size=settings.POSTGRES_POOL_MIN_SIZE,
+            max_size=settings.POSTGRES_POOL_MAX_SIZE,
+            idle_timeout=settings.POSTGRES_POOL_IDLE_TIMEOUT,
+            check_on_checkout=settings.POSTGRES_POOL_CHECK_ON_CHECKOUT,
+            circuit_breaker=get_circuit_breaker('postgres'),
+            statement_timeout=settings.POSTGRES_STATEMENT_TIMEOUT,
+            application_name=settings.POSTGRES_APPLICATION_NAME,
+            read_only=settings.POSTGRES_READ_ONLY,
+            autocommit=settings.POSTGRES_AUTOCOMMIT
+        )
+    
+    return PostgresClient(
+        host=host,
+        port=port,
+        database=settings.POSTGRES_DB,
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        pool=pool,
+        circuit_breaker=get_circuit_breaker('postgres'),
+        itersize=settings.POSTGRES_STREAM_ITERSIZE,
+        statement_timeout=settings.POSTGRES_STATEMENT_TIMEOUT,
+        retry_policy=RetryPolicy(
+            max_attempts=settings.POSTGRES_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.POSTGRES_RETRY_BASE_DELAY,
+            max_delay=settings.POSTGRES_RETRY_MAX_DELAY,
+            deadline=settings.POSTGRES_RETRY_DEADLINE
+        ),
+        application_name=settings.POSTGRES_APPLICATION_NAME,
+        read_only=settings.POSTGRES_READ_ONLY,
+        autocommit=settings.POSTGRES_AUTOCOMMIT,
+        move_cache=get_move_cache(),
+        batch_size=settings.POSTGRES_MOVES_BATCH_SIZE
+    )
+
+
+def create_async_postgres_client(postgres_client: PostgresClient = None) -> AsyncPostgresClient:
+    """
+    Cria um cliente PostgreSQL assíncrono para disparar várias consultas em paralelo
+    
+    Args:
+        postgres_client: Cliente síncrono a reaproveitar (pool e prepared
+            statements). Se não informado, um novo é criado
+    
+    Returns:
+        Cliente PostgreSQL assíncrono
+    """
+    return AsyncPostgresClient(
+        postgres_client or create_postgres_client(),
+        concurrency=settings.POSTGRES_ASYNC_CONCURRENCY
+    )
+
+
+def create_whatsapp_client() -> WhatsAppClient:
+    """
+    Cria um cliente WhatsApp com as configurações do ambiente
+    
+    O cliente mantém uma sessão HTTP persistente; reutilize a mesma instância
+    para vários envios e chame close() ao final.
+    
+    Returns:
+        Cliente WhatsApp
+    """
+    return WhatsAppClient(
+        api_url=settings.EVOLUTION_API_URL,
+        api_key=settings.EVOLUTION_API_KEY,
+        instance=settings.EVOLUTION_INSTANCE,
+        pool_connections=settings.EVOLUTION_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.EVOLUTION_HTTP_POOL_MAXSIZE,
+        keep_alive=settings.EVOLUTION_HTTP_KEEP_ALIVE,
+        endpoint_cache=get_endpoint_cache(),
+        rate_limiter=get_rate_limiter(),
+        retry_policy=RetryPolicy(
+            max_attempts=settings.WHATSAPP_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.WHATSAPP_RETRY_BASE_DELAY,
+            max_delay=settings.WHATSAPP_RETRY_MAX_DELAY,
+            deadline=settings.WHATSAPP_RETRY_DEADLINE
+        ),
+        circuit_breaker=get_circuit_breaker('evolution')
+    )
+
+
+def create_async_whatsapp_client(whatsapp_client: WhatsAppClient = None) -> AsyncWhatsAppClient:
+    """
+    Cria um cliente WhatsApp assíncrono para envios em lote
+    
+    Args:
+        whatsapp_client: Cliente síncrono a reaproveitar (sessão HTTP e cache de
+            endpoints). Se não informado, um novo é criado
+    
+    Returns:
+        Cliente WhatsApp assíncrono
+    """
+    return AsyncWhatsAppClient(
+        whatsapp_client or create_whatsapp_client(),
+        concurrency=settings.WHATSAPP_SEND_CONCURRENCY
+    )
+
+
+def create_message_segmenter() -> MessageSegmenter:
+    """
+    Cria o segmentador que divide mensagens maiores que o limite do WhatsApp
+    
+    Returns:
+        Segmentador com os limites de WHATSAPP_MESSAGE_MAX_CHARS/WHATSAPP_MESSAGE_MAX_BYTES
+    """
+    return MessageSegmenter(
+        max_chars=settings.WHATSAPP_MESSAGE_MAX_CHARS,
+        max_bytes=settings.WHATSAPP_MESSAGE_MAX_BYTES
+    )
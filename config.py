@@ -2,11 +2,21 @@
 Configurações do sistema de notificação WhatsApp para Odoo
 Todas as configurações são obtidas de variáveis de ambiente
 Sem valores hardcoded - falha se variáveis não estiverem configuradas
+
+As configurações são lidas sob demanda: importar este módulo não lê o .env nem
+valida nada. Cada subsistema (postgres, evolution, whatsapp, ...) é lido e
+validado uma única vez, no primeiro acesso a uma de suas configurações, e
+pode ser sobrescrito no processo (ver Settings.override)
 """
 import os
+import threading
+from collections import ChainMap
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
 from dotenv import load_dotenv
 
-load_dotenv()
+import startup_profiler
 
 
 class ConfigurationError(Exception):
@@ -14,7 +24,7 @@ class ConfigurationError(Exception):
     pass
 
 
-def get_required_env(key: str, description: str = None) -> str:
+def get_required_env(key: str, description: str = None, env: Mapping[str, str] = None) -> str:
     """
     Obtém variável de ambiente obrigatória
     Lança exceção se não existir ou estiver vazia
@@ -22,14 +32,15 @@ def get_required_env(key: str, description: str = None) -> str:
     Args:
         key: Nome da variável de ambiente
         description: Descrição da variável para mensagem de erro
-        
+        env: Variáveis de onde ler (padrão: os.environ)
+    
     Returns:
         Valor da variável de ambiente
-        
+    
     Raises:
         ConfigurationError: Se a variável não estiver configurada
     """
-    value = os.getenv(key)
+    value = (os.environ if env is None else env).get(key)
     if not value or not value.strip():
         desc = description or key
         raise ConfigurationError(
@@ -40,7 +51,7 @@ def get_required_env(key: str, description: str = None) -> str:
     return value.strip()
 
 
-def get_required_env_int(key: str, description: str = None) -> int:
+def get_required_env_int(key: str, description: str = None, env: Mapping[str, str] = None) -> int:
     """
     Obtém variável de ambiente obrigatória como inteiro
     Lança exceção se não existir ou estiver vazia
@@ -48,14 +59,15 @@ def get_required_env_int(key: str, description: str = None) -> int:
     Args:
         key: Nome da variável de ambiente
         description: Descrição da variável para mensagem de erro
-        
+        env: Variáveis de onde ler (padrão: os.environ)
+    
     Returns:
         Valor da variável de ambiente como inteiro
-        
+    
     Raises:
         ConfigurationError: Se a variável não estiver configurada ou for inválida
     """
-    value = get_required_env(key, description)
+    value = get_required_env(key, description, env)
     try:
         return int(value)
     except ValueError:
@@ -67,83 +79,491 @@ def get_required_env_int(key: str, description: str = None) -> int:
         )
 
 
-def get_optional_env(key: str, default: str = "") -> str:
+def get_optional_env_int(key: str, default: int, env: Mapping[str, str] = None) -> int:
+    """
+    Obtém variável de ambiente opcional como inteiro
+    
+    Args:
+        key: Nome da variável de ambiente
+        default: Valor padrão se não existir ou estiver vazia
+        env: Variáveis de onde ler (padrão: os.environ)
+    
+    Returns:
+        Valor da variável de ambiente como inteiro ou default
+    
+    Raises:
+        ConfigurationError: Se a variável estiver configurada com valor inválido
+    """
+    value = (os.environ if env is None else env).get(key)
+    if not value or not value.strip():
+        return default
+    try:
+        return int(value.strip())
+    except ValueError:
+        raise ConfigurationError(
+            f"❌ Variável de ambiente inválida: {key}\n"
+            f"   Valor recebido: '{value}' (deve ser um número inteiro)"
+        )
+
+
+def get_optional_env_float(key: str, default: float, env: Mapping[str, str] = None) -> float:
+    """
+    Obtém variável de ambiente opcional como número decimal
+    
+    Args:
+        key: Nome da variável de ambiente
+        default: Valor padrão se não existir ou estiver vazia
+        env: Variáveis de onde ler (padrão: os.environ)
+    
+    Returns:
+        Valor da variável de ambiente como float ou default
+    
+    Raises:
+        ConfigurationError: Se a variável estiver configurada com valor inválido
+    """
+    value = (os.environ if env is None else env).get(key)
+    if not value or not value.strip():
+        return default
+    try:
+        return float(value.strip())
+    except ValueError:
+        raise ConfigurationError(
+            f"❌ Variável de ambiente inválida: {key}\n"
+            f"   Valor recebido: '{value}' (deve ser um número)"
+        )
+
+
+def get_optional_env_bool(key: str, default: bool, env: Mapping[str, str] = None) -> bool:
+    """
+    Obtém variável de ambiente opcional como booleano
+    
+    Aceita 1/true/yes/sim/on como verdadeiro e 0/false/no/nao/off como falso
+    
+    Args:
+        key: Nome da variável de ambiente
+        default: Valor padrão se não existir ou estiver vazia
+        env: Variáveis de onde ler (padrão: os.environ)
+    
+    Returns:
+        Valor da variável de ambiente como booleano ou default
+    
+    Raises:
+        ConfigurationError: Se a variável estiver configurada com valor inválido
+    """
+    value = (os.environ if env is None else env).get(key)
+    if not value or not value.strip():
+        return default
+    normalized = value.strip().lower()
+    if normalized in ('1', 'true', 'yes', 'sim', 'on'):
+        return True
+    if normalized in ('0', 'false', 'no', 'nao', 'não', 'off'):
+        return False
+    raise ConfigurationError(
+        f"❌ Variável de ambiente inválida: {key}\n"
+        f"   Valor recebido: '{value}' (use true/false)"
+    )
+
+
+def get_optional_env(key: str, default: str = "", env: Mapping[str, str] = None) -> str:
     """
     Obtém variável de ambiente opcional
     
     Args:
         key: Nome da variável de ambiente
         default: Valor padrão se não existir ou estiver vazia
-        
+        env: Variáveis de onde ler (padrão: os.environ)
+    
     Returns:
         Valor da variável de ambiente ou default
     """
-    value = os.getenv(key)
+    value = (os.environ if env is None else env).get(key)
     if not value or not value.strip():
         return default
     return value.strip()
 
 
-# Configurações do PostgreSQL/Odoo
-# Extrai host e porta do ODOO_URL (formato: http://IP:PORTA)
-odo_url = get_required_env("ODOO_URL", "URL do PostgreSQL no formato http://IP:PORTA")
+# Subsistemas: nome -> (função que lê e valida, configurações que ela produz)
+_SUBSYSTEMS: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
 
-# Remove http:// ou https://
-if "://" in odo_url:
-    odo_url = odo_url.split("://")[1]
 
-# Extrai host e porta
-if ":" in odo_url:
-    extracted_host, extracted_port = odo_url.split(":", 1)
-    # Valida porta
-    try:
-        extracted_port_int = int(extracted_port)
-    except ValueError:
+def _subsystem(name: str, *keys: str):
+    """Registra a função que carrega as configurações de um subsistema"""
+    def register(loader: Callable) -> Callable:
+        _SUBSYSTEMS[name] = (loader, keys)
+        return loader
+    return register
+
+
+@_subsystem(
+    'postgres',
+    'POSTGRES_HOST', 'POSTGRES_PORT', 'POSTGRES_DB', 'POSTGRES_USER', 'POSTGRES_PASSWORD',
+    'POSTGRES_POOL_ENABLED', 'POSTGRES_POOL_MIN_SIZE', 'POSTGRES_POOL_MAX_SIZE',
+    'POSTGRES_POOL_IDLE_TIMEOUT', 'POSTGRES_POOL_CHECK_ON_CHECKOUT', 'POSTGRES_STREAM_ITERSIZE',
+    'POSTGRES_STATEMENT_TIMEOUT', 'POSTGRES_RETRY_MAX_ATTEMPTS', 'POSTGRES_RETRY_BASE_DELAY',
+    'POSTGRES_RETRY_MAX_DELAY', 'POSTGRES_RETRY_DEADLINE', 'POSTGRES_ASYNC_CONCURRENCY',
+    'POSTGRES_MOVES_BATCH_SIZE', 'POSTGRES_MOVE_CACHE_SIZE', 'POSTGRES_MOVE_CACHE_TTL',
+    'POSTGRES_APPLICATION_NAME', 'POSTGRES_READ_ONLY', 'POSTGRES_AUTOCOMMIT',
+    'POSTGRES_REPLICA_HOST', 'POSTGRES_REPLICA_PORT',
+    'POSTGRES_CIRCUIT_FAILURE_THRESHOLD', 'POSTGRES_CIRCUIT_RESET_TIMEOUT',
+)
+def _load_postgres(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Configurações do PostgreSQL/Odoo"""
+    # Extrai host e porta do ODOO_URL (formato: http://IP:PORTA)
+    # Sem ODOO_URL, aceita POSTGRES_HOST ("host" ou "host:porta") e POSTGRES_PORT diretamente
+    host_override = get_optional_env("POSTGRES_HOST", env=env)
+    if host_override and not get_optional_env("ODOO_URL", env=env):
+        odo_url = host_override
+        host_override = ""
+    else:
+        odo_url = get_required_env("ODOO_URL", "URL do PostgreSQL no formato http://IP:PORTA", env)
+    
+    # Remove http:// ou https://
+    if "://" in odo_url:
+        odo_url = odo_url.split("://")[1]
+    
+    # Extrai host e porta
+    if ":" in odo_url:
+        extracted_host, extracted_port = odo_url.split(":", 1)
+        # Valida porta
+        try:
+            extracted_port_int = int(extracted_port)
+        except ValueError:
+            raise ConfigurationError(
+                f"❌ Porta inválida no ODOO_URL: '{extracted_port}'\n"
+                f"   ODOO_URL deve estar no formato: http://IP:PORTA\n"
+                f"   Exemplo: http://62.72.8.92:5432"
+            )
+        
+        # Permite override via POSTGRES_HOST e POSTGRES_PORT
+        host = host_override or extracted_host
+        port = get_optional_env_int("POSTGRES_PORT", extracted_port_int, env)
+    else:
+        # Se não tem porta no ODOO_URL, usa o host e pede POSTGRES_PORT
+        host = host_override or odo_url
+        port = get_required_env_int("POSTGRES_PORT", "Porta do PostgreSQL", env)
+    
+    # Configurações do banco de dados
+    # Permite POSTGRES_DB ou ODOO_DB como alternativa
+    database = get_optional_env("POSTGRES_DB", env=env) or get_optional_env("ODOO_DB", env=env)
+    if not database:
         raise ConfigurationError(
-            f"❌ Porta inválida no ODOO_URL: '{extracted_port}'\n"
-            f"   ODOO_URL deve estar no formato: http://IP:PORTA\n"
-            f"   Exemplo: http://62.72.8.92:5432"
+            "❌ Nome do banco de dados não configurado\n"
+            "   Configure POSTGRES_DB ou ODOO_DB"
         )
     
-    # Permite override via POSTGRES_HOST e POSTGRES_PORT
-    POSTGRES_HOST = get_optional_env("POSTGRES_HOST") or extracted_host
-    postgres_port_override = get_optional_env("POSTGRES_PORT")
-    POSTGRES_PORT = int(postgres_port_override) if postgres_port_override else extracted_port_int
-else:
-    # Se não tem porta no ODOO_URL, usa o host e pede POSTGRES_PORT
-    extracted_host = odo_url
-    POSTGRES_HOST = get_optional_env("POSTGRES_HOST") or extracted_host
-    POSTGRES_PORT = get_required_env_int("POSTGRES_PORT", "Porta do PostgreSQL")
-
-# Configurações do banco de dados
-# Permite POSTGRES_DB ou ODOO_DB como alternativa
-POSTGRES_DB = get_optional_env("POSTGRES_DB") or get_optional_env("ODOO_DB")
-if not POSTGRES_DB:
-    raise ConfigurationError(
-        "❌ Nome do banco de dados não configurado\n"
-        "   Configure POSTGRES_DB ou ODOO_DB"
-    )
+    # Permite POSTGRES_USER ou ODOO_USERNAME como alternativa
+    user = get_optional_env("POSTGRES_USER", env=env) or get_optional_env("ODOO_USERNAME", env=env)
+    if not user:
+        raise ConfigurationError(
+            "❌ Usuário do banco de dados não configurado\n"
+            "   Configure POSTGRES_USER ou ODOO_USERNAME"
+        )
+    
+    # Permite POSTGRES_PASSWORD ou ODOO_PASSWORD como alternativa
+    password = get_optional_env("POSTGRES_PASSWORD", env=env) or get_optional_env("ODOO_PASSWORD", env=env)
+    if not password:
+        raise ConfigurationError(
+            "❌ Senha do banco de dados não configurada\n"
+            "   Configure POSTGRES_PASSWORD ou ODOO_PASSWORD"
+        )
+    
+    return {
+        'POSTGRES_HOST': host,
+        'POSTGRES_PORT': port,
+        'POSTGRES_DB': database,
+        'POSTGRES_USER': user,
+        'POSTGRES_PASSWORD': password,
+        # Pool de conexões PostgreSQL compartilhado entre dispatchers e health check
+        'POSTGRES_POOL_ENABLED': get_optional_env_bool("POSTGRES_POOL_ENABLED", True, env),
+        'POSTGRES_POOL_MIN_SIZE': get_optional_env_int("POSTGRES_POOL_MIN_SIZE", 1, env),
+        'POSTGRES_POOL_MAX_SIZE': get_optional_env_int("POSTGRES_POOL_MAX_SIZE", 5, env),
+        'POSTGRES_POOL_IDLE_TIMEOUT': get_optional_env_int("POSTGRES_POOL_IDLE_TIMEOUT", 900, env),  # segundos
+        'POSTGRES_POOL_CHECK_ON_CHECKOUT': get_optional_env_bool("POSTGRES_POOL_CHECK_ON_CHECKOUT", True, env),
+        # Linhas trazidas do servidor por lote nas consultas em streaming (cursor nomeado)
+        'POSTGRES_STREAM_ITERSIZE': get_optional_env_int("POSTGRES_STREAM_ITERSIZE", 2000, env),
+        # Tempo máximo de cada consulta (statement_timeout; 0 desativa)
+        'POSTGRES_STATEMENT_TIMEOUT': get_optional_env_float("POSTGRES_STATEMENT_TIMEOUT", 60.0, env),  # segundos
+        # Reconexão e nova tentativa das leituras quando a conexão com o PostgreSQL cai
+        'POSTGRES_RETRY_MAX_ATTEMPTS': get_optional_env_int("POSTGRES_RETRY_MAX_ATTEMPTS", 3, env),
+        'POSTGRES_RETRY_BASE_DELAY': get_optional_env_float("POSTGRES_RETRY_BASE_DELAY", 0.5, env),  # segundos
+        'POSTGRES_RETRY_MAX_DELAY': get_optional_env_float("POSTGRES_RETRY_MAX_DELAY", 5.0, env),  # segundos
+        'POSTGRES_RETRY_DEADLINE': get_optional_env_float("POSTGRES_RETRY_DEADLINE", 60.0, env),  # segundos
+        # Consultas simultâneas do cliente assíncrono (não deve passar de POSTGRES_POOL_MAX_SIZE)
+        'POSTGRES_ASYNC_CONCURRENCY': get_optional_env_int("POSTGRES_ASYNC_CONCURRENCY", 4, env),
+        # Busca de lançamentos por ID em lote (get_moves_by_ids) e cache LRU dos lançamentos buscados
+        'POSTGRES_MOVES_BATCH_SIZE': get_optional_env_int("POSTGRES_MOVES_BATCH_SIZE", 1000, env),
+        'POSTGRES_MOVE_CACHE_SIZE': get_optional_env_int("POSTGRES_MOVE_CACHE_SIZE", 0, env),  # 0 desativa o cache
+        'POSTGRES_MOVE_CACHE_TTL': get_optional_env_float("POSTGRES_MOVE_CACHE_TTL", 300.0, env),  # segundos
+        # Sessão de relatórios: somente leitura e em autocommit, para não segurar
+        # transação (snapshot) no banco do Odoo enquanto formata e envia mensagens
+        'POSTGRES_APPLICATION_NAME': get_optional_env("POSTGRES_APPLICATION_NAME", "odoo-whatsapp-notifier", env),
+        'POSTGRES_READ_ONLY': get_optional_env_bool("POSTGRES_READ_ONLY", True, env),
+        'POSTGRES_AUTOCOMMIT': get_optional_env_bool("POSTGRES_AUTOCOMMIT", True, env),
+        # Réplica de leitura (opcional): se configurada, as consultas de relatório vão para ela
+        'POSTGRES_REPLICA_HOST': get_optional_env("POSTGRES_REPLICA_HOST", env=env),
+        'POSTGRES_REPLICA_PORT': get_optional_env_int("POSTGRES_REPLICA_PORT", port, env),
+        # Circuit breaker: após N falhas seguidas de conexão as chamadas falham na hora
+        'POSTGRES_CIRCUIT_FAILURE_THRESHOLD': get_optional_env_int("POSTGRES_CIRCUIT_FAILURE_THRESHOLD", 2, env),
+        'POSTGRES_CIRCUIT_RESET_TIMEOUT': get_optional_env_int("POSTGRES_CIRCUIT_RESET_TIMEOUT", 120, env),  # segundos
+    }
 
-# Permite POSTGRES_USER ou ODOO_USERNAME como alternativa
-POSTGRES_USER = get_optional_env("POSTGRES_USER") or get_optional_env("ODOO_USERNAME")
-if not POSTGRES_USER:
-    raise ConfigurationError(
-        "❌ Usuário do banco de dados não configurado\n"
-        "   Configure POSTGRES_USER ou ODOO_USERNAME"
-    )
 
-# Permite POSTGRES_PASSWORD ou ODOO_PASSWORD como alternativa
-POSTGRES_PASSWORD = get_optional_env("POSTGRES_PASSWORD") or get_optional_env("ODOO_PASSWORD")
-if not POSTGRES_PASSWORD:
-    raise ConfigurationError(
-        "❌ Senha do banco de dados não configurada\n"
-        "   Configure POSTGRES_PASSWORD ou ODOO_PASSWORD"
+@_subsystem(
+    'evolution',
+    'EVOLUTION_API_KEY', 'EVOLUTION_API_URL', 'EVOLUTION_INSTANCE',
+    'EVOLUTION_HTTP_POOL_CONNECTIONS', 'EVOLUTION_HTTP_POOL_MAXSIZE', 'EVOLUTION_HTTP_KEEP_ALIVE',
+    'EVOLUTION_ENDPOINT_CACHE_FILE',
+    'EVOLUTION_CIRCUIT_FAILURE_THRESHOLD', 'EVOLUTION_CIRCUIT_RESET_TIMEOUT',
+)
+def _load_evolution(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Configurações da Evolution API"""
+    return {
+        'EVOLUTION_API_KEY': get_required_env("EVOLUTION_API_KEY", "Chave da API Evolution", env),
+        'EVOLUTION_API_URL': get_required_env("EVOLUTION_API_URL", "URL da API Evolution", env).rstrip('/'),
+        'EVOLUTION_INSTANCE': get_required_env("EVOLUTION_INSTANCE", "Nome da instância Evolution API", env),
+        # Sessão HTTP persistente com a Evolution API
+        'EVOLUTION_HTTP_POOL_CONNECTIONS': get_optional_env_int("EVOLUTION_HTTP_POOL_CONNECTIONS", 4, env),
+        'EVOLUTION_HTTP_POOL_MAXSIZE': get_optional_env_int("EVOLUTION_HTTP_POOL_MAXSIZE", 10, env),
+        'EVOLUTION_HTTP_KEEP_ALIVE': get_optional_env_bool("EVOLUTION_HTTP_KEEP_ALIVE", True, env),
+        # Cache em disco das variantes de URL da Evolution API já descobertas
+        'EVOLUTION_ENDPOINT_CACHE_FILE': get_optional_env(
+            "EVOLUTION_ENDPOINT_CACHE_FILE",
+            os.path.join(settings.STATE_DIR, "evolution_endpoints.json"),
+            env
+        ),
+        # Circuit breaker: após N falhas seguidas a API é considerada fora do ar
+        # e as chamadas falham na hora até o tempo de reset (estado compartilhado em STATE_DIR)
+        'EVOLUTION_CIRCUIT_FAILURE_THRESHOLD': get_optional_env_int("EVOLUTION_CIRCUIT_FAILURE_THRESHOLD", 5, env),
+        'EVOLUTION_CIRCUIT_RESET_TIMEOUT': get_optional_env_int("EVOLUTION_CIRCUIT_RESET_TIMEOUT", 60, env),  # segundos
+    }
+
+
+@_subsystem(
+    'whatsapp',
+    'WHATSAPP_NUMBER', 'WHATSAPP_RECIPIENTS', 'WHATSAPP_SEND_CONCURRENCY',
+    'WHATSAPP_RATE_LIMIT_PER_SECOND', 'WHATSAPP_RATE_LIMIT_BURST', 'WHATSAPP_MIN_INTERVAL_PER_RECIPIENT',
+    'WHATSAPP_RETRY_MAX_ATTEMPTS', 'WHATSAPP_RETRY_BASE_DELAY', 'WHATSAPP_RETRY_MAX_DELAY',
+    'WHATSAPP_RETRY_DEADLINE', 'WHATSAPP_MESSAGE_MAX_CHARS', 'WHATSAPP_MESSAGE_MAX_BYTES',
+)
+def _load_whatsapp(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Destinatários e limites de envio das mensagens WhatsApp"""
+    # Número do WhatsApp para receber notificações (opcional)
+    # Aceita vários números separados por vírgula
+    number = get_optional_env("WHATSAPP_NUMBER", "", env)
+    return {
+        'WHATSAPP_NUMBER': number,
+        'WHATSAPP_RECIPIENTS': [n.strip() for n in number.split(",") if n.strip()],
+        # Máximo de envios WhatsApp simultâneos no envio em lote
+        'WHATSAPP_SEND_CONCURRENCY': get_optional_env_int("WHATSAPP_SEND_CONCURRENCY", 5, env),
+        # Limite de taxa de envio para a Evolution API (0 desativa)
+        'WHATSAPP_RATE_LIMIT_PER_SECOND': get_optional_env_float("WHATSAPP_RATE_LIMIT_PER_SECOND", 2.0, env),
+        'WHATSAPP_RATE_LIMIT_BURST': get_optional_env_int("WHATSAPP_RATE_LIMIT_BURST", 5, env),
+        'WHATSAPP_MIN_INTERVAL_PER_RECIPIENT': get_optional_env_float("WHATSAPP_MIN_INTERVAL_PER_RECIPIENT", 1.0, env),  # segundos
+        # Novas tentativas de envio para a Evolution API em erros temporários (timeout, 429, 5xx)
+        'WHATSAPP_RETRY_MAX_ATTEMPTS': get_optional_env_int("WHATSAPP_RETRY_MAX_ATTEMPTS", 4, env),
+        'WHATSAPP_RETRY_BASE_DELAY': get_optional_env_float("WHATSAPP_RETRY_BASE_DELAY", 1.0, env),  # segundos
+        'WHATSAPP_RETRY_MAX_DELAY': get_optional_env_float("WHATSAPP_RETRY_MAX_DELAY", 30.0, env),  # segundos
+        'WHATSAPP_RETRY_DEADLINE': get_optional_env_float("WHATSAPP_RETRY_DEADLINE", 120.0, env),  # segundos
+        # Tamanho máximo de cada mensagem; relatórios maiores são divididos em partes numeradas
+        'WHATSAPP_MESSAGE_MAX_CHARS': get_optional_env_int("WHATSAPP_MESSAGE_MAX_CHARS", 4000, env),
+        'WHATSAPP_MESSAGE_MAX_BYTES': get_optional_env_int("WHATSAPP_MESSAGE_MAX_BYTES", 0, env),  # 0 = sem limite
+    }
+
+
+@_subsystem(
+    'state',
+    'STATE_DIR', 'OUTBOX_FILE', 'OUTBOX_MAX_ATTEMPTS', 'OUTBOX_MAX_AGE_HOURS', 'DISPATCH_LEDGER_FILE',
+)
+def _load_state(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Arquivos de estado local entre execuções"""
+    # Diretório para arquivos de estado local (caches e controles entre execuções)
+    state_dir = get_optional_env(
+        "STATE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".state"),
+        env
     )
+    return {
+        'STATE_DIR': state_dir,
+        # Outbox local das mensagens: falhas de envio ficam pendentes e são reenviadas na próxima execução
+        'OUTBOX_FILE': get_optional_env("OUTBOX_FILE", os.path.join(state_dir, "outbox.sqlite3"), env),
+        'OUTBOX_MAX_ATTEMPTS': get_optional_env_int("OUTBOX_MAX_ATTEMPTS", 5, env),
+        'OUTBOX_MAX_AGE_HOURS': get_optional_env_int("OUTBOX_MAX_AGE_HOURS", 48, env),
+        # Ledger dos disparos realizados (evita notificações duplicadas em reexecuções)
+        'DISPATCH_LEDGER_FILE': get_optional_env(
+            "DISPATCH_LEDGER_FILE", os.path.join(state_dir, "dispatch_ledger.sqlite3"), env
+        ),
+    }
+
+
+@_subsystem(
+    'purchases',
+    'PURCHASES_WATERMARK_FILE', 'PURCHASES_FEED_PAGE_SIZE', 'PURCHASES_FEED_LAG_SECONDS',
+)
+def _load_purchases(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Alertas incrementais de compras"""
+    return {
+        # Marca d'água (write_date, id) da última compra notificada
+        'PURCHASES_WATERMARK_FILE': get_optional_env(
+            "PURCHASES_WATERMARK_FILE", os.path.join(settings.STATE_DIR, "purchases_watermark.json"), env
+        ),
+        'PURCHASES_FEED_PAGE_SIZE': get_optional_env_int("PURCHASES_FEED_PAGE_SIZE", 500, env),
+        # Atraso de leitura: compras alteradas há menos que isso ficam para a próxima execução,
+        # para não perder transações ainda não confirmadas com write_date anterior à marca
+        'PURCHASES_FEED_LAG_SECONDS': get_optional_env_int("PURCHASES_FEED_LAG_SECONDS", 60, env),
+    }
+
+
+@_subsystem(
+    'scheduler',
+    'SCHEDULER_TIMEZONE', 'SCHEDULER_WORKERS', 'SCHEDULE_HEALTH_CHECK', 'SCHEDULE_ACCOUNTS_TODAY',
+    'SCHEDULE_PURCHASES', 'SCHEDULE_PURCHASE_CHANGES',
+)
+def _load_scheduler(settings: 'Settings', env: Mapping[str, str]) -> Dict[str, Any]:
+    """Agendador em processo (main.py): expressões cron no fuso SCHEDULER_TIMEZONE; "off" desativa o job"""
+    return {
+        'SCHEDULER_TIMEZONE': get_optional_env("SCHEDULER_TIMEZONE", "America/Sao_Paulo", env),
+        'SCHEDULER_WORKERS': get_optional_env_int("SCHEDULER_WORKERS", 2, env),
+        'SCHEDULE_HEALTH_CHECK': get_optional_env("SCHEDULE_HEALTH_CHECK", "0 6 * * *", env),
+        'SCHEDULE_ACCOUNTS_TODAY': get_optional_env("SCHEDULE_ACCOUNTS_TODAY", "30 7 * * *", env),
+        'SCHEDULE_PURCHASES': get_optional_env("SCHEDULE_PURCHASES", "30 17 * * *", env),
+        'SCHEDULE_PURCHASE_CHANGES': get_optional_env("SCHEDULE_PURCHASE_CHANGES", "*/5 * * * *", env),
+    }
+
+
+# Configuração -> subsistema que a carrega
+_SETTING_SUBSYSTEMS = {key: name for name, (_, keys) in _SUBSYSTEMS.items() for key in keys}
+
+
+class Settings:
+    """
+    Configurações lidas sob demanda e mantidas em cache
+    
+    Acessar uma configuração (ex.: settings.POSTGRES_HOST) carrega e valida
+    apenas o subsistema dela, uma única vez; um job que só usa o PostgreSQL
+    não falha por falta das variáveis da Evolution API. ConfigurationError é
+    levantada no primeiro acesso ao subsistema mal configurado.
+    
+    Valores podem ser sobrescritos no processo com override() (temporário) ou
+    configure() (permanente), usando os nomes das variáveis de ambiente ou das
+    configurações finais (ex.: WHATSAPP_RECIPIENTS).
+    """
+    
+    def __init__(self, environ: Optional[Mapping[str, str]] = None):
+        """
+        Inicializa as configurações (nada é lido até o primeiro acesso)
+        
+        Args:
+            environ: Variáveis de onde ler (padrão: os.environ mais o arquivo .env)
+        """
+        self._environ = environ
+        self._dotenv_loaded = environ is not None
+        self._overrides: Dict[str, Any] = {}
+        self._values: Dict[str, Any] = {}
+        self._loaded = set()
+        self._lock = threading.RLock()
+    
+    def _env(self) -> Mapping[str, str]:
+        """Variáveis de ambiente com as sobrescritas por cima"""
+        if not self._dotenv_loaded:
+            with startup_profiler.phase('config.dotenv'):
+                load_dotenv()
+            self._dotenv_loaded = True
+        base = os.environ if self._environ is None else self._environ
+        if not self._overrides:
+            return base
+        # None remove a variável (vazio equivale a não configurada)
+        overrides = {key: '' if value is None else str(value) for key, value in self._overrides.items()}
+        return ChainMap(overrides, base)
+    
+    def validate(self, *subsystems: str):
+        """
+        Carrega e valida subsistemas (todos, se nenhum for informado)
+        
+        Args:
+            subsystems: Nomes dos subsistemas (postgres, evolution, whatsapp, state,
+                purchases, scheduler)
+        
+        Raises:
+            ConfigurationError: Se alguma configuração obrigatória faltar ou for inválida
+            ValueError: Se o subsistema não existir
+        """
+        for name in subsystems or tuple(_SUBSYSTEMS):
+            if name not in _SUBSYSTEMS:
+                raise ValueError(f"Subsistema de configuração desconhecido: {name}")
+            # _loaded e _values só são lidos sob o lock: reload() os esvazia
+            with self._lock:
+                if name in self._loaded:
+                    continue
+                loader, keys = _SUBSYSTEMS[name]
+                with startup_profiler.phase(f'config.{name}'):
+                    values = loader(self, self._env())
+                # Sobrescritas de configurações derivadas (ex.: WHATSAPP_RECIPIENTS) valem como estão
+                for key in keys:
+                    if self._overrides.get(key) is not None:
+                        values[key] = self._overrides[key]
+                self._values.update(values)
+                self._loaded.add(name)
+    
+    def __getattr__(self, name: str) -> Any:
+        """Lê uma configuração, carregando o subsistema dela no primeiro acesso"""
+        subsystem = _SETTING_SUBSYSTEMS.get(name)
+        if subsystem is None:
+            raise AttributeError(f"Configuração desconhecida: {name}")
+        with self._lock:
+            if subsystem not in self._loaded:
+                self.validate(subsystem)
+            return self._values[name]
+    
+    def reload(self):
+        """Descarta o cache; o próximo acesso relê as variáveis de ambiente"""
+        with self._lock:
+            self._values.clear()
+            self._loaded.clear()
+    
+    def configure(self, **values: Any):
+        """
+        Sobrescreve configurações no processo até o fim da execução
+        
+        Args:
+            values: Variáveis de ambiente ou configurações finais (None remove a variável)
+        """
+        with self._lock:
+            self._overrides.update(values)
+            self.reload()
+    
+    @contextmanager
+    def override(self, **values: Any) -> Iterator['Settings']:
+        """
+        Sobrescreve configurações dentro de um bloco with, restaurando-as ao sair
+        
+        Exemplo:
+            with settings.override(ODOO_URL="http://localhost:5432", POSTGRES_DB="odoo"):
+                client = create_postgres_client()
+        
+        Args:
+            values: Variáveis de ambiente ou configurações finais (None remove a variável)
+        """
+        with self._lock:
+            previous = dict(self._overrides)
+            self.configure(**values)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._overrides = previous
+                self.reload()
+
 
-# Configurações da Evolution API
-EVOLUTION_API_KEY = get_required_env("EVOLUTION_API_KEY", "Chave da API Evolution")
-EVOLUTION_API_URL = get_required_env("EVOLUTION_API_URL", "URL da API Evolution").rstrip('/')
-EVOLUTION_INSTANCE = get_required_env("EVOLUTION_INSTANCE", "Nome da instância Evolution API")
+# Configurações do processo
+settings = Settings()
 
-# Número do WhatsApp para receber notificações (opcional)
-WHATSAPP_NUMBER = get_optional_env("WHATSAPP_NUMBER", "")
+
+def __getattr__(name: str) -> Any:
+    """
+    Permite `from config import POSTGRES_HOST`: a configuração é lida de
+    settings no momento do import (valores importados assim não acompanham
+    sobrescritas posteriores; prefira settings.NOME)
+    """
+    if name in _SETTING_SUBSYSTEMS:
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
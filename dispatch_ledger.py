@@ -0,0 +1,128 @@
+"""
+Registro (ledger) dos disparos já realizados
+Evita reenviar o mesmo relatório do dia quando o agendador repete ou dispara em dobro
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dispatch_ledger (
+        report_type TEXT NOT NULL,
+        dispatch_date TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        dispatched_at TEXT NOT NULL,
+        PRIMARY KEY (report_type, dispatch_date, recipient, content_hash)
+    );
+"""
+
+
+def content_hash(message: str) -> str:
+    """
+    Calcula o hash do conteúdo de uma mensagem
+    
+    Args:
+        message: Texto da mensagem
+        
+    Returns:
+        Hash SHA-256 resumido
+    """
+    return hashlib.sha256(message.encode('utf-8')).hexdigest()[:32]
+
+
+class DispatchLedger:
+    """
+    Registro persistente dos relatórios enviados, por (tipo, data, destinatário, conteúdo)
+    
+    Depois de montar o relatório, o dispatcher verifica se exatamente este
+    conteúdo já foi entregue a todos os destinatários no dia; se sim, a
+    execução termina sem envio. Um relatório que mudou no mesmo dia (ex.:
+    novas contas lançadas) é enviado de novo, e dias sem dados não são
+    registrados, para não bloquear uma execução posterior que encontre dados.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Inicializa o ledger
+        
+        Args:
+            path: Caminho do arquivo SQLite
+        """
+        self.path = path
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _connect(self):
+        """Abre uma conexão SQLite, com commit ao final"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def already_dispatched(self, report_type: str, dispatch_date: date, recipients: List[str],
+                           message: str) -> bool:
+        """
+        Verifica se este conteúdo do relatório do dia já foi entregue a todos os destinatários
+        
+        Args:
+            report_type: Tipo do relatório
+            dispatch_date: Data de referência do relatório
+            recipients: Números dos destinatários
+            message: Texto do relatório recém-montado
+            
+        Returns:
+            True se todos os destinatários já têm registro para o tipo, data e conteúdo
+        """
+        if not recipients:
+            return False
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT DISTINCT recipient FROM dispatch_ledger
+                WHERE report_type = ? AND dispatch_date = ? AND content_hash = ?
+                  AND recipient IN ({', '.join('?' for _ in recipients)})
+                """,
+                (report_type, dispatch_date.isoformat(), content_hash(message), *recipients)
+            ).fetchall()
+        return len(rows) == len(set(recipients))
+    
+    def record(self, report_type: str, dispatch_date: date, recipients: List[str], message: str):
+        """
+        Registra que o relatório foi entregue aos destinatários
+        
+        Args:
+            report_type: Tipo do relatório
+            dispatch_date: Data de referência do relatório
+            recipients: Números que receberam a mensagem
+            message: Texto enviado
+        """
+        if not recipients:
+            return
+        digest = content_hash(message)
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO dispatch_ledger
+                    (report_type, dispatch_date, recipient, content_hash, dispatched_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(report_type, dispatch_date.isoformat(), number, digest, now) for number in recipients]
+            )
+        logger.debug(f"Disparo registrado no ledger: {report_type} {dispatch_date} ({len(recipients)} destinatário(s))")
@@ -1,9 +1,19 @@
 """
 Sistema de disparo de notificações via WhatsApp para Odoo
-Notificações são executadas via cron jobs do Railway
+O processo web é dono da agenda: executa os disparos em horários cron, no próprio processo,
+reaproveitando conexões PostgreSQL e sessões HTTP entre as execuções
 """
 import logging
-import time
+import signal
+import threading
+from typing import Callable, Dict, List
+
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("main")
+
+from config import settings
+from scheduler import Scheduler, ScheduledJob
 
 # Configuração de logging
 logging.basicConfig(
@@ -16,32 +26,150 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Valor de SCHEDULE_* que desativa o job
+DISABLED_SCHEDULE = 'off'
+
+
+class WarmDispatchers:
+    """
+    Dispatchers mantidos abertos entre as execuções dos jobs
+    
+    Cada job tem o seu dispatcher (jobs podem rodar ao mesmo tempo em workers
+    diferentes); todos compartilham o pool PostgreSQL do processo. Um dispatcher
+    que não pôde ser criado (ex.: banco fora do ar) é criado de novo na próxima
+    execução do job.
+    """
+    
+    def __init__(self):
+        self._dispatchers: Dict[str, object] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name: str, factory: Callable):
+        """
+        Retorna o dispatcher de um job, criando-o na primeira chamada
+        
+        Args:
+            name: Nome do job
+            factory: Função que cria o dispatcher
+        
+        Returns:
+            Dispatcher do job
+        """
+        with self._lock:
+            dispatcher = self._dispatchers.get(name)
+        if dispatcher is None:
+            dispatcher = factory()
+            with self._lock:
+                self._dispatchers[name] = dispatcher
+        return dispatcher
+    
+    def close(self):
+        """Fecha todos os dispatchers"""
+        with self._lock:
+            dispatchers = list(self._dispatchers.items())
+            self._dispatchers.clear()
+        for name, dispatcher in dispatchers:
+            try:
+                dispatcher.close()
+            except Exception as e:
+                logger.error(f"Erro ao fechar dispatcher do job {name}: {e}")
+
+
+def build_jobs(dispatchers: WarmDispatchers) -> List[ScheduledJob]:
+    """
+    Monta os jobs agendados a partir das variáveis SCHEDULE_*
+    
+    Args:
+        dispatchers: Dispatchers reaproveitados entre as execuções
+    
+    Returns:
+        Jobs ativos (os configurados como "off" ficam de fora)
+    
+    Raises:
+        ValueError: Se alguma expressão cron for inválida
+    """
+    from accounts_dispatcher import AccountsDispatcher
+    from purchases_dispatcher import PurchasesDispatcher
+    
+    def health_check() -> bool:
+        from scripts import health_check as health_check_script
+        return health_check_script.main() == 0
+    
+    def accounts_today() -> bool:
+        return dispatchers.get('accounts_today', AccountsDispatcher).dispatch_today()
+    
+    def purchases() -> bool:
+        return dispatchers.get('purchases', PurchasesDispatcher).send_purchases_summary()
+    
+    def purchase_changes() -> bool:
+        return dispatchers.get('purchase_changes', PurchasesDispatcher).send_purchase_changes()
+    
+    schedules = [
+        ('health_check', settings.SCHEDULE_HEALTH_CHECK, health_check),
+        ('accounts_today', settings.SCHEDULE_ACCOUNTS_TODAY, accounts_today),
+        ('purchases', settings.SCHEDULE_PURCHASES, purchases),
+        ('purchase_changes', settings.SCHEDULE_PURCHASE_CHANGES, purchase_changes),
+    ]
+    jobs = []
+    for name, cron, func in schedules:
+        if cron.strip().lower() == DISABLED_SCHEDULE:
+            logger.info(f"Job {name} desativado")
+            continue
+        jobs.append(ScheduledJob(name, cron, func))
+    return jobs
+
+
+def warm_up():
+    """Abre o pool PostgreSQL antes do primeiro job (uma falha aqui não impede o início)"""
+    try:
+        from clients import create_postgres_client
+        client = create_postgres_client()
+        client.execute_query("SELECT 1", retry=False)
+        # Com pool, close() apenas libera o cliente; a conexão continua aberta no pool
+        client.close()
+        logger.info("Pool PostgreSQL aquecido")
+    except Exception as e:
+        logger.warning(f"Não foi possível aquecer o pool PostgreSQL: {e}")
+
 
 def main():
     """
     Função principal
-    Mantém o processo rodando enquanto os cron jobs executam as tarefas agendadas
+    Executa o agendador até o processo receber SIGTERM/SIGINT
     """
+    from postgres_client import close_shared_pools
+    
+    dispatchers = WarmDispatchers()
+    jobs = build_jobs(dispatchers)
+    scheduler = Scheduler(jobs, timezone=settings.SCHEDULER_TIMEZONE, workers=settings.SCHEDULER_WORKERS)
+    
+    def handle_signal(signum, frame):
+        logger.info(f"Sinal {signal.Signals(signum).name} recebido; encerrando agendador")
+        scheduler.request_stop()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
     logger.info("=" * 80)
     logger.info("Sistema de Notificação Odoo - Serviço Iniciado")
     logger.info("=" * 80)
-    logger.info("Os disparos são executados via cron jobs do Railway:")
-    logger.info("  - 07:30: Contas a receber (vencimento hoje)")
-    logger.info("  - 07:30: Contas a pagar (vencimento hoje)")
-    logger.info("  - 17:30: Compras atualizadas no dia")
-    logger.info("=" * 80)
-    logger.info("Serviço mantendo processo ativo...")
+    logger.info(f"Agendador: fuso {settings.SCHEDULER_TIMEZONE}, {settings.SCHEDULER_WORKERS} worker(s), {len(jobs)} job(s)")
+    
+    warm_up()
+    # Processo pronto para o primeiro job: fim do cold start
+    startup_profiler.finish()
     
     try:
-        # Mantém o processo rodando
-        while True:
-            time.sleep(60)  # Dorme por 60 segundos
-            
-    except KeyboardInterrupt:
-        logger.info("\nServiço interrompido pelo usuário")
+        scheduler.run_forever()
     except Exception as e:
         logger.error(f"Erro fatal: {e}", exc_info=True)
         raise
+    finally:
+        logger.info("Aguardando jobs em execução...")
+        scheduler.stop(wait=True)
+        dispatchers.close()
+        close_shared_pools()
+        logger.info(f"Serviço encerrado: {scheduler.stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""
+Divisão de mensagens WhatsApp grandes em partes numeradas
+Quebra a mensagem entre registros, respeitando um limite de caracteres e/ou bytes por parte
+"""
+import logging
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rótulo no início de cada parte quando a mensagem é dividida
+PART_LABEL = "📄 Parte {index}/{total}\n\n"
+
+# Espaço mínimo de uma parte, descontado o rótulo
+MIN_PART_SIZE = 100
+
+
+def _measure(text: str) -> Tuple[int, int]:
+    """Tamanho de um texto em caracteres e em bytes UTF-8"""
+    return len(text), len(text.encode('utf-8'))
+
+
+class MessageSegmenter:
+    """
+    Divide uma mensagem em partes que cabem no limite do WhatsApp
+    
+    A mensagem é informada como uma sequência de blocos (cabeçalho, um bloco por
+    registro, rodapé) e cada parte é formada por blocos inteiros, na ordem. Só um
+    bloco que sozinho passa do limite é quebrado, entre linhas e, em último caso,
+    no meio da linha. Uma mensagem que cabe no limite é devolvida inteira e sem
+    rótulo; quando dividida, cada parte começa com "📄 Parte 1/4".
+    """
+    
+    def __init__(self, max_chars: int = 4000, max_bytes: int = 0):
+        """
+        Inicializa o segmentador
+        
+        Args:
+            max_chars: Máximo de caracteres por parte, incluindo o rótulo
+            max_bytes: Máximo de bytes UTF-8 por parte, incluindo o rótulo (0 = sem limite)
+        """
+        label_chars, label_bytes = _measure(PART_LABEL.format(index=999, total=999))
+        if max_chars < label_chars + MIN_PART_SIZE:
+            raise ValueError(f"Limite de caracteres por mensagem muito pequeno: {max_chars}")
+        if max_bytes and max_bytes < label_bytes + MIN_PART_SIZE:
+            raise ValueError(f"Limite de bytes por mensagem muito pequeno: {max_bytes}")
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+    
+    def _within(self, chars: int, size: int, max_chars: int, max_bytes: int) -> bool:
+        """Verifica se um tamanho cabe no limite"""
+        return chars <= max_chars and (not max_bytes or size <= max_bytes)
+    
+    def _cut(self, text: str, max_chars: int, max_bytes: int) -> Iterable[str]:
+        """Quebra no meio da linha um texto maior que o limite"""
+        start = 0
+        while start < len(text):
+            end = min(start + max_chars, len(text))
+            if max_bytes:
+                size = len(text[start:end].encode('utf-8'))
+                while size > max_bytes:
+                    # Reduz proporcionalmente ao excesso; converge em poucas iterações
+                    end = start + max(1, min(end - start - 1, (end - start) * max_bytes // size))
+                    size = len(text[start:end].encode('utf-8'))
+            yield text[start:end]
+            start = end
+    
+    def _pieces(self, block: str, max_chars: int, max_bytes: int) -> Iterable[Tuple[str, int, int]]:
+        """
+        Pedaços de um bloco que cabem no limite, com seus tamanhos
+        
+        Um bloco que cabe é um pedaço só; um maior é quebrado em linhas e as
+        linhas maiores que o limite, no meio.
+        """
+        chars, size = _measure(block)
+        if self._within(chars, size, max_chars, max_bytes):
+            yield block, chars, size
+            return
+        
+        logger.warning(f"Registro com {chars} caractere(s) maior que o limite da mensagem; quebrado entre linhas")
+        for line in block.splitlines(keepends=True):
+            chars, size = _measure(line)
+            if self._within(chars, size, max_chars, max_bytes):
+                yield line, chars, size
+            else:
+                for piece in self._cut(line, max_chars, max_bytes):
+                    yield (piece, *_measure(piece))
+    
+    def _pack(self, blocks: List[str], max_chars: int, max_bytes: int) -> List[str]:
+        """Agrupa os blocos, na ordem, no menor número de partes que cabem no limite"""
+        parts = []
+        current = []
+        chars = size = 0
+        for block in blocks:
+            for piece, piece_chars, piece_size in self._pieces(block, max_chars, max_bytes):
+                if current and not self._within(chars + piece_chars, size + piece_size, max_chars, max_bytes):
+                    parts.append(''.join(current))
+                    current = []
+                    chars = size = 0
+                current.append(piece)
+                chars += piece_chars
+                size += piece_size
+        if current:
+            parts.append(''.join(current))
+        return parts
+    
+    def split(self, blocks: Iterable[str]) -> List[str]:
+        """
+        Divide uma mensagem em partes numeradas
+        
+        Args:
+            blocks: Blocos da mensagem, na ordem; a mensagem completa é a concatenação deles
+        
+        Returns:
+            Partes da mensagem (uma só, sem rótulo, se a mensagem couber no limite;
+            lista vazia se a mensagem for vazia)
+        """
+        blocks = [block for block in blocks if block]
+        message = ''.join(blocks)
+        if not message:
+            return []
+        if self._within(*_measure(message), self.max_chars, self.max_bytes):
+            return [message]
+        
+        # O rótulo ocupa espaço em cada parte e cresce com a quantidade de dígitos do total
+        digits = 1
+        while True:
+            label_chars, label_bytes = _measure(PART_LABEL.format(index='9' * digits, total='9' * digits))
+            parts = self._pack(
+                blocks,
+                self.max_chars - label_chars,
+                self.max_bytes - label_bytes if self.max_bytes else 0
+            )
+            if len(str(len(parts))) <= digits:
+                break
+            digits = len(str(len(parts)))
+        
+        total = len(parts)
+        logger.info(f"Mensagem com {len(message)} caractere(s) dividida em {total} parte(s)")
+        return [
+            PART_LABEL.format(index=index, total=total) + part.rstrip('\n')
+            for index, part in enumerate(parts, 1)
+        ]
@@ -0,0 +1,420 @@
+"""
+Outbox local (SQLite) das mensagens WhatsApp
+Guarda as mensagens renderizadas antes do envio para que falhas sejam reenviadas na próxima execução
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from async_whatsapp_client import AsyncWhatsAppClient, BatchSendResult
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+STATUS_EXPIRED = 'expired'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        report_type TEXT NOT NULL,
+        number TEXT NOT NULL,
+        message TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        claim_token TEXT,
+        claimed_at TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        sent_at TEXT,
+        sequence_key TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status);
+"""
+
+# Índice criado depois da migração de bancos anteriores à coluna sequence_key
+SEQUENCE_INDEX = "CREATE INDEX IF NOT EXISTS idx_outbox_sequence ON outbox (sequence_key)"
+
+
+def split_failed_recipients(batch: BatchSendResult) -> Tuple[List[str], List[str]]:
+    """
+    Separa os destinatários com falha entre os que terão reenvio e os descartados
+    
+    Um destinatário com alguma parte descartada conta como descartado: as partes
+    seguintes também são descartadas e a mensagem não chegará completa.
+    
+    Args:
+        batch: Resultado de Outbox.deliver
+        
+    Returns:
+        Tupla (pendentes, descartados) com os números em ordem
+    """
+    discarded = {r['number'] for r in batch.discarded}
+    pending = {r['number'] for r in batch.failures} - discarded
+    return sorted(pending), sorted(discarded)
+
+
+def make_idempotency_key(report_type: str, number: str, message: str) -> str:
+    """
+    Gera a chave de idempotência de uma mensagem
+    
+    A mesma mensagem para o mesmo destinatário gera sempre a mesma chave,
+    então um reenvio não cria entrada duplicada.
+    
+    Args:
+        report_type: Tipo do relatório (ex.: 'receivables', 'payables', 'purchases')
+        number: Número do destinatário
+        message: Texto renderizado da mensagem
+        
+    Returns:
+        Chave de idempotência
+    """
+    digest = hashlib.sha256(message.encode('utf-8')).hexdigest()[:32]
+    return f"{report_type}:{number}:{digest}"
+
+
+class Outbox:
+    """
+    Fila persistente de mensagens a enviar
+    
+    Cada mensagem é gravada como pendente antes do envio e marcada como
+    enviada depois. Se o envio falhar, ela continua pendente e é reenviada
+    por drain() na próxima execução, até max_attempts tentativas.
+    """
+    
+    def __init__(self, path: str, max_attempts: int = 5, max_age_hours: int = 48,
+                 claim_timeout: int = 600):
+        """
+        Inicializa o outbox
+        
+        Args:
+            path: Caminho do arquivo SQLite
+            max_attempts: Tentativas antes de marcar a mensagem como falha definitiva
+            max_age_hours: Idade máxima de uma mensagem pendente; mais antigas expiram
+            claim_timeout: Segundos até uma mensagem em envio por outro processo
+                (que pode ter morrido) voltar a ser considerada pendente
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.max_age_hours = max_age_hours
+        self.claim_timeout = claim_timeout
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if 'sequence_key' not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN sequence_key TEXT")
+            conn.execute(SEQUENCE_INDEX)
+    
+    @contextmanager
+    def _connect(self):
+        """Abre uma conexão SQLite em modo WAL, com commit ao final"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec='seconds')
+    
+    def enqueue(self, report_type: str, number: str, message: str, force: bool = False,
+                sequence_key: Optional[str] = None) -> str:
+        """
+        Grava uma mensagem como pendente (sem efeito se ela já existir)
+        
+        Args:
+            report_type: Tipo do relatório
+            number: Número do destinatário
+            message: Texto renderizado da mensagem
+            force: Se True, uma mensagem já enviada, falha ou expirada volta a ser pendente
+            sequence_key: Chave comum às partes de uma mensagem dividida (None: mensagem inteira)
+            
+        Returns:
+            Chave de idempotência da mensagem
+        """
+        key = make_idempotency_key(report_type, number, message)
+        now = self._now()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO outbox
+                    (idempotency_key, report_type, number, message, status, created_at, updated_at, sequence_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, report_type, number, message, STATUS_PENDING, now, now, sequence_key)
+            )
+            if force:
+                conn.execute(
+                    """
+                    UPDATE outbox SET status = ?, attempts = 0, created_at = ?, updated_at = ?
+                    WHERE idempotency_key = ? AND status IN (?, ?, ?)
+                    """,
+                    (STATUS_PENDING, now, now, key, STATUS_SENT, STATUS_FAILED, STATUS_EXPIRED)
+                )
+        return key
+    
+    def _claim(self, keys: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Reserva mensagens pendentes para envio por este processo
+        
+        Args:
+            keys: Chaves específicas a reservar (None: todas as pendentes)
+            
+        Returns:
+            Mensagens reservadas
+        """
+        token = uuid.uuid4().hex
+        now = datetime.now()
+        stale_before = (now - timedelta(seconds=self.claim_timeout)).isoformat(timespec='seconds')
+        expire_before = (now - timedelta(hours=self.max_age_hours)).isoformat(timespec='seconds')
+        now_str = now.isoformat(timespec='seconds')
+        
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE: impede que dois cron jobs reservem a mesma mensagem
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ? AND created_at < ?",
+                (STATUS_EXPIRED, now_str, STATUS_PENDING, expire_before)
+            )
+            self._fail_orphaned_parts(conn, now_str)
+            
+            query = """
+                UPDATE outbox SET status = ?, claim_token = ?, claimed_at = ?, updated_at = ?
+                WHERE (status = ? OR (status = ? AND claimed_at < ?))
+            """
+            params = [STATUS_SENDING, token, now_str, now_str, STATUS_PENDING, STATUS_SENDING, stale_before]
+            if keys is not None:
+                if not keys:
+                    return []
+                query += f" AND idempotency_key IN ({', '.join('?' for _ in keys)})"
+                params.extend(keys)
+            conn.execute(query, params)
+            
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE claim_token = ? ORDER BY id",
+                (token,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def _fail_orphaned_parts(conn: sqlite3.Connection, now: str):
+        """
+        Descarta as partes seguintes a uma parte descartada (falha definitiva ou expirada)
+        
+        Sem a parte anterior, o destinatário receberia a mensagem dividida incompleta
+        e fora de contexto (ex.: "2/3" e "3/3" sem o "1/3").
+        """
+        cursor = conn.execute(
+            """
+            UPDATE outbox SET status = ?, last_error = ?, claim_token = NULL, updated_at = ?
+            WHERE status = ? AND sequence_key IS NOT NULL AND EXISTS (
+                SELECT 1 FROM outbox AS previous
+                WHERE previous.sequence_key = outbox.sequence_key
+                  AND previous.id < outbox.id
+                  AND previous.status IN (?, ?)
+            )
+            """,
+            (STATUS_FAILED, 'parte anterior da mensagem descartada', now, STATUS_PENDING,
+             STATUS_FAILED, STATUS_EXPIRED)
+        )
+        if cursor.rowcount:
+            logger.error(f"{cursor.rowcount} parte(s) de mensagem dividida descartada(s) porque uma parte anterior foi descartada")
+    
+    def _record_results(self, entries: List[Dict], batch: BatchSendResult):
+        """Atualiza o status das mensagens de acordo com o resultado do envio"""
+        now = self._now()
+        with self._connect() as conn:
+            for entry, result in zip(entries, batch.results):
+                if result.get('skipped'):
+                    # Não chegou a ser enviada (a anterior da sequência falhou): volta sem gastar tentativa
+                    conn.execute(
+                        "UPDATE outbox SET status = ?, claim_token = NULL, updated_at = ? WHERE id = ?",
+                        (STATUS_PENDING, now, entry['id'])
+                    )
+                    continue
+                attempts = entry['attempts'] + 1
+                if result['success']:
+                    conn.execute(
+                        """
+                        UPDATE outbox SET status = ?, attempts = ?, last_error = NULL,
+                            claim_token = NULL, updated_at = ?, sent_at = ?
+                        WHERE id = ?
+                        """,
+                        (STATUS_SENT, attempts, now, now, entry['id'])
+                    )
+                else:
+                    status = STATUS_FAILED if attempts >= self.max_attempts else STATUS_PENDING
+                    conn.execute(
+                        """
+                        UPDATE outbox SET status = ?, attempts = ?, last_error = ?,
+                            claim_token = NULL, updated_at = ?
+                        WHERE id = ?
+                        """,
+                        (status, attempts, str(result['error'])[:500], now, entry['id'])
+                    )
+                    if status == STATUS_FAILED:
+                        logger.error(
+                            f"Mensagem {entry['idempotency_key']} descartada após {attempts} tentativa(s)"
+                        )
+            self._fail_orphaned_parts(conn, now)
+    
+    def _send_entries(self, sender: AsyncWhatsAppClient, entries: List[Dict]) -> BatchSendResult:
+        """
+        Envia as mensagens reservadas em lote e registra o resultado
+        
+        As mensagens de um mesmo tipo de relatório para um mesmo destinatário
+        (ex.: as partes de uma mensagem dividida) formam uma sequência enviada
+        na ordem do outbox; sequências diferentes são enviadas em paralelo.
+        """
+        if not entries:
+            return BatchSendResult([])
+        sequences: Dict[tuple, List[Dict]] = {}
+        for entry in entries:
+            sequences.setdefault((entry['number'], entry['report_type']), []).append(entry)
+        # Resultados vêm na ordem das sequências; as entradas são reordenadas da mesma forma
+        entries = [entry for sequence in sequences.values() for entry in sequence]
+        batch = sender.send_sequences_sync([
+            [(entry['number'], entry['message']) for entry in sequence]
+            for sequence in sequences.values()
+        ])
+        self._record_results(entries, batch)
+        for entry, result in zip(entries, batch.results):
+            result['idempotency_key'] = entry['idempotency_key']
+        return batch
+    
+    def deliver(self, sender: AsyncWhatsAppClient, report_type: str, message: Union[str, Sequence[str]],
+                recipients: List[str], force: bool = False) -> BatchSendResult:
+        """
+        Grava a mensagem no outbox e a envia para os destinatários
+        
+        Destinatários que já receberam exatamente esta mensagem são ignorados.
+        Se o envio falhar, a mensagem fica pendente para o próximo drain().
+        Uma mensagem já descartada (falha definitiva ou expirada) não é reenviada
+        sem force, mas entra no resultado como falha. Cada falha traz discarded:
+        True se o outbox desistiu da mensagem (antes ou neste envio), False se
+        ela continua pendente para o próximo drain().
+        Uma mensagem dividida (ver MessageSegmenter) é informada como a lista
+        das partes: cada destinatário recebe as partes em ordem, uma parte que
+        falhar segura as seguintes até o reenvio e, se ela for descartada, as
+        seguintes também são.
+        
+        Args:
+            sender: Cliente WhatsApp assíncrono usado no envio
+            report_type: Tipo do relatório
+            message: Texto renderizado da mensagem, ou lista das partes na ordem
+            recipients: Números dos destinatários
+            force: Se True, reenvia mesmo para quem já recebeu esta mensagem
+            
+        Returns:
+            Resultado do lote enviado agora (um item por parte e destinatário)
+        """
+        parts = [message] if isinstance(message, str) else list(message)
+        keys = []
+        for number in recipients:
+            sequence_key = make_idempotency_key(report_type, number, ''.join(parts)) if len(parts) > 1 else None
+            keys.extend(self.enqueue(report_type, number, part, force, sequence_key) for part in parts)
+        entries = self._claim(keys)
+        claimed = {entry['idempotency_key'] for entry in entries}
+        unclaimed = self._statuses([key for key in keys if key not in claimed])
+        
+        # Já enviadas ou em envio por outro processo estão resolvidas; descartadas contam como falha
+        handled = sum(1 for row in unclaimed if row['status'] in (STATUS_SENT, STATUS_SENDING))
+        if handled:
+            logger.info(f"{handled} mensagem(ns) já recebida(s) pelo destinatário ou em envio por outro processo")
+        discarded = [row for row in unclaimed if row['status'] in (STATUS_FAILED, STATUS_EXPIRED)]
+        if discarded:
+            logger.warning(
+                f"{len(discarded)} mensagem(ns) descartada(s) em execução anterior "
+                f"(falha definitiva ou expirada); use --force para reenviar"
+            )
+        
+        batch = self._send_entries(sender, entries)
+        results = list(batch.results)
+        
+        # Uma falha deste envio também pode ter sido descartada (tentativas esgotadas
+        # ou parte anterior descartada): o status gravado diz se ainda haverá reenvio
+        failed_keys = [r['idempotency_key'] for r in results if not r['success']]
+        statuses = {row['idempotency_key']: row['status'] for row in self._statuses(failed_keys)}
+        for result in results:
+            if not result['success']:
+                result['discarded'] = statuses.get(result['idempotency_key']) in (STATUS_FAILED, STATUS_EXPIRED)
+        
+        for row in discarded:
+            results.append({
+                'index': len(results), 'number': row['number'], 'success': False, 'response': None,
+                'error': f"mensagem {'expirada' if row['status'] == STATUS_EXPIRED else 'descartada'} no outbox: {row['last_error']}",
+                'idempotency_key': row['idempotency_key'], 'discarded': True
+            })
+        return BatchSendResult(results)
+    
+    def _statuses(self, keys: List[str]) -> List[Dict]:
+        """
+        Consulta o status atual de mensagens
+        
+        Args:
+            keys: Chaves de idempotência
+            
+        Returns:
+            Linhas (idempotency_key, number, status, last_error) das mensagens encontradas
+        """
+        if not keys:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT idempotency_key, number, status, last_error FROM outbox
+                WHERE idempotency_key IN ({', '.join('?' for _ in keys)})
+                ORDER BY id
+                """,
+                keys
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def drain(self, sender: AsyncWhatsAppClient) -> BatchSendResult:
+        """
+        Reenvia em lote todas as mensagens pendentes de execuções anteriores
+        
+        Args:
+            sender: Cliente WhatsApp assíncrono usado no envio
+            
+        Returns:
+            Resultado do lote reenviado
+        """
+        entries = self._claim()
+        if not entries:
+            return BatchSendResult([])
+        logger.info(f"Reenviando {len(entries)} mensagem(ns) pendente(s) do outbox")
+        batch = self._send_entries(sender, entries)
+        logger.info(f"Outbox: {batch.sent} reenviada(s), {batch.failed} ainda pendente(s) ou descartada(s)")
+        return batch
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna a quantidade de mensagens por status
+        
+        Returns:
+            Dicionário {status: quantidade}
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS total FROM outbox GROUP BY status").fetchall()
+        return {row['status']: row['total'] for row in rows}
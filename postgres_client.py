@@ -3,18 +3,623 @@ Cliente para integração direta com PostgreSQL do Odoo
 Busca dados de faturas diretamente do banco de dados
 """
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from functools import lru_cache
+import hashlib
+import re
+import weakref
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 import logging
+import threading
+import time
+import uuid
+
+import startup_profiler
+from circuit_breaker import CircuitBreaker
+from retry_policy import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
 
+class PostgresClientError(Exception):
+    """Erro base das consultas do PostgresClient"""
+
+
+class QueryTimeoutError(PostgresClientError):
+    """A consulta foi cancelada por exceder o statement_timeout"""
+
+
+class ConnectionLostError(PostgresClientError):
+    """A conexão com o PostgreSQL caiu (ou não abriu) e as novas tentativas se esgotaram"""
+
+
+class EmptyResultError(PostgresClientError):
+    """A consulta não retornou a linha esperada"""
+
+
+def session_options(statement_timeout: Optional[float] = None, read_only: bool = False) -> Optional[str]:
+    """
+    Monta o parâmetro options do libpq com as configurações da sessão
+    
+    Args:
+        statement_timeout: Timeout de cada consulta em segundos (None ou 0 para sem limite)
+        read_only: Se True, toda transação da sessão é somente leitura
+            (default_transaction_read_only), inclusive em autocommit
+        
+    Returns:
+        String para o parâmetro options de psycopg2.connect, ou None
+    """
+    options = []
+    if statement_timeout:
+        options.append(f"-c statement_timeout={int(statement_timeout * 1000)}")
+    if read_only:
+        options.append("-c default_transaction_read_only=on")
+    return " ".join(options) or None
+
+
+def connect_with_breaker(circuit_breaker: Optional[CircuitBreaker], **connect_kwargs):
+    """
+    Abre uma conexão psycopg2 respeitando o circuit breaker
+    
+    Com o circuito aberto, falha na hora com CircuitOpenError em vez de
+    aguardar o connect_timeout contra um banco inacessível.
+    
+    Args:
+        circuit_breaker: Circuit breaker do PostgreSQL (None para não usar)
+        **connect_kwargs: Parâmetros repassados para psycopg2.connect
+    
+    Returns:
+        Conexão psycopg2
+    """
+    if circuit_breaker is not None:
+        circuit_breaker.before_call()
+    try:
+        conn = psycopg2.connect(**connect_kwargs)
+    except Exception as e:
+        logger.error(f"Erro ao conectar ao PostgreSQL: {e}")
+        if circuit_breaker is not None and isinstance(e, psycopg2.OperationalError):
+            circuit_breaker.record_failure()
+        raise
+    if circuit_breaker is not None:
+        circuit_breaker.record_success()
+    return conn
+
+
+class PostgresConnectionPool:
+    """
+    Pool de conexões PostgreSQL compartilhado entre os clientes
+    
+    Mantém conexões abertas entre consultas para evitar o custo de
+    handshake TCP+TLS+autenticação a cada dispatcher.
+    """
+    
+    def __init__(self, host: str, port: int, database: str, user: str, password: str,
+                 min_size: int = 1, max_size: int = 5, idle_timeout: float = 300,
+                 check_on_checkout: bool = True, connect_timeout: int = 10,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 statement_timeout: Optional[float] = None,
+                 application_name: Optional[str] = None,
+                 read_only: bool = False, autocommit: bool = False):
+        """
+        Inicializa o pool de conexões
+        
+        Args:
+            host: Host do servidor PostgreSQL
+            port: Porta do servidor PostgreSQL
+            database: Nome do banco de dados
+            user: Usuário do banco de dados
+            password: Senha do banco de dados
+            min_size: Quantidade mínima de conexões mantidas abertas
+            max_size: Quantidade máxima de conexões simultâneas
+            idle_timeout: Segundos que uma conexão ociosa pode ficar no pool
+            check_on_checkout: Se True, valida a conexão com SELECT 1 ao retirá-la do pool
+            connect_timeout: Timeout de conexão em segundos
+            circuit_breaker: Circuit breaker consultado antes de abrir novas conexões
+            statement_timeout: Timeout padrão de cada consulta, em segundos (None para sem limite)
+            application_name: Nome da aplicação exibido em pg_stat_activity
+            read_only: Se True, as sessões são somente leitura
+            autocommit: Se True, as conexões ficam em autocommit e não seguram
+                transação (nem snapshot) entre as consultas
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Tamanhos de pool inválidos: min={min_size}, max={max_size}")
+        
+        self.host = host
+        self.port = port
+        self.database = database
+        self.user = user
+        self.password = password
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_on_checkout = check_on_checkout
+        self.connect_timeout = connect_timeout
+        self.circuit_breaker = circuit_breaker
+        self.statement_timeout = statement_timeout
+        self.application_name = application_name
+        self.read_only = read_only
+        self.autocommit = autocommit
+        
+        self._idle: List[Tuple[object, float]] = []
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.connections_discarded = 0
+        
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+    
+    def _new_connection(self):
+        """Abre uma nova conexão física com o PostgreSQL"""
+        conn = connect_with_breaker(
+            self.circuit_breaker,
+            host=self.host,
+            port=self.port,
+            database=self.database,
+            user=self.user,
+            password=self.password,
+            connect_timeout=self.connect_timeout,
+            options=session_options(self.statement_timeout, self.read_only),
+            application_name=self.application_name
+        )
+        conn.autocommit = self.autocommit
+        startup_profiler.milestone('first_db_connection')
+        with self._cond:
+            self.connections_created += 1
+        logger.info(
+            f"Conectado ao PostgreSQL com sucesso ({self.host}:{self.port}/{self.database}) "
+            f"[pool: {self.connections_created} conexão(ões) criada(s)]"
+        )
+        return conn
+    
+    def _discard(self, conn):
+        """Fecha uma conexão que não deve voltar ao pool"""
+        with self._cond:
+            self.connections_discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def _is_healthy(self, conn) -> bool:
+        """Verifica se uma conexão ociosa ainda está utilizável"""
+        if conn.closed:
+            return False
+        if not self.check_on_checkout:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexão do pool inválida, descartando: {e}")
+            return False
+    
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Retira uma conexão do pool, abrindo uma nova se necessário
+        
+        Args:
+            timeout: Segundos para aguardar uma conexão livre quando o pool está cheio
+        
+        Returns:
+            Conexão psycopg2
+        
+        Raises:
+            PoolError: Se o pool estiver fechado ou esgotado após o timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("Pool de conexões fechado")
+                
+                conn = None
+                while self._idle:
+                    candidate, last_used = self._idle.pop()
+                    if time.monotonic() - last_used > self.idle_timeout:
+                        logger.debug("Conexão ociosa expirada, descartando")
+                        self._discard(candidate)
+                        continue
+                    conn = candidate
+                    break
+                
+                if conn is None and self._in_use + len(self._idle) >= self.max_size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolError(f"Pool de conexões esgotado ({self.max_size} em uso)")
+                    self._cond.wait(remaining)
+                    continue
+                
+                self._in_use += 1
+            
+            # Validação e abertura acontecem fora do lock para não bloquear outras threads
+            try:
+                if conn is not None:
+                    if self._is_healthy(conn):
+                        with self._cond:
+                            self.connections_reused += 1
+                        return conn
+                    self._discard(conn)
+                return self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+    
+    def putconn(self, conn, discard: bool = False):
+        """
+        Devolve uma conexão ao pool
+        
+        Args:
+            conn: Conexão retirada com getconn()
+            discard: Se True, fecha a conexão em vez de devolvê-la
+        """
+        if not discard and not conn.closed:
+            try:
+                # Encerra a transação implícita antes de devolver ao pool
+                conn.rollback()
+            except Exception:
+                discard = True
+        
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager que retira e devolve uma conexão do pool"""
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # Timeout de consulta e conflito na réplica não quebram a conexão; os demais erros de conexão sim
+            discard = not isinstance(e, (psycopg2.errors.QueryCanceled, psycopg2.extensions.TransactionRollbackError))
+            raise
+        finally:
+            # Também devolve a conexão quando um gerador (stream_query) é fechado antes do fim
+            self.putconn(conn, discard=discard)
+    
+    def stats(self) -> Dict:
+        """
+        Retorna contadores de uso do pool
+        
+        Returns:
+            Dicionário com conexões criadas, reutilizadas, descartadas, ociosas e em uso
+        """
+        with self._cond:
+            return {
+                'created': self.connections_created,
+                'reused': self.connections_reused,
+                'discarded': self.connections_discarded,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+            }
+    
+    def closeall(self):
+        """Fecha todas as conexões ociosas e impede novas retiradas"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        logger.info(f"Pool PostgreSQL fechado ({self.stats()})")
+
+
+_shared_pools: Dict[tuple, PostgresConnectionPool] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def get_shared_pool(host: str, port: int, database: str, user: str, password: str,
+                    **pool_options) -> PostgresConnectionPool:
+    """
+    Retorna o pool compartilhado do processo para os parâmetros de conexão
+    
+    Todos os dispatchers do mesmo processo que usam o mesmo banco recebem
+    a mesma instância, reaproveitando as conexões já abertas.
+    
+    Args:
+        host: Host do servidor PostgreSQL
+        port: Porta do servidor PostgreSQL
+        database: Nome do banco de dados
+        user: Usuário do banco de dados
+        password: Senha do banco de dados
+        **pool_options: Opções repassadas para PostgresConnectionPool na criação
+    
+    Returns:
+        Pool de conexões compartilhado
+    """
+    key = (host, port, database, user)
+    with _shared_pools_lock:
+        pool = _shared_pools.get(key)
+        if pool is None or pool._closed:
+            pool = PostgresConnectionPool(host, port, database, user, password, **pool_options)
+            _shared_pools[key] = pool
+        return pool
+
+
+def shared_pool_stats() -> Dict[str, Dict]:
+    """
+    Retorna os contadores de todos os pools compartilhados do processo
+    
+    Returns:
+        Dicionário {"host:porta/banco": estatísticas do pool}
+    """
+    with _shared_pools_lock:
+        pools = list(_shared_pools.values())
+    return {f"{pool.host}:{pool.port}/{pool.database}": pool.stats() for pool in pools}
+
+
+def close_shared_pools():
+    """Fecha todos os pools compartilhados do processo"""
+    with _shared_pools_lock:
+        pools = list(_shared_pools.values())
+        _shared_pools.clear()
+    for pool in pools:
+        pool.closeall()
+
+
+# Formatos de linha aceitos por execute_query/stream_query
+ROW_MODES = ('dict', 'compact')
+
+
+class CompactRow(Mapping):
+    """
+    Linha compacta de resultado: envolve a tupla devolvida pelo psycopg2
+    
+    Não copia os valores nem repete os nomes das colunas em cada linha: o
+    mapeamento coluna -> posição fica na classe, criada uma vez por formato
+    de consulta (ver compact_row_class). Funciona como um dict somente
+    leitura (row['campo'], row.get('campo'), dict(row)) e também permite
+    acesso por atributo (row.campo).
+    """
+    
+    __slots__ = ('_values',)
+    _columns: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+    
+    def __init__(self, values: tuple):
+        self._values = values
+    
+    def __getitem__(self, key: str):
+        return self._values[self._index[key]]
+    
+    def __getattr__(self, key: str):
+        # Atributos internos (ex.: _values antes do __init__, em copy/pickle) não são colunas
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return self._values[self._index[key]]
+        except KeyError:
+            raise AttributeError(key) from None
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+    
+    def __reduce__(self):
+        # A classe é gerada por consulta: copy/pickle recriam a linha a partir das colunas
+        return _rebuild_compact_row, (self._columns, self._values)
+
+
+@lru_cache(maxsize=128)
+def compact_row_class(columns: Tuple[str, ...]) -> type:
+    """
+    Retorna a classe de linha compacta para um conjunto de colunas
+    
+    Args:
+        columns: Nomes das colunas, na ordem do resultado
+    
+    Returns:
+        Subclasse de CompactRow (a mesma para consultas com as mesmas colunas)
+    """
+    # Em nomes repetidos vale a última coluna, como no RealDictCursor
+    index = {name: position for position, name in enumerate(columns)}
+    return type('CompactRow', (CompactRow,), {
+        '__slots__': (), '__module__': __name__, '_columns': columns, '_index': index
+    })
+
+
+def _rebuild_compact_row(columns: Tuple[str, ...], values: tuple) -> CompactRow:
+    """Recria uma linha compacta (usado por copy e pickle)"""
+    return compact_row_class(columns)(values)
+
+
+def _cursor_factory(row_mode: str):
+    """Fábrica de cursor para o formato de linha: tuplas no modo compacto, dicts no padrão"""
+    if row_mode not in ROW_MODES:
+        raise ValueError(f"row_mode inválido: {row_mode!r} (use um de {ROW_MODES})")
+    return None if row_mode == 'compact' else RealDictCursor
+
+
+def _row_converter(cursor, row_mode: str):
+    """Função que converte uma linha do cursor no formato pedido"""
+    if row_mode == 'compact':
+        return compact_row_class(tuple(column.name for column in cursor.description))
+    return dict
+
+
+# Conexão -> nomes (no servidor) dos prepared statements já preparados nela.
+# A entrada some junto com a conexão, então uma reconexão prepara tudo de novo.
+_prepared_on_connection = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def _to_positional_params(query: str) -> Tuple[str, int]:
+    """
+    Converte os placeholders %s do psycopg2 para $1, $2... do PREPARE
+    
+    Returns:
+        Tupla (query convertida, número de parâmetros)
+    """
+    count = 0
+    
+    def replace(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        count += 1
+        return f"${count}"
+    
+    return re.sub(r'%%|%s', replace, query), count
+
+
+class RowStream:
+    """
+    Iterador de linhas de uma consulta que conta as linhas já consumidas
+    
+    Permite que quem consome o resultado linha a linha (ex.: formatadores de
+    mensagem) saiba quantas linhas foram lidas sem manter a lista em memória.
+    """
+    
+    def __init__(self, rows: Iterable[Dict]):
+        """
+        Args:
+            rows: Linhas a iterar (gerador de stream_query ou uma lista comum)
+        """
+        self._rows = iter(rows)
+        self.count = 0
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return self
+    
+    def __next__(self) -> Dict:
+        row = next(self._rows)
+        self.count += 1
+        return row
+    
+    def close(self):
+        """Encerra a leitura antes do fim, liberando cursor e conexão"""
+        close = getattr(self._rows, 'close', None)
+        if close is not None:
+            close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MoveCache:
+    """
+    Cache LRU em memória dos lançamentos (account_move) buscados por ID
+    
+    Guarda até max_size lançamentos, descartando os usados há mais tempo, e
+    considera expirados os buscados há mais de ttl segundos (os totais de um
+    lançamento em rascunho ainda podem mudar).
+    """
+    
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = 300):
+        """
+        Inicializa o cache
+        
+        Args:
+            max_size: Máximo de lançamentos guardados
+            ttl: Segundos de validade de cada lançamento (None para sem expiração)
+        """
+        if max_size < 1:
+            raise ValueError(f"Tamanho de cache inválido: {max_size}")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_many(self, ids: Iterable[int]) -> Tuple[Dict[int, Dict], List[int]]:
+        """
+        Busca lançamentos no cache
+        
+        Args:
+            ids: IDs dos lançamentos
+            
+        Returns:
+            Tupla (lançamentos encontrados por ID, IDs ausentes ou expirados)
+        """
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for move_id in ids:
+                entry = self._entries.get(move_id)
+                if entry is not None and (self.ttl is None or now - entry[1] <= self.ttl):
+                    self._entries.move_to_end(move_id)
+                    # Cópia: quem recebe o lançamento pode alterá-lo sem afetar o cache
+                    found[move_id] = dict(entry[0])
+                else:
+                    if entry is not None:
+                        del self._entries[move_id]
+                    missing.append(move_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+    
+    def put_many(self, moves: Iterable[Dict]):
+        """Guarda lançamentos no cache, descartando os menos usados além de max_size"""
+        now = time.monotonic()
+        with self._lock:
+            for move in moves:
+                self._entries[move['id']] = (dict(move), now)
+                self._entries.move_to_end(move['id'])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Esvazia o cache"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna contadores de uso do cache
+        
+        Returns:
+            Dicionário com lançamentos guardados, acertos e faltas
+        """
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
 class PostgresClient:
     """Cliente para buscar dados diretamente do PostgreSQL do Odoo"""
     
-    def __init__(self, host: str, port: int, database: str, user: str, password: str):
+    def __init__(self, host: str, port: int, database: str, user: str, password: str,
+                 pool: Optional[PostgresConnectionPool] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 itersize: int = 2000, row_mode: str = 'dict',
+                 statement_timeout: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 application_name: Optional[str] = None,
+                 read_only: bool = False, autocommit: bool = False,
+                 move_cache: Optional[MoveCache] = None, batch_size: int = 1000):
         """
         Inicializa o cliente PostgreSQL
         
@@ -24,52 +629,413 @@ class PostgresClient:
             database: Nome do banco de dados
             user: Usuário do banco de dados
             password: Senha do banco de dados
+            pool: Pool de conexões compartilhado (opcional). Se informado, cada
+                query retira uma conexão do pool em vez de manter uma própria
+            circuit_breaker: Circuit breaker consultado antes de conectar (modo sem pool;
+                no modo pooled o breaker do pool é usado)
+            itersize: Linhas trazidas do servidor por vez em stream_query
+            row_mode: Formato padrão das linhas: 'dict' (dicionários) ou 'compact'
+                (CompactRow, mais leve para resultados grandes)
+            statement_timeout: Timeout padrão de cada consulta em segundos, no modo
+                sem pool (no modo pooled vale o do pool). None para sem limite
+            retry_policy: Novas tentativas, com reconexão, quando a conexão cai durante
+                uma leitura (None para não repetir)
+            application_name: Nome da aplicação exibido em pg_stat_activity (modo sem pool)
+            read_only: Se True, a sessão é somente leitura (modo sem pool)
+            autocommit: Se True, a conexão fica em autocommit (modo sem pool). No modo
+                pooled valem as configurações do pool
+            move_cache: Cache dos lançamentos buscados por ID (None para não usar cache)
+            batch_size: Máximo de IDs por consulta em get_moves_by_ids
         """
         self.host = host
         self.port = port
         self.database = database
         self.user = user
         self.password = password
+        self.pool = pool
+        self.circuit_breaker = circuit_breaker
+        self.itersize = itersize
+        self.row_mode = row_mode
+        _cursor_factory(row_mode)  # valida o formato
+        self.statement_timeout = statement_timeout
+        self.retry_policy = retry_policy
+        self.application_name = application_name
+        self.read_only = read_only
+        self.autocommit = autocommit
+        if batch_size < 1:
+            raise ValueError(f"Tamanho de lote inválido: {batch_size}")
+        self.move_cache = move_cache
+        self.batch_size = batch_size
+        # Prepared statements registrados: nome -> (nome no servidor, PREPARE, EXECUTE)
+        self._statements: Dict[str, Tuple[str, str, str]] = {}
+        self._statement_stats: Dict[str, Dict[str, int]] = {}
+        self._statements_lock = threading.Lock()
         self.conn = None
-        self._connect()
+        if self.pool is None:
+            self._connect()
     
     def _connect(self):
         """Conecta ao banco de dados PostgreSQL"""
+        self.conn = connect_with_breaker(
+            self.circuit_breaker,
+            host=self.host,
+            port=self.port,
+            database=self.database,
+            user=self.user,
+            password=self.password,
+            connect_timeout=10,
+            options=session_options(self.statement_timeout, self.read_only),
+            application_name=self.application_name
+        )
+        self.conn.autocommit = self.autocommit
+        startup_profiler.milestone('first_db_connection')
+        logger.info(f"Conectado ao PostgreSQL com sucesso ({self.host}:{self.port}/{self.database})")
+    
+    def _drop_connection(self):
+        """Descarta a conexão própria (modo sem pool) para que a próxima consulta reconecte"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+    
+    @contextmanager
+    def _connection(self):
+        """Fornece a conexão a ser usada: do pool (modo pooled) ou a conexão própria"""
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                yield conn
+            return
+        
+        if self.conn is None or self.conn.closed:
+            self._connect()
+        conn = self.conn
         try:
-            self.conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                connect_timeout=10
+            yield conn
+        finally:
+            # Encerra a transação implícita, como o pool faz ao receber a conexão de volta
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass  # Conexão quebrada: será refeita na próxima consulta
+    
+    def _set_timeout(self, conn, timeout: Optional[float]):
+        """Aplica um statement_timeout só à transação corrente (SET LOCAL)"""
+        if timeout is None:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+    
+    @contextmanager
+    def _transaction(self, conn, timeout: Optional[float], explicit: bool = False):
+        """
+        Delimita a transação de uma consulta
+        
+        Em autocommit não há transação entre as consultas; quando a consulta precisa
+        de uma (SET LOCAL do timeout, cursor nomeado), abre uma explícita e curta,
+        encerrada com rollback ao final.
+        
+        Args:
+            conn: Conexão psycopg2
+            timeout: statement_timeout desta consulta em segundos (None para o da conexão)
+            explicit: Se True, a consulta exige transação mesmo sem timeout
+        """
+        explicit = conn.autocommit and (explicit or timeout is not None)
+        if explicit:
+            conn.autocommit = False
+        try:
+            self._set_timeout(conn, timeout)
+            yield
+        finally:
+            if explicit:
+                try:
+                    conn.rollback()
+                    conn.autocommit = True
+                except Exception:
+                    pass  # Conexão quebrada: descartada pelo pool ou refeita na próxima consulta
+    
+    def _handle_error(self, error: Exception, query: str, attempt: int, started: float, retry: bool) -> float:
+        """
+        Classifica um erro de consulta e decide se há nova tentativa
+        
+        Args:
+            error: Exceção levantada pela consulta
+            query: Query executada (para o log)
+            attempt: Número da tentativa que falhou (começa em 1)
+            started: Instante (time.monotonic()) da primeira tentativa
+            retry: Se a operação pode ser repetida (leitura idempotente)
+        
+        Returns:
+            Segundos a aguardar antes da nova tentativa
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e não há mais tentativas
+            Exception: Demais erros, sem alteração
+        """
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            logger.error(f"Query cancelada por timeout: {error}")
+            logger.error(f"Query: {query[:200]}...")  # Log parcial da query
+            raise QueryTimeoutError(str(error).strip()) from error
+        
+        if isinstance(error, psycopg2.extensions.TransactionRollbackError):
+            # Ex.: consulta cancelada na réplica por conflito com a replicação; a conexão segue válida
+            delay = None
+            if retry and self.retry_policy is not None:
+                delay = self.retry_policy.next_delay(attempt, started)
+            if delay is None:
+                logger.error(f"Consulta revertida pelo servidor após {attempt} tentativa(s): {error}")
+                logger.error(f"Query: {query[:200]}...")  # Log parcial da query
+                raise
+            logger.warning(f"Consulta revertida pelo servidor (tentativa {attempt}): {error}. Repetindo em {delay:.1f}s")
+            return delay
+        
+        if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            # No pool, a conexão quebrada já foi descartada; sem pool, reconecta na próxima
+            if self.pool is None:
+                self._drop_connection()
+            delay = None
+            if retry and self.retry_policy is not None:
+                delay = self.retry_policy.next_delay(attempt, started)
+            if delay is None:
+                logger.error(f"Conexão com o PostgreSQL perdida após {attempt} tentativa(s): {error}")
+                logger.error(f"Query: {query[:200]}...")  # Log parcial da query
+                raise ConnectionLostError(str(error).strip()) from error
+            logger.warning(
+                f"Conexão com o PostgreSQL perdida (tentativa {attempt}): {error}. "
+                f"Reconectando em {delay:.1f}s"
             )
-            logger.info(f"Conectado ao PostgreSQL com sucesso ({self.host}:{self.port}/{self.database})")
-        except Exception as e:
-            logger.error(f"Erro ao conectar ao PostgreSQL: {e}")
-            raise
+            return delay
+        
+        logger.error(f"Erro ao executar query: {error}")
+        logger.error(f"Query: {query[:200]}...")  # Log parcial da query
+        raise error
     
-    def execute_query(self, query: str, params: tuple = None) -> List[Dict]:
+    def _run(self, query: str, work, retry: bool):
+        """
+        Executa work(conn) com uma conexão, reconectando e repetindo se ela cair
+        
+        Args:
+            query: Query executada (para o log)
+            work: Função que recebe a conexão e faz a consulta
+            retry: Se a operação pode ser repetida (leitura idempotente)
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self._connection() as conn:
+                    return work(conn)
+            except Exception as e:
+                delay = self._handle_error(e, query, attempt, started, retry)
+            time.sleep(delay)
+    
+    def execute_query(self, query: str, params: tuple = None, row_mode: Optional[str] = None,
+                      timeout: Optional[float] = None, retry: bool = True) -> List[Dict]:
         """
         Executa uma query SQL e retorna os resultados como lista de dicionários
         
         Args:
             query: Query SQL a ser executada
             params: Parâmetros para a query (tupla)
-            
+            row_mode: 'dict' ou 'compact' (padrão: o row_mode do cliente)
+            timeout: statement_timeout desta consulta em segundos (padrão: o da conexão)
+            retry: Se True, reconecta e repete quando a conexão cai. Use False
+                para comandos que não podem ser repetidos com segurança
+        
         Returns:
-            Lista de dicionários com os resultados
+            Lista de dicionários (ou de CompactRow, no modo compacto) com os resultados
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
         """
-        try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        row_mode = row_mode or self.row_mode
+        
+        def work(conn):
+            with self._transaction(conn, timeout), \
+                    conn.cursor(cursor_factory=_cursor_factory(row_mode)) as cursor:
                 cursor.execute(query, params)
                 results = cursor.fetchall()
-                # Converte para lista de dicionários
-                return [dict(row) for row in results]
-        except Exception as e:
-            logger.error(f"Erro ao executar query: {e}")
-            logger.error(f"Query: {query[:200]}...")  # Log parcial da query
-            raise
+                startup_profiler.milestone('first_db_result')
+                if not results:
+                    return []
+                # Converte para lista de dicionários (ou envolve as tuplas, no modo compacto)
+                convert = _row_converter(cursor, row_mode)
+                return [convert(row) for row in results]
+        
+        return self._run(query, work, retry)
+    
+    def _statement(self, name: str, query: str) -> Tuple[str, str, str]:
+        """Registra (ou recupera) o prepared statement de uma query"""
+        with self._statements_lock:
+            statement = self._statements.get(name)
+            digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:10]
+            server_name = f"{name}_{digest}"
+            if statement is None or statement[0] != server_name:
+                positional_query, param_count = _to_positional_params(query)
+                prepare_sql = f"PREPARE {server_name} AS {positional_query}"
+                execute_sql = f"EXECUTE {server_name}"
+                if param_count:
+                    execute_sql += f" ({', '.join(['%s'] * param_count)})"
+                statement = (server_name, prepare_sql, execute_sql)
+                self._statements[name] = statement
+                self._statement_stats.setdefault(name, {'executions': 0, 'prepares': 0, 'hits': 0})
+            return statement
+    
+    def _count_statement(self, name: str, key: str):
+        """Incrementa um contador de prepared_stats"""
+        with self._statements_lock:
+            self._statement_stats[name][key] += 1
+    
+    def _prepare_on(self, conn, cursor, name: str, server_name: str, prepare_sql: str, force: bool = False) -> bool:
+        """
+        Executa o PREPARE na conexão, se ainda não foi feito nela
+        
+        Returns:
+            True se preparou agora, False se o statement já estava preparado
+        """
+        with _prepared_lock:
+            prepared = _prepared_on_connection.setdefault(conn, set())
+            if server_name in prepared and not force:
+                return False
+        cursor.execute(prepare_sql)
+        with _prepared_lock:
+            prepared.add(server_name)
+        self._count_statement(name, 'prepares')
+        return True
+    
+    def execute_prepared(self, name: str, query: str, params: tuple = None,
+                         row_mode: Optional[str] = None, timeout: Optional[float] = None,
+                         retry: bool = True) -> List[Dict]:
+        """
+        Executa uma query fixa como prepared statement (PREPARE/EXECUTE)
+        
+        O PREPARE é feito uma vez por conexão; as execuções seguintes na mesma
+        conexão reaproveitam o plano já analisado. Após uma reconexão (conexão
+        nova no pool) o statement é preparado de novo automaticamente.
+        
+        Args:
+            name: Nome do statement (identificador SQL válido)
+            query: Query SQL com placeholders %s
+            params: Parâmetros para a query (tupla)
+            row_mode: 'dict' ou 'compact' (padrão: o row_mode do cliente)
+            timeout: statement_timeout desta consulta em segundos (padrão: o da conexão)
+            retry: Se True, reconecta e repete quando a conexão cai
+        
+        Returns:
+            Lista de dicionários (ou de CompactRow, no modo compacto) com os resultados
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
+        """
+        row_mode = row_mode or self.row_mode
+        server_name, prepare_sql, execute_sql = self._statement(name, query)
+        
+        def work(conn):
+            with self._transaction(conn, timeout), \
+                    conn.cursor(cursor_factory=_cursor_factory(row_mode)) as cursor:
+                prepared_now = self._prepare_on(conn, cursor, name, server_name, prepare_sql)
+                try:
+                    cursor.execute(execute_sql, params)
+                except psycopg2.errors.InvalidSqlStatementName:
+                    # A sessão perdeu o statement (ex.: DISCARD ALL): prepara de novo e repete
+                    logger.warning(f"Prepared statement {server_name} ausente na conexão; preparando novamente")
+                    conn.rollback()
+                    self._set_timeout(conn, timeout)
+                    prepared_now = self._prepare_on(conn, cursor, name, server_name, prepare_sql, force=True)
+                    cursor.execute(execute_sql, params)
+                self._count_statement(name, 'executions')
+                if not prepared_now:
+                    self._count_statement(name, 'hits')
+                results = cursor.fetchall()
+                startup_profiler.milestone('first_db_result')
+                if not results:
+                    return []
+                convert = _row_converter(cursor, row_mode)
+                return [convert(row) for row in results]
+        
+        return self._run(query, work, retry)
+    
+    def prepared_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Retorna contadores dos prepared statements deste cliente
+        
+        Returns:
+            Dict nome -> {executions, prepares, hits}; hits são as execuções que
+            reaproveitaram um statement já preparado na conexão
+        """
+        with self._statements_lock:
+            return {name: dict(stats) for name, stats in self._statement_stats.items()}
+    
+    def stream_query(self, query: str, params: tuple = None, itersize: Optional[int] = None,
+                     row_mode: Optional[str] = None, timeout: Optional[float] = None,
+                     retry: bool = True) -> RowStream:
+        """
+        Executa uma query SQL em um cursor nomeado (server-side) e itera as linhas
+        
+        O servidor entrega as linhas em lotes de itersize, então a memória usada
+        não depende do tamanho do resultado. A conexão fica reservada até o fim
+        da iteração: consuma todas as linhas ou chame close() no retorno.
+        
+        Args:
+            query: Query SQL a ser executada (apenas SELECT)
+            params: Parâmetros para a query (tupla)
+            itersize: Linhas trazidas por lote (padrão: o itersize do cliente)
+            row_mode: 'dict' ou 'compact' (padrão: o row_mode do cliente)
+            timeout: statement_timeout desta consulta em segundos (padrão: o da conexão)
+            retry: Se True, reconecta e repete quando a conexão cai antes da
+                primeira linha (depois disso, repetir duplicaria linhas já entregues)
+        
+        Returns:
+            RowStream com as linhas
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout (na iteração)
+            ConnectionLostError: A conexão caiu e não há mais tentativas (na iteração)
+        """
+        return RowStream(self._iter_query(
+            query, params, itersize or self.itersize, row_mode or self.row_mode, timeout, retry
+        ))
+    
+    def _iter_query(self, query: str, params: tuple, itersize: int, row_mode: str,
+                    timeout: Optional[float], retry: bool) -> Iterator[Dict]:
+        """Gerador por trás de stream_query"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            yielded = False
+            try:
+                # Cursor nomeado exige transação: em autocommit, uma explícita dura só o stream
+                cursor_name = f"stream_{uuid.uuid4().hex}"
+                with self._connection() as conn, self._transaction(conn, timeout, explicit=True), \
+                        conn.cursor(name=cursor_name, cursor_factory=_cursor_factory(row_mode)) as cursor:
+                    cursor.itersize = itersize
+                    cursor.execute(query, params)
+                    # Em cursor nomeado, description só existe após a primeira leitura
+                    row_class = None
+                    for row in cursor:
+                        if not yielded:
+                            startup_profiler.milestone('first_db_result')
+                        yielded = True
+                        if row_mode == 'dict':
+                            # As linhas do RealDictCursor já são dicts; não precisam de cópia
+                            yield row
+                            continue
+                        if row_class is None:
+                            row_class = _row_converter(cursor, row_mode)
+                        yield row_class(row)
+                return
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                delay = self._handle_error(e, query, attempt, started, retry and not yielded)
+            time.sleep(delay)
     
     def get_recent_moves(self, hours: int = 24, limit: int = 100) -> List[Dict]:
         """
@@ -78,9 +1044,13 @@ class PostgresClient:
         Args:
             hours: Quantas horas para trás buscar
             limit: Limite de registros
-            
+        
         Returns:
-            Lista de lançamentos
+            Lista de lançamentos (vazia apenas se não houver lançamentos)
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
         """
         since_date = datetime.now() - timedelta(hours=hours)
         
@@ -105,25 +1075,22 @@ class PostgresClient:
             LIMIT %s
         """
         
-        try:
-            moves = self.execute_query(query, (since_date, limit))
-            
-            # Formata os dados para manter compatibilidade com o formato esperado
-            for move in moves:
-                # Garante que partner_id está no formato esperado [id, name]
-                if move.get('partner_id'):
-                    move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
-                else:
-                    move['partner_id'] = None
-                
-                # Garante que create_uid está no formato correto
-                if move.get('create_uid'):
-                    move['create_uid'] = [move['create_uid'], '']
+        # Sempre dicionários (mesmo com row_mode='compact' no cliente): as linhas são alteradas abaixo
+        moves = self.execute_prepared('recent_moves', query, (since_date, limit), row_mode='dict')
+        
+        # Formata os dados para manter compatibilidade com o formato esperado
+        for move in moves:
+            # Garante que partner_id está no formato esperado [id, name]
+            if move.get('partner_id'):
+                move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
+            else:
+                move['partner_id'] = None
             
-            return moves
-        except Exception as e:
-            logger.error(f"Erro ao buscar lançamentos recentes: {e}")
-            return []
+            # Garante que create_uid está no formato correto
+            if move.get('create_uid'):
+                move['create_uid'] = [move['create_uid'], '']
+        
+        return moves
     
     def get_moves_by_date_range(self, start_date: datetime, end_date: datetime, limit: int = 100) -> List[Dict]:
         """
@@ -133,9 +1100,13 @@ class PostgresClient:
             start_date: Data inicial
             end_date: Data final
             limit: Limite de registros
-            
+        
         Returns:
-            Lista de lançamentos
+            Lista de lançamentos (vazia apenas se não houver lançamentos)
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
         """
         query = """
             SELECT 
@@ -158,19 +1129,15 @@ class PostgresClient:
             LIMIT %s
         """
         
-        try:
-            moves = self.execute_query(query, (start_date, end_date, limit))
-            
-            for move in moves:
-                if move.get('partner_id'):
-                    move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
-                else:
-                    move['partner_id'] = None
-            
-            return moves
-        except Exception as e:
-            logger.error(f"Erro ao buscar lançamentos por intervalo: {e}")
-            return []
+        moves = self.execute_prepared('moves_by_date_range', query, (start_date, end_date, limit), row_mode='dict')
+        
+        for move in moves:
+            if move.get('partner_id'):
+                move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
+            else:
+                move['partner_id'] = None
+        
+        return moves
     
     def get_moves_by_type(self, move_type: str, state: str = 'posted', limit: int = 100) -> List[Dict]:
         """
@@ -180,9 +1147,13 @@ class PostgresClient:
             move_type: Tipo de movimento (out_invoice, in_invoice, etc.)
             state: Estado do lançamento (posted, draft, etc.)
             limit: Limite de registros
-            
+        
         Returns:
-            Lista de lançamentos
+            Lista de lançamentos (vazia apenas se não houver lançamentos)
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
         """
         query = """
             SELECT 
@@ -205,29 +1176,34 @@ class PostgresClient:
             LIMIT %s
         """
         
-        try:
-            moves = self.execute_query(query, (move_type, state, limit))
-            
-            for move in moves:
-                if move.get('partner_id'):
-                    move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
-                else:
-                    move['partner_id'] = None
-            
-            return moves
-        except Exception as e:
-            logger.error(f"Erro ao buscar lançamentos por tipo: {e}")
-            return []
+        moves = self.execute_prepared('moves_by_type', query, (move_type, state, limit), row_mode='dict')
+        
+        for move in moves:
+            if move.get('partner_id'):
+                move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
+            else:
+                move['partner_id'] = None
+        
+        return moves
     
-    def get_move_by_id(self, move_id: int) -> Optional[Dict]:
+    def get_moves_by_ids(self, move_ids: Iterable[int]) -> Dict[int, Dict]:
         """
-        Busca um lançamento específico por ID
+        Busca vários lançamentos por ID, em uma consulta por lote
+        
+        Os IDs são consultados com = ANY(%s) em lotes de até batch_size; os que
+        estiverem no cache (se configurado) não vão ao banco. Substitui chamadas
+        repetidas a get_move_by_id ao enriquecer um relatório com os totais dos
+        lançamentos.
         
         Args:
-            move_id: ID do lançamento
-            
+            move_ids: IDs dos lançamentos (repetições e None são ignorados)
+        
         Returns:
-            Dicionário com os dados do lançamento ou None
+            Dicionário ID -> lançamento; IDs inexistentes ficam de fora
+        
+        Raises:
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
         """
         query = """
             SELECT 
@@ -246,20 +1222,48 @@ class PostgresClient:
                 rp.name as partner_name
             FROM account_move am
             LEFT JOIN res_partner rp ON am.partner_id = rp.id
-            WHERE am.id = %s
+            WHERE am.id = ANY(%s)
         """
         
-        try:
-            results = self.execute_query(query, (move_id,))
-            if results:
-                move = results[0]
+        ids = list(dict.fromkeys(move_id for move_id in move_ids if move_id is not None))
+        if self.move_cache is not None:
+            moves, ids = self.move_cache.get_many(ids)
+        else:
+            moves = {}
+        
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            results = self.execute_prepared('moves_by_ids', query, (chunk,), row_mode='dict')
+            for move in results:
                 if move.get('partner_id'):
                     move['partner_id'] = [move['partner_id'], move.get('partner_name', '')]
-                return move
-            return None
-        except Exception as e:
-            logger.error(f"Erro ao buscar lançamento {move_id}: {e}")
-            return None
+                moves[move['id']] = move
+            if self.move_cache is not None:
+                self.move_cache.put_many(results)
+        
+        return moves
+    
+    def get_move_by_id(self, move_id: int) -> Dict:
+        """
+        Busca um lançamento específico por ID
+        
+        Para vários lançamentos, use get_moves_by_ids (uma consulta por lote).
+        
+        Args:
+            move_id: ID do lançamento
+        
+        Returns:
+            Dicionário com os dados do lançamento
+        
+        Raises:
+            EmptyResultError: Não existe lançamento com esse ID
+            QueryTimeoutError: A consulta excedeu o statement_timeout
+            ConnectionLostError: A conexão caiu e as novas tentativas se esgotaram
+        """
+        move = self.get_moves_by_ids([move_id]).get(move_id)
+        if move is None:
+            raise EmptyResultError(f"Lançamento {move_id} não encontrado")
+        return move
     
     def test_connection(self) -> bool:
         """
@@ -269,20 +1273,33 @@ class PostgresClient:
             True se conectado, False caso contrário
         """
         try:
-            if self.conn is None:
+            if self.pool is None and self.conn is None:
                 self._connect()
             
-            with self.conn.cursor() as cursor:
-                cursor.execute("SELECT 1")
-                cursor.fetchone()
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
             
             return True
         except Exception as e:
             logger.error(f"Erro ao testar conexão: {e}")
             return False
     
+    def pool_stats(self) -> Optional[Dict]:
+        """
+        Retorna os contadores do pool de conexões
+        
+        Returns:
+            Dicionário com estatísticas do pool ou None se o cliente não usa pool
+        """
+        return self.pool.stats() if self.pool is not None else None
+    
     def close(self):
-        """Fecha a conexão com o banco de dados"""
+        """Fecha a conexão com o banco de dados (no modo pooled, o pool permanece aberto)"""
+        if self.pool is not None:
+            logger.debug(f"Cliente PostgreSQL liberado (pool: {self.pool.stats()})")
+            return
         if self.conn:
             self.conn.close()
             logger.info("Conexão PostgreSQL fechada")
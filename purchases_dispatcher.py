@@ -3,37 +3,49 @@ Módulo de disparo de compras atualizadas no dia por WhatsApp
 Dispara resumo de compras atualizadas no dia com seus status
 """
 import logging
-from datetime import date, datetime
-from typing import List, Dict
-from config import (
-    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB,
-    POSTGRES_USER, POSTGRES_PASSWORD,
-    EVOLUTION_API_URL, EVOLUTION_API_KEY, EVOLUTION_INSTANCE,
-    WHATSAPP_NUMBER
-)
-from postgres_client import PostgresClient
+from datetime import date, datetime, timezone
+from typing import List, Dict, Tuple, Iterable, Iterator
+from config import settings
+from formatting import MessageBuilder, format_brl, format_date
+from outbox import split_failed_recipients
+from postgres_client import PostgresClient, RowStream
+from queries import PURCHASES_UPDATED_TODAY_QUERY, purchases_updated_params
 from whatsapp_client import WhatsAppClient
+from clients import (
+    create_postgres_client, create_whatsapp_client, create_async_whatsapp_client,
+    get_outbox, get_dispatch_ledger, get_purchases_watermark
+)
 
 logger = logging.getLogger(__name__)
 
+# Máximo de compras listadas individualmente em um alerta incremental
+MAX_CHANGES_LISTED = 20
+
 
 class PurchasesDispatcher:
     """Sistema de disparo de compras atualizadas"""
     
-    def __init__(self):
-        """Inicializa o dispatcher"""
-        self.postgres_client = PostgresClient(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD
-        )
-        self.whatsapp_client = WhatsAppClient(
-            api_url=EVOLUTION_API_URL,
-            api_key=EVOLUTION_API_KEY,
-            instance=EVOLUTION_INSTANCE
-        )
+    def __init__(self, postgres_client: PostgresClient = None, whatsapp_client: WhatsAppClient = None):
+        """
+        Inicializa o dispatcher
+        
+        Args:
+            postgres_client: Cliente PostgreSQL compartilhado (opcional; criado se não informado)
+            whatsapp_client: Cliente WhatsApp compartilhado (opcional; criado se não informado)
+        """
+        # Clientes recebidos de fora pertencem a quem os criou e não são fechados aqui
+        self._owns_postgres_client = postgres_client is None
+        self._owns_whatsapp_client = whatsapp_client is None
+        self.postgres_client = postgres_client or create_postgres_client()
+        self.whatsapp_client = whatsapp_client or create_whatsapp_client()
+        self.async_whatsapp_client = create_async_whatsapp_client(self.whatsapp_client)
+        self.outbox = get_outbox()
+        self.ledger = get_dispatch_ledger()
+        self.watermark = get_purchases_watermark()
+    
+    def _today_range_params(self) -> Tuple[datetime, datetime, datetime, datetime]:
+        """Parâmetros de PURCHASES_UPDATED_TODAY_QUERY para o dia de hoje"""
+        return purchases_updated_params(date.today())
     
     def get_purchases_updated_today(self) -> List[Dict]:
         """
@@ -41,10 +53,52 @@ class PurchasesDispatcher:
         
         Returns:
             Lista de compras atualizadas
+            
+        Raises:
+            QueryTimeoutError: Se a consulta exceder o statement timeout
+            ConnectionLostError: Se a conexão com o banco não puder ser restabelecida
         """
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+        try:
+            results = self.postgres_client.execute_prepared(
+                'purchases_updated_today', PURCHASES_UPDATED_TODAY_QUERY, self._today_range_params(), row_mode='compact'
+            )
+            return results
+        except Exception as e:
+            logger.error(f"Erro ao buscar compras atualizadas no dia: {e}")
+            raise
+    
+    def stream_purchases_updated_today(self) -> RowStream:
+        """
+        Busca compras atualizadas no dia de hoje, linha a linha
+        
+        Usa cursor do lado do servidor: a memória não cresce com o número de
+        compras. Erros de banco são levantados durante a iteração.
         
+        Returns:
+            RowStream com as compras atualizadas
+        """
+        return self.postgres_client.stream_query(
+            PURCHASES_UPDATED_TODAY_QUERY, self._today_range_params(), row_mode='compact'
+        )
+    
+    def get_purchases_changed_since(self, after: Tuple[datetime, int], limit: int) -> List[Dict]:
+        """
+        Busca uma página de compras alteradas após uma posição (write_date, id)
+        
+        A paginação é por chave (keyset): a comparação de tupla com ORDER BY
+        write_date, id percorre só as linhas novas, sem OFFSET, e o custo
+        depende apenas de quantas compras mudaram.
+        
+        Args:
+            after: Posição (write_date, id) da última compra já processada
+            limit: Tamanho máximo da página
+            
+        Returns:
+            Lista de compras alteradas, em ordem de (write_date, id)
+            
+        Raises:
+            Exception: Se a consulta falhar (a marca d'água não deve avançar)
+        """
         query = """
             SELECT 
                 po.id,
@@ -67,17 +121,38 @@ class PurchasesDispatcher:
             FROM purchase_order po
             LEFT JOIN res_partner rp ON po.partner_id = rp.id
             LEFT JOIN res_users ru ON po.user_id = ru.id
-            WHERE DATE(po.write_date) = CURRENT_DATE
-               OR DATE(po.create_date) = CURRENT_DATE
-            ORDER BY po.write_date DESC, po.create_date DESC
+            WHERE (po.write_date, po.id) > (%s, %s)
+              AND po.write_date < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => %s)
+            ORDER BY po.write_date, po.id
+            LIMIT %s
         """
         
-        try:
-            results = self.postgres_client.execute_query(query)
-            return results
-        except Exception as e:
-            logger.error(f"Erro ao buscar compras atualizadas no dia: {e}")
-            return []
+        write_date, record_id = after
+        return self.postgres_client.execute_prepared(
+            'purchases_changed_since', query, (write_date, record_id, settings.PURCHASES_FEED_LAG_SECONDS, limit), row_mode='compact'
+        )
+    
+    def iter_purchase_changes(self, after: Tuple[datetime, int]) -> Iterator[List[Dict]]:
+        """
+        Percorre as compras alteradas após uma posição, uma página por vez
+        
+        Cada página só é buscada depois que a anterior foi consumida, então
+        quem envia e grava a marca d'água a cada página não acumula o feed
+        inteiro em memória.
+        
+        Args:
+            after: Posição (write_date, id) da última compra já processada
+            
+        Yields:
+            Páginas (não vazias) de compras alteradas, em ordem de (write_date, id)
+        """
+        while True:
+            page = self.get_purchases_changed_since(after, settings.PURCHASES_FEED_PAGE_SIZE)
+            if page:
+                yield page
+            if len(page) < settings.PURCHASES_FEED_PAGE_SIZE:
+                return
+            after = (page[-1]['write_date'], page[-1]['id'])
     
     def format_purchase_status(self, state: str) -> str:
         """Traduz status da compra para português"""
@@ -91,113 +166,252 @@ class PurchasesDispatcher:
         }
         return status_map.get(state, state)
     
-    def format_purchases_message(self, purchases: List[Dict]) -> str:
+    def format_purchases_message(self, purchases: Iterable[Dict]) -> str:
         """
         Formata mensagem de compras atualizadas
         
+        As compras são lidas em uma única passada, então aceita tanto uma lista
+        quanto o RowStream de stream_purchases_updated_today.
+        
         Args:
-            purchases: Lista de compras
+            purchases: Compras (lista ou iterável)
             
         Returns:
-            Mensagem formatada
+            Mensagem formatada (None se não houver compras)
         """
-        if not purchases:
-            return None
-        
         today = date.today()
-        data_formatada = today.strftime('%d/%m/%Y')
+        data_formatada = format_date(today)
         
-        # Agrupa por status
+        # Agrupa por status guardando só a contagem e as 10 primeiras compras formatadas
         by_status = {}
+        total = 0
+        count = 0
         for purchase in purchases:
+            count += 1
+            total += purchase.get('amount_total') or 0
+            
             state = purchase.get('state', 'unknown')
             if state not in by_status:
-                by_status[state] = []
-            by_status[state].append(purchase)
+                by_status[state] = {'count': 0, 'details': MessageBuilder()}
+            status_data = by_status[state]
+            status_data['count'] += 1
+            
+            if status_data['count'] > 10:  # Limita a 10 por status
+                continue
+            
+            partner = purchase.get('partner_name', 'N/A')
+            order_name = purchase.get('name', 'N/A')
+            amount_str = format_brl(purchase.get('amount_total'))
+            
+            # Data da compra
+            date_order = purchase.get('date_order')
+            date_str = ""
+            if date_order:
+                try:
+                    if isinstance(date_order, str):
+                        date_order = datetime.strptime(date_order.split('.')[0], '%Y-%m-%d %H:%M:%S')
+                    date_str = format_date(date_order)
+                except:
+                    date_str = str(date_order)[:10]
+            
+            details = status_data['details']
+            details.line(f"{status_data['count']}. *{order_name}*")
+            details.line(f"   Fornecedor: {partner}")
+            if date_str:
+                details.line(f"   Data: {date_str}")
+            details.line(f"   Valor: {amount_str}")
+            details.line()
         
-        # Calcula total
-        total = sum(
-            (purchase.get('amount_total') or 0)
-            for purchase in purchases
-        )
-        total_str = f"R$ {total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        if not count:
+            return None
+        
+        total_str = format_brl(total)
         
         # Monta mensagem
-        message = f"🛒 *Compras Atualizadas - Hoje*\n"
-        message += f"📅 Data: {data_formatada}\n"
-        message += f"📊 Total de compras: {len(purchases)}\n"
-        message += f"💰 Valor total: {total_str}\n\n"
+        message = MessageBuilder()
+        message.line(f"🛒 *Compras Atualizadas - Hoje*")
+        message.line(f"📅 Data: {data_formatada}")
+        message.line(f"📊 Total de compras: {count}")
+        message.line(f"💰 Valor total: {total_str}")
+        message.line()
         
         # Lista compras por status
-        for state, state_purchases in by_status.items():
+        for state, status_data in by_status.items():
             status_label = self.format_purchase_status(state)
-            message += f"*{status_label}: {len(state_purchases)} compra(s)*\n"
-            message += "─" * 30 + "\n"
-            
-            for idx, purchase in enumerate(state_purchases[:10], 1):  # Limita a 10 por status
-                partner = purchase.get('partner_name', 'N/A')
-                order_name = purchase.get('name', 'N/A')
-                amount = purchase.get('amount_total', 0) or 0
-                amount_str = f"R$ {amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            message.line(f"*{status_label}: {status_data['count']} compra(s)*")
+            message.line("─" * 30)
+            message.add(status_data['details'].build())
+            
+            if status_data['count'] > 10:
+                message.line(f"   ... e mais {status_data['count'] - 10} compra(s)")
+                message.line()
+            
+            message.line()
+        
+        return message.build()
+    
+    def format_purchase_changes_message(self, purchases: List[Dict]) -> str:
+        """
+        Formata alerta de compras alteradas desde a última execução
+        
+        Args:
+            purchases: Lista de compras alteradas
+            
+        Returns:
+            Mensagem formatada
+        """
+        if not purchases:
+            return None
+        
+        message = MessageBuilder()
+        message.line(f"🔔 *Compras Atualizadas*")
+        message.line(f"📊 {len(purchases)} compra(s) alterada(s)")
+        message.line()
+        
+        for purchase in purchases[:MAX_CHANGES_LISTED]:
+            status_label = self.format_purchase_status(purchase.get('state', 'unknown'))
+            partner = purchase.get('partner_name', 'N/A')
+            order_name = purchase.get('name', 'N/A')
+            amount_str = format_brl(purchase.get('amount_total'))
+            
+            message.line(f"*{order_name}* - {status_label}")
+            message.line(f"   Fornecedor: {partner}")
+            message.line(f"   Valor: {amount_str}")
+            message.line()
+        
+        if len(purchases) > MAX_CHANGES_LISTED:
+            message.line(f"... e mais {len(purchases) - MAX_CHANGES_LISTED} compra(s)")
+        
+        return message.build()
+    
+    def send_purchase_changes(self) -> bool:
+        """
+        Busca e envia alerta das compras alteradas desde a última execução
+        
+        A posição (write_date, id) da última compra notificada fica gravada
+        localmente; sem posição gravada, começa pelas compras alteradas hoje
+        (em UTC). Cada página do feed vira um alerta, e a marca d'água avança
+        logo após o envio de cada página.
+        
+        Returns:
+            True se enviou com sucesso (ou não havia alterações), False caso contrário
+        """
+        try:
+            # Reenvia mensagens que falharam em execuções anteriores
+            self.drain_outbox()
+            
+            position = self.watermark.get()
+            if position is None:
+                # write_date é gravado pelo Odoo em UTC (sem fuso)
+                today_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+                position = (today_utc.replace(hour=0, minute=0, second=0, microsecond=0), 0)
+                logger.info("Sem marca d'água gravada; buscando compras alteradas desde o início do dia (UTC)")
+            
+            logger.info(f"Buscando compras alteradas após {position[0]} (id {position[1]})")
+            
+            total = 0
+            success = True
+            for changes in self.iter_purchase_changes(position):
+                total += len(changes)
+                logger.info(f"Página com {len(changes)} compra(s) alterada(s)")
+                
+                message = self.format_purchase_changes_message(changes)
+                
+                if not settings.WHATSAPP_RECIPIENTS:
+                    logger.warning("WHATSAPP_NUMBER não configurado. Mensagem não enviada.")
+                    logger.info(f"Mensagem que seria enviada:\n{message}")
+                    return False
+                
+                # A janela (posição final da página) entra no tipo do relatório: reprocessar
+                # a mesma janela gera a mesma chave no outbox e não duplica o alerta
+                last = changes[-1]
+                report_type = f"purchases_changes:{last['write_date'].isoformat()}:{last['id']}"
                 
-                # Data da compra
-                date_order = purchase.get('date_order')
-                date_str = ""
-                if date_order:
-                    try:
-                        if isinstance(date_order, str):
-                            date_order = datetime.strptime(date_order.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                        date_str = date_order.strftime('%d/%m/%Y')
-                    except:
-                        date_str = str(date_order)[:10]
+                logger.info(f"Enviando alerta de compras para {', '.join(settings.WHATSAPP_RECIPIENTS)}")
+                batch = self.outbox.deliver(
+                    self.async_whatsapp_client, report_type, message, settings.WHATSAPP_RECIPIENTS
+                )
                 
-                message += f"{idx}. *{order_name}*\n"
-                message += f"   Fornecedor: {partner}\n"
-                if date_str:
-                    message += f"   Data: {date_str}\n"
-                message += f"   Valor: {amount_str}\n\n"
+                # Falhas ficam no outbox para reenvio, então a marca d'água avança mesmo assim
+                self.watermark.set(last['write_date'], last['id'])
+                
+                if not batch.ok:
+                    pending, discarded = split_failed_recipients(batch)
+                    if pending:
+                        logger.error(f"Falha no envio para {len(pending)} de {len(settings.WHATSAPP_RECIPIENTS)} destinatário(s): {', '.join(pending)}. Mensagem mantida no outbox para reenvio")
+                    if discarded:
+                        logger.error(f"Mensagem descartada no outbox para {len(discarded)} destinatário(s): {', '.join(discarded)}. O alerta não será reenviado: a marca d'água já avançou")
+                    success = False
             
-            if len(state_purchases) > 10:
-                message += f"   ... e mais {len(state_purchases) - 10} compra(s)\n\n"
+            if not total:
+                logger.info("Nenhuma compra alterada desde a última execução")
+                return True
             
-            message += "\n"
-        
-        return message
+            if success:
+                logger.info(f"Alerta de {total} compra(s) alterada(s) enviado com sucesso")
+            return success
+            
+        except Exception as e:
+            logger.error(f"Erro ao enviar alerta de compras alteradas: {e}", exc_info=True)
+            return False
     
-    def send_purchases_summary(self) -> bool:
+    def send_purchases_summary(self, force: bool = False) -> bool:
         """
         Busca e envia resumo de compras atualizadas no dia
         
+        Args:
+            force: Se True, envia mesmo que o relatório já tenha sido enviado
+        
         Returns:
             True se enviou com sucesso, False caso contrário
         """
         try:
+            # Reenvia mensagens que falharam em execuções anteriores
+            self.drain_outbox()
+            
+            report_type = 'purchases'
+            today = date.today()
+            
             logger.info("Buscando compras atualizadas no dia")
             
-            # Busca compras
-            purchases = self.get_purchases_updated_today()
+            # Busca compras em streaming e formata a mensagem conforme as linhas chegam
+            with self.stream_purchases_updated_today() as purchases:
+                message = self.format_purchases_message(purchases)
             
-            if not purchases:
+            if not message:
                 logger.info("Nenhuma compra atualizada encontrada no dia")
                 return True  # Não é erro, apenas não há compras
             
-            logger.info(f"Encontradas {len(purchases)} compra(s) atualizada(s) no dia")
+            logger.info(f"Encontradas {purchases.count} compra(s) atualizada(s) no dia")
             
-            # Formata mensagem
-            message = self.format_purchases_message(purchases)
-            
-            if not message:
-                logger.warning("Mensagem vazia, não enviando notificação")
-                return False
+            # Reexecução do agendador: se este mesmo resumo já foi entregue, não reenvia
+            if not force and self.ledger.already_dispatched(report_type, today, settings.WHATSAPP_RECIPIENTS, message):
+                logger.info("Resumo de compras de hoje já enviado com este conteúdo; nada a fazer (use --force para reenviar)")
+                return True
             
             # Envia mensagem
-            if not WHATSAPP_NUMBER:
+            if not settings.WHATSAPP_RECIPIENTS:
                 logger.warning("WHATSAPP_NUMBER não configurado. Mensagem não enviada.")
                 logger.info(f"Mensagem que seria enviada:\n{message}")
                 return False
             
-            logger.info(f"Enviando resumo de compras para {WHATSAPP_NUMBER}")
-            self.whatsapp_client.send_message(WHATSAPP_NUMBER, message)
+            logger.info(f"Enviando resumo de compras para {', '.join(settings.WHATSAPP_RECIPIENTS)}")
+            batch = self.outbox.deliver(
+                self.async_whatsapp_client, report_type, message, settings.WHATSAPP_RECIPIENTS, force=force
+            )
+            
+            # Registra quem recebeu, inclusive em falha parcial, para não duplicar na reexecução
+            failed = {r['number'] for r in batch.failures}
+            delivered = [number for number in settings.WHATSAPP_RECIPIENTS if number not in failed]
+            self.ledger.record(report_type, today, delivered, message)
+            
+            if not batch.ok:
+                pending, discarded = split_failed_recipients(batch)
+                if pending:
+                    logger.error(f"Falha no envio para {len(pending)} de {len(settings.WHATSAPP_RECIPIENTS)} destinatário(s): {', '.join(pending)}. Mensagem mantida no outbox para reenvio")
+                if discarded:
+                    logger.error(f"Mensagem descartada no outbox para {len(discarded)} destinatário(s): {', '.join(discarded)}. Não haverá reenvio automático; use --force para reenviar")
+                return False
             
             logger.info("Resumo de compras enviado com sucesso")
             return True
@@ -206,10 +420,21 @@ class PurchasesDispatcher:
             logger.error(f"Erro ao enviar resumo de compras: {e}", exc_info=True)
             return False
     
+    def drain_outbox(self):
+        """Reenvia as mensagens pendentes do outbox sem interromper o disparo atual"""
+        try:
+            self.outbox.drain(self.async_whatsapp_client)
+        except Exception as e:
+            logger.error(f"Erro ao reenviar mensagens pendentes do outbox: {e}")
+    
     def close(self):
         """Fecha conexões"""
-        if self.postgres_client:
+        if self.postgres_client and self._owns_postgres_client:
             self.postgres_client.close()
+        if self.async_whatsapp_client:
+            self.async_whatsapp_client.close()
+        if self.whatsapp_client and self._owns_whatsapp_client:
+            self.whatsapp_client.close()
     
     def __enter__(self):
         """Context manager entry"""
@@ -0,0 +1,200 @@
+"""
+Queries SQL dos relatórios
+Compartilhadas pelos dispatchers e pelo cliente assíncrono (AsyncPostgresClient),
+que executam o mesmo texto com o mesmo nome de prepared statement
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Tuple
+
+# Contas a receber em aberto com vencimento em uma data (parâmetro: due_date)
+ACCOUNTS_RECEIVABLE_BY_DUE_DATE_QUERY = """
+    SELECT
+        aml.id,
+        aml.move_id,
+        aml.partner_id,
+        rp.name as partner_name,
+        aml.date_maturity,
+        aml.date,
+        aml.name as line_name,
+        aml.debit,
+        aml.credit,
+        aml.amount_residual,
+        aml.amount_residual_currency,
+        am.name as move_name,
+        am.move_type,
+        am.state as move_state,
+        am.ref as move_ref,
+        am.invoice_date
+    FROM account_move_line aml
+    INNER JOIN account_move am ON aml.move_id = am.id
+    LEFT JOIN res_partner rp ON aml.partner_id = rp.id
+    INNER JOIN account_account aa ON aml.account_id = aa.id
+    WHERE aa.account_type = 'asset_receivable'
+      AND aml.date_maturity = %s
+      AND am.state = 'posted'
+      AND aml.reconciled = false
+      AND aml.debit > 0
+    ORDER BY aml.date_maturity, rp.name, aml.name
+"""
+
+# Contas a pagar em aberto com vencimento em uma data, linha a linha (parâmetro: due_date)
+ACCOUNTS_PAYABLE_BY_DUE_DATE_QUERY = """
+    SELECT
+        aml.id,
+        aml.move_id,
+        aml.partner_id,
+        rp.name as partner_name,
+        am.company_id,
+        rc.name as company_name,
+        aml.date_maturity,
+        aml.date,
+        aml.name as line_name,
+        aml.debit,
+        aml.credit,
+        aml.amount_residual,
+        aml.amount_residual_currency,
+        am.name as move_name,
+        am.move_type,
+        am.state as move_state,
+        am.ref as move_ref,
+        am.invoice_date
+    FROM account_move_line aml
+    INNER JOIN account_move am ON aml.move_id = am.id
+    LEFT JOIN res_partner rp ON aml.partner_id = rp.id
+    LEFT JOIN res_company rc ON am.company_id = rc.id
+    INNER JOIN account_account aa ON aml.account_id = aa.id
+    WHERE aa.account_type = 'liability_payable'
+      AND aml.date_maturity = %s
+      AND am.state = 'posted'
+      AND aml.reconciled = false
+      AND aml.credit > 0
+    ORDER BY rc.name, aml.date_maturity, rp.name, aml.name
+"""
+
+# Resumo por empresa das contas a pagar com vencimento em uma data (parâmetro: due_date)
+ACCOUNTS_PAYABLE_SUMMARY_BY_DUE_DATE_QUERY = """
+    SELECT
+        rc.name as company_name,
+        COUNT(*) as account_count,
+        SUM(ABS(COALESCE(NULLIF(aml.amount_residual, 0), aml.credit, 0))) as total_amount
+    FROM account_move_line aml
+    INNER JOIN account_move am ON aml.move_id = am.id
+    LEFT JOIN res_partner rp ON aml.partner_id = rp.id
+    LEFT JOIN res_company rc ON am.company_id = rc.id
+    INNER JOIN account_account aa ON aml.account_id = aa.id
+    WHERE aa.account_type = 'liability_payable'
+      AND aml.date_maturity = %s
+      AND am.state = 'posted'
+      AND aml.reconciled = false
+      AND aml.credit > 0
+    GROUP BY rc.name
+    ORDER BY total_amount DESC, company_name
+"""
+
+# Contas a receber (linha a linha) e resumo por empresa das contas a pagar com vencimento
+# em uma data, em uma única consulta (parâmetro: due_date)
+OPEN_ACCOUNTS_BY_DUE_DATE_QUERY = """
+    WITH open_lines AS (
+        SELECT
+            aml.id,
+            aml.move_id,
+            aml.partner_id,
+            rp.name as partner_name,
+            am.company_id,
+            rc.name as company_name,
+            aa.account_type,
+            aml.date_maturity,
+            aml.date,
+            aml.name as line_name,
+            aml.debit,
+            aml.credit,
+            aml.amount_residual,
+            aml.amount_residual_currency,
+            am.name as move_name,
+            am.move_type,
+            am.state as move_state,
+            am.ref as move_ref,
+            am.invoice_date
+        FROM account_move_line aml
+        INNER JOIN account_move am ON aml.move_id = am.id
+        LEFT JOIN res_partner rp ON aml.partner_id = rp.id
+        LEFT JOIN res_company rc ON am.company_id = rc.id
+        INNER JOIN account_account aa ON aml.account_id = aa.id
+        WHERE aa.account_type IN ('asset_receivable', 'liability_payable')
+          AND aml.date_maturity = %s
+          AND am.state = 'posted'
+          AND aml.reconciled = false
+          AND (
+                (aa.account_type = 'asset_receivable' AND aml.debit > 0)
+             OR (aa.account_type = 'liability_payable' AND aml.credit > 0)
+          )
+    )
+    SELECT * FROM (
+        SELECT
+            id, move_id, partner_id, partner_name, company_id, company_name,
+            account_type, date_maturity, date, line_name, debit, credit,
+            amount_residual, amount_residual_currency, move_name, move_type,
+            move_state, move_ref, invoice_date,
+            NULL::bigint as account_count,
+            NULL::numeric as total_amount
+        FROM open_lines
+        WHERE account_type = 'asset_receivable'
+        UNION ALL
+        SELECT
+            NULL, NULL, NULL, NULL, NULL, company_name,
+            'liability_payable', NULL, NULL, NULL, NULL, NULL,
+            NULL, NULL, NULL, NULL,
+            NULL, NULL, NULL,
+            COUNT(*),
+            SUM(ABS(COALESCE(NULLIF(amount_residual, 0), credit, 0)))
+        FROM open_lines
+        WHERE account_type = 'liability_payable'
+        GROUP BY company_name
+    ) combined
+    ORDER BY account_type, date_maturity, partner_name, line_name, total_amount DESC, company_name
+"""
+
+# Compras criadas ou alteradas em um intervalo (parâmetros: início e fim de write_date e de create_date)
+PURCHASES_UPDATED_TODAY_QUERY = """
+    SELECT
+        po.id,
+        po.name,
+        po.date_order,
+        po.date_approve,
+        po.state,
+        po.partner_id,
+        rp.name as partner_name,
+        po.amount_total,
+        po.amount_untaxed,
+        po.amount_tax,
+        po.create_date,
+        po.write_date,
+        po.user_id,
+        ru.login as user_name,
+        po.currency_id,
+        po.origin,
+        po.notes
+    FROM purchase_order po
+    LEFT JOIN res_partner rp ON po.partner_id = rp.id
+    LEFT JOIN res_users ru ON po.user_id = ru.id
+    WHERE (po.write_date >= %s AND po.write_date < %s)
+       OR (po.create_date >= %s AND po.create_date < %s)
+    ORDER BY po.write_date DESC, po.create_date DESC
+"""
+
+
+def purchases_updated_params(day: date) -> Tuple[datetime, datetime, datetime, datetime]:
+    """
+    Parâmetros de PURCHASES_UPDATED_TODAY_QUERY para um dia
+    
+    Args:
+        day: Dia das compras
+    
+    Returns:
+        Tupla (início, fim, início, fim) do intervalo de write_date e create_date
+    """
+    # Intervalo semiaberto [dia 00:00, dia seguinte 00:00): comparar a coluna crua
+    # (sem DATE()) permite ao PostgreSQL usar índices em write_date/create_date
+    day_start = datetime.combine(day, time.min)
+    next_day_start = day_start + timedelta(days=1)
+    return day_start, next_day_start, day_start, next_day_start
@@ -0,0 +1,104 @@
+"""
+Limitador de taxa (token bucket) para o tráfego enviado à Evolution API
+Evita estourar limites do WhatsApp/Evolution ao disparar para muitos destinatários
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket com espaçamento mínimo por destinatário
+    
+    É thread-safe: os envios do cliente assíncrono (executados em threads)
+    e do cliente síncrono disputam o mesmo balde. Cada chamada reserva seu
+    horário de saída sob lock e aguarda fora dele, então as mensagens saem
+    na ordem de chegada.
+    """
+    
+    def __init__(self, rate: float, burst: int = 1, per_recipient_interval: float = 0):
+        """
+        Inicializa o limitador
+        
+        Args:
+            rate: Mensagens por segundo (0 ou negativo desativa o limite global)
+            burst: Quantidade de mensagens que podem sair de uma vez com o balde cheio
+            per_recipient_interval: Intervalo mínimo em segundos entre mensagens
+                para o mesmo destinatário (0 desativa)
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.per_recipient_interval = max(0.0, per_recipient_interval)
+        
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._next_by_recipient: Dict[str, float] = {}
+        
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def _reserve(self, recipient: Optional[str]) -> float:
+        """Reserva o próximo horário de saída e retorna quanto tempo esperar"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            
+            if self.rate > 0:
+                elapsed = now - self._last_refill
+                self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                self._last_refill = now
+                # O saldo pode ficar negativo: cada chamador reserva o próximo token livre
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = -self._tokens / self.rate
+            
+            if recipient and self.per_recipient_interval > 0:
+                next_allowed = self._next_by_recipient.get(recipient, now)
+                wait = max(wait, next_allowed - now)
+                self._next_by_recipient[recipient] = now + wait + self.per_recipient_interval
+            
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+    
+    def acquire(self, recipient: Optional[str] = None) -> float:
+        """
+        Aguarda até que uma mensagem possa ser enviada
+        
+        Args:
+            recipient: Destinatário da mensagem (para o espaçamento por destinatário)
+            
+        Returns:
+            Segundos aguardados na fila
+        """
+        wait = self._reserve(recipient)
+        if wait > 0:
+            logger.debug(f"Limite de envio atingido, aguardando {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+    
+    def stats(self) -> Dict:
+        """
+        Retorna métricas de espera na fila do limitador
+        
+        Returns:
+            Dicionário com total de aquisições, quantas esperaram e tempos de espera
+        """
+        with self._lock:
+            return {
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'total_wait': round(self.total_wait, 3),
+                'max_wait': round(self.max_wait, 3),
+                'avg_wait': round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+            }
@@ -0,0 +1,86 @@
+"""
+Política de novas tentativas com backoff exponencial e jitter
+Usada para repetir operações que falharam por erros temporários
+"""
+import random
+import time
+from typing import Optional
+
+
+class RetryPolicy:
+    """
+    Define quantas vezes e com que intervalo uma operação pode ser repetida
+    
+    O intervalo cresce exponencialmente (base_delay * 2^(tentativa-1)), limitado
+    a max_delay, com jitter total (valor aleatório entre 0 e o intervalo) para
+    que processos paralelos não repitam ao mesmo tempo. O prazo total (deadline)
+    limita o tempo gasto somando todas as tentativas e esperas.
+    """
+    
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 30.0, deadline: Optional[float] = 120.0, jitter: bool = True):
+        """
+        Inicializa a política
+        
+        Args:
+            max_attempts: Total de tentativas, incluindo a primeira (1 desativa repetições)
+            base_delay: Intervalo base em segundos
+            max_delay: Intervalo máximo entre tentativas em segundos
+            deadline: Tempo total máximo em segundos (None para sem prazo)
+            jitter: Se True, aplica jitter aleatório ao intervalo
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(0.0, max_delay)
+        self.deadline = deadline
+        self.jitter = jitter
+    
+    def backoff(self, attempt: int) -> float:
+        """
+        Calcula o intervalo antes da próxima tentativa
+        
+        Args:
+            attempt: Número da tentativa que acabou de falhar (começa em 1)
+            
+        Returns:
+            Segundos a aguardar
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+    
+    def next_delay(self, attempt: int, started: float, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Decide se há nova tentativa e quanto aguardar antes dela
+        
+        Args:
+            attempt: Número da tentativa que acabou de falhar (começa em 1)
+            started: Instante (time.monotonic()) da primeira tentativa
+            retry_after: Intervalo mínimo pedido pelo servidor, se houver
+            
+        Returns:
+            Segundos a aguardar, ou None se não deve haver nova tentativa
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if self.deadline is not None and (time.monotonic() - started) + delay > self.deadline:
+            return None
+        return delay
+    
+    def remaining(self, started: float) -> Optional[float]:
+        """
+        Tempo restante até o prazo total
+        
+        Args:
+            started: Instante (time.monotonic()) da primeira tentativa
+            
+        Returns:
+            Segundos restantes ou None se não há prazo
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - (time.monotonic() - started))
@@ -0,0 +1,294 @@
+"""
+Agendador em processo dos disparos
+Executa jobs definidos por expressões cron, no fuso horário configurado, em um pool de threads
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Campos de uma expressão cron: (nome, menor valor, maior valor)
+CRON_FIELDS = (
+    ('minuto', 0, 59),
+    ('hora', 0, 23),
+    ('dia do mês', 1, 31),
+    ('mês', 1, 12),
+    ('dia da semana', 0, 7),  # 0 e 7 são domingo
+)
+
+# Intervalo máximo entre verificações do relógio (cobre ajustes de horário do sistema)
+MAX_SLEEP_SECONDS = 60
+
+
+def _parse_cron_field(text: str, name: str, low: int, high: int) -> Set[int]:
+    """
+    Converte um campo cron (*, 5, 1-5, */15, 0-30/10, listas com vírgula) nos valores aceitos
+    
+    Raises:
+        ValueError: Se o campo for inválido
+    """
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"passo inválido no campo {name}: {step}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            # "5/10" vale de 5 em diante, de 10 em 10
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"valor fora do intervalo {low}-{high} no campo {name}: '{text}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """
+    Expressão cron de 5 campos: minuto hora dia-do-mês mês dia-da-semana
+    
+    Segue a semântica do cron: se dia do mês e dia da semana forem ambos
+    restritos (não começam com '*'), basta um dos dois coincidir.
+    """
+    
+    def __init__(self, expression: str):
+        """
+        Args:
+            expression: Expressão cron (ex.: "30 7 * * 1-5")
+        
+        Raises:
+            ValueError: Se a expressão for inválida
+        """
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Expressão cron inválida (esperados 5 campos): '{expression}'")
+        try:
+            minutes, hours, days, months, weekdays = (
+                _parse_cron_field(text, *spec) for text, spec in zip(fields, CRON_FIELDS)
+            )
+        except ValueError as e:
+            raise ValueError(f"Expressão cron inválida '{expression}': {e}") from None
+        
+        self.expression = expression
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        # Como no Vixie cron (DOM_STAR/DOW_STAR): só um campo que começa com '*'
+        # (*, */2...) não restringe; 1-31 ou 0-6 contam como restrição
+        self._any_day = fields[2].startswith('*')
+        self._any_weekday = fields[4].startswith('*')
+    
+    def _day_matches(self, day: date) -> bool:
+        """Verifica dia do mês, dia da semana e mês de uma data"""
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        # date.weekday(): segunda = 0; no cron, domingo = 0
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Próximo horário da expressão estritamente posterior a um instante
+        
+        Args:
+            moment: Instante de referência (horário local, sem fuso)
+        
+        Returns:
+            Próximo horário (minuto cheio, horário local)
+        
+        Raises:
+            ValueError: Se a expressão nunca ocorre (ex.: 31 de fevereiro)
+        """
+        candidate = (moment + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        # Quatro anos cobrem expressões que só ocorrem em 29 de fevereiro
+        for _ in range(366 * 4 + 1):
+            if self._day_matches(candidate.date()):
+                for hour in self.hours:
+                    if hour < candidate.hour:
+                        continue
+                    first_minute = candidate.minute if hour == candidate.hour else 0
+                    for minute in self.minutes:
+                        if minute >= first_minute:
+                            return candidate.replace(hour=hour, minute=minute)
+            candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Expressão cron sem ocorrência: '{self.expression}'")
+    
+    def __repr__(self) -> str:
+        return f"CronExpression('{self.expression}')"
+
+
+class ScheduledJob:
+    """Job agendado: nome, expressão cron e função que retorna True em caso de sucesso"""
+    
+    def __init__(self, name: str, cron: str, func: Callable[[], bool]):
+        """
+        Args:
+            name: Nome do job (usado nos logs)
+            cron: Expressão cron, interpretada no fuso do agendador
+            func: Função executada a cada ocorrência; retorna True se teve sucesso
+        
+        Raises:
+            ValueError: Se a expressão cron for inválida
+        """
+        self.name = name
+        self.cron = CronExpression(cron)
+        self.func = func
+        self.next_run: Optional[datetime] = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+    
+    def __repr__(self) -> str:
+        return f"ScheduledJob({self.name!r}, {self.cron.expression!r})"
+
+
+class Scheduler:
+    """
+    Agendador que executa os jobs em um pool de threads do próprio processo
+    
+    Os jobs reaproveitam o que o processo já tem aberto (pool PostgreSQL, sessão
+    HTTP, caches), em vez de iniciar um interpretador e reconectar a cada
+    execução. Um job não roda em paralelo com ele mesmo: se a execução
+    anterior ainda não terminou, a ocorrência é ignorada. Ocorrências perdidas
+    (processo parado) não são recuperadas, como no cron.
+    """
+    
+    def __init__(self, jobs: List[ScheduledJob], timezone: str = 'America/Sao_Paulo', workers: int = 2):
+        """
+        Inicializa o agendador
+        
+        Args:
+            jobs: Jobs agendados
+            timezone: Fuso horário (IANA) em que as expressões cron são interpretadas
+            workers: Máximo de jobs executados ao mesmo tempo
+        """
+        if workers < 1:
+            raise ValueError(f"Quantidade de workers inválida: {workers}")
+        self.jobs = list(jobs)
+        self.timezone = ZoneInfo(timezone)
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def _now(self) -> datetime:
+        """Horário atual no fuso do agendador"""
+        return datetime.now(self.timezone)
+    
+    def _schedule_next(self, job: ScheduledJob, after: datetime):
+        """Calcula a próxima execução do job após um instante"""
+        local = job.cron.next_after(after.astimezone(self.timezone).replace(tzinfo=None))
+        job.next_run = local.replace(tzinfo=self.timezone)
+    
+    def _run_job(self, job: ScheduledJob):
+        """Executa um job no worker, registrando duração e resultado"""
+        started = time.monotonic()
+        logger.info(f"▶️ Job {job.name} iniciado")
+        try:
+            success = bool(job.func())
+        except Exception as e:
+            logger.error(f"Job {job.name} falhou: {e}", exc_info=True)
+            success = False
+        elapsed = time.monotonic() - started
+        
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            if not success:
+                job.failures += 1
+        
+        if success:
+            logger.info(f"✅ Job {job.name} concluído em {elapsed:.2f}s (próximo: {job.next_run:%d/%m %H:%M})")
+        else:
+            logger.error(f"❌ Job {job.name} falhou após {elapsed:.2f}s (próximo: {job.next_run:%d/%m %H:%M})")
+    
+    def run_pending(self):
+        """Envia ao pool de threads os jobs cujo horário já chegou"""
+        now = self._now()
+        for job in self.jobs:
+            if job.next_run is None:
+                self._schedule_next(job, now)
+                continue
+            if job.next_run > now:
+                continue
+            
+            with self._lock:
+                busy = job.running
+                if busy:
+                    job.skipped += 1
+                else:
+                    job.running = True
+            
+            if busy:
+                logger.warning(f"Job {job.name} ainda em execução; ocorrência de {job.next_run:%H:%M} ignorada")
+            # O próximo horário é calculado antes da execução, a partir de agora
+            self._schedule_next(job, now)
+            if not busy:
+                self._executor.submit(self._run_job, job)
+    
+    def run_forever(self):
+        """Executa o agendador até stop() ser chamado"""
+        now = self._now()
+        for job in self.jobs:
+            self._schedule_next(job, now)
+            logger.info(f"   {job.name}: '{job.cron.expression}' (próximo: {job.next_run:%d/%m/%Y %H:%M %Z})")
+        
+        while not self._stop.is_set():
+            self.run_pending()
+            if self.jobs:
+                next_run = min(job.next_run for job in self.jobs)
+                wait = (next_run - self._now()).total_seconds()
+            else:
+                wait = MAX_SLEEP_SECONDS
+            self._stop.wait(min(max(wait, 0), MAX_SLEEP_SECONDS))
+    
+    def request_stop(self):
+        """Pede a parada do laço de run_forever (seguro em handlers de sinal)"""
+        self._stop.set()
+    
+    def stop(self, wait: bool = True):
+        """
+        Para o agendador e o pool de threads
+        
+        Args:
+            wait: Se True, aguarda os jobs em execução terminarem
+        """
+        self.request_stop()
+        self._executor.shutdown(wait=wait)
+    
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Retorna contadores de cada job
+        
+        Returns:
+            Dicionário nome -> execuções, falhas, ocorrências ignoradas e próxima execução
+        """
+        with self._lock:
+            return {
+                job.name: {
+                    'runs': job.runs,
+                    'failures': job.failures,
+                    'skipped': job.skipped,
+                    'next_run': job.next_run.isoformat() if job.next_run else None,
+                }
+                for job in self.jobs
+            }
@@ -0,0 +1,153 @@
+"""
+Micro-benchmark da formatação das mensagens
+Mede a vazão (linhas/s) da formatação de valores e datas, da montagem de mensagens
+e do formatador completo de contas a receber, sem acessar banco nem Evolution API
+Uso: python scripts/benchmark_formatting.py [--lines 100000] [--repeat 3] [--skip-legacy]
+"""
+import sys
+import os
+import argparse
+import logging
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import MessageBuilder, format_brl, format_date
+from clients import create_message_segmenter
+from accounts_receivable_dispatcher import AccountsReceivableDispatcher
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+# O aviso de mensagem dividida sairia a cada execução medida
+logging.getLogger('message_segmenter').setLevel(logging.WARNING)
+
+# Linha de detalhe de uma conta, no formato das mensagens
+DETAIL_LINE = "{idx}. *{partner}*\n   Doc: {move_name}\n   Valor: {amount}\n\n"
+
+
+def make_accounts(count: int) -> List[Dict]:
+    """Gera contas a receber sintéticas, com os campos da query de contas a receber"""
+    rng = random.Random(42)
+    return [
+        {
+            'partner_name': f"Cliente {i}",
+            'move_name': f"INV/2024/{i:06d}",
+            'move_ref': f"PED{i}" if i % 3 else '',
+            'amount_residual': Decimal(rng.randint(100, 10_000_000)) / 100,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(label: str, lines: int, func: Callable[[], object], repeat: int):
+    """
+    Executa uma função `repeat` vezes e registra o melhor tempo e a vazão
+    
+    Args:
+        label: Nome da medição
+        lines: Linhas processadas por execução
+        func: Função medida
+        repeat: Quantidade de execuções
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    logger.info(f"{label:<48} {best * 1000:>10.1f} ms {lines / best:>14,.0f} linhas/s")
+
+
+def legacy_brl(value) -> str:
+    """Formatação de valores anterior ao módulo formatting (inline nos dispatchers)"""
+    return f"R$ {value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def translate_brl(value, _table=str.maketrans(',.', '.,')) -> str:
+    """Alternativa com tabela de tradução pré-compilada (mais lenta; mantida para comparação)"""
+    return f"R$ {value:,.2f}".translate(_table)
+
+
+def legacy_build(accounts: List[Dict]) -> str:
+    """Montagem anterior: += em um texto guardado em dicionário (cópia a cada linha)"""
+    status_data = {'details': ''}
+    for idx, acc in enumerate(accounts, 1):
+        status_data['details'] += DETAIL_LINE.format(
+            idx=idx, partner=acc['partner_name'], move_name=acc['move_name'], amount=acc['amount_str']
+        )
+    return status_data['details']
+
+
+def builder_build(accounts: List[Dict]) -> str:
+    """Montagem com MessageBuilder (lista + join)"""
+    message = MessageBuilder()
+    for idx, acc in enumerate(accounts, 1):
+        message.add(DETAIL_LINE.format(
+            idx=idx, partner=acc['partner_name'], move_name=acc['move_name'], amount=acc['amount_str']
+        ))
+    return message.build()
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Micro-benchmark da formatação das mensagens")
+    parser.add_argument('--lines', type=int, default=100_000, help="Linhas por medição (padrão: 100000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Execuções por medição; vale a melhor (padrão: 3)")
+    parser.add_argument('--skip-legacy', action='store_true',
+                        help="Não mede a montagem antiga com +=, que é quadrática e leva dezenas de segundos")
+    args = parser.parse_args()
+    
+    lines = args.lines
+    accounts = make_accounts(lines)
+    amounts = [acc['amount_residual'] for acc in accounts]
+    float_amounts = [float(amount) for amount in amounts]
+    dates = [date(2024, 1, 1) + timedelta(days=i % 3650) for i in range(lines)]
+    for acc in accounts:
+        acc['amount_str'] = format_brl(acc['amount_residual'])
+    
+    logger.info(f"Benchmark de formatação: {lines:,} linhas, melhor de {args.repeat} execução(ões)")
+    logger.info("-" * 80)
+    
+    measure("format_brl (Decimal)", lines, lambda: [format_brl(v) for v in amounts], args.repeat)
+    measure("format_brl (float)", lines, lambda: [format_brl(v) for v in float_amounts], args.repeat)
+    measure("f-string + 3x replace (antigo, Decimal)", lines, lambda: [legacy_brl(v) for v in amounts], args.repeat)
+    measure("f-string + str.translate (Decimal)", lines, lambda: [translate_brl(v) for v in amounts], args.repeat)
+    measure("format_date", lines, lambda: [format_date(d) for d in dates], args.repeat)
+    measure("strftime('%d/%m/%Y') (antigo)", lines, lambda: [d.strftime('%d/%m/%Y') for d in dates], args.repeat)
+    logger.info("-" * 80)
+    
+    measure("MessageBuilder (lista + join)", lines, lambda: builder_build(accounts), args.repeat)
+    if args.skip_legacy:
+        logger.info(f"{'+= em dicionário (antigo)':<48} {'ignorado (--skip-legacy)':>27}")
+    else:
+        # Quadrática: uma execução basta
+        measure("+= em dicionário (antigo)", lines, lambda: legacy_build(accounts), 1)
+    logger.info("-" * 80)
+    
+    # Os métodos de formatação não usam os clientes; o dispatcher é criado sem conectar
+    dispatcher = AccountsReceivableDispatcher.__new__(AccountsReceivableDispatcher)
+    dispatcher.segmenter = create_message_segmenter()
+    due_date = date.today()
+    measure("format_accounts_receivable_message", lines,
+            lambda: dispatcher.format_accounts_receivable_message(accounts, due_date), args.repeat)
+    measure("format_accounts_receivable_parts (com divisão)", lines,
+            lambda: dispatcher.format_accounts_receivable_parts(accounts, due_date), args.repeat)
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Script para disparar contas a receber e contas a pagar com vencimento para hoje
+Busca as duas listas em uma única consulta e envia as duas mensagens no mesmo processo
+Use --force para reenviar relatórios já enviados hoje
+Executado via cron do Railway às 7:30 da manhã
+"""
+import sys
+import os
+import logging
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("dispatch_accounts_today")
+
+from accounts_dispatcher import AccountsDispatcher
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Função principal"""
+    logger.info("=" * 80)
+    logger.info("Disparo de Contas a Receber e a Pagar - Vencimento HOJE")
+    logger.info("=" * 80)
+    
+    # --force reenvia mesmo que os relatórios de hoje já constem no ledger de disparos
+    force = '--force' in sys.argv[1:]
+    if force:
+        logger.info("Modo --force: ignorando o ledger de disparos")
+    
+    dispatcher = None
+    try:
+        # Inicializa o dispatcher
+        dispatcher = AccountsDispatcher()
+        
+        success = dispatcher.dispatch_today(force=force)
+        
+        if success:
+            logger.info("✅ Disparo concluído com sucesso")
+            sys.exit(0)
+        else:
+            logger.error("❌ Falha no disparo")
+            sys.exit(1)
+            
+    except Exception as e:
+        logger.error(f"❌ Erro fatal: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        if dispatcher:
+            dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
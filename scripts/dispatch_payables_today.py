@@ -1,5 +1,6 @@
 """
 Script para disparar resumo de contas a pagar com vencimento para hoje
+Use --force para reenviar um relatório já enviado hoje
 Executado via cron do Railway às 7:30 da manhã
 """
 import sys
@@ -9,6 +10,10 @@ import logging
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("dispatch_payables_today")
+
 from accounts_payable_dispatcher import AccountsPayableDispatcher
 
 # Configuração de logging
@@ -29,6 +34,11 @@ def main():
     logger.info("Disparo de Contas a Pagar - Vencimento HOJE")
     logger.info("=" * 80)
     
+    # --force reenvia mesmo que o relatório de hoje já conste no ledger de disparos
+    force = '--force' in sys.argv[1:]
+    if force:
+        logger.info("Modo --force: ignorando o ledger de disparos")
+    
     dispatcher = None
     try:
         # Inicializa o dispatcher
@@ -37,7 +47,7 @@ def main():
         # Busca e envia resumo de contas a pagar para hoje
         logger.info("Buscando contas a pagar com vencimento para hoje")
         
-        success = dispatcher.send_payable_summary()
+        success = dispatcher.send_accounts_payable_summary(force=force)
         
         if success:
             logger.info("✅ Disparo concluído com sucesso")
@@ -0,0 +1,62 @@
+"""
+Script para disparar alertas incrementais de compras alteradas
+Envia apenas as compras alteradas desde a execução anterior (marca d'água local)
+Executado via cron do Railway a cada 5 minutos
+"""
+import sys
+import os
+import logging
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("dispatch_purchase_changes")
+
+from purchases_dispatcher import PurchasesDispatcher
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Função principal"""
+    logger.info("=" * 80)
+    logger.info("Alerta de Compras Alteradas")
+    logger.info("=" * 80)
+    
+    dispatcher = None
+    try:
+        # Inicializa o dispatcher
+        dispatcher = PurchasesDispatcher()
+        
+        # Busca e envia as compras alteradas desde a última execução
+        success = dispatcher.send_purchase_changes()
+        
+        if success:
+            logger.info("✅ Disparo concluído com sucesso")
+            sys.exit(0)
+        else:
+            logger.error("❌ Falha no disparo")
+            sys.exit(1)
+            
+    except Exception as e:
+        logger.error(f"❌ Erro fatal: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        if dispatcher:
+            dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
+
@@ -1,5 +1,6 @@
 """
 Script para disparar resumo de compras atualizadas no dia
+Use --force para reenviar um relatório já enviado hoje
 Executado via cron do Railway às 17:30
 """
 import sys
@@ -9,6 +10,10 @@ import logging
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("dispatch_purchases")
+
 from purchases_dispatcher import PurchasesDispatcher
 
 # Configuração de logging
@@ -29,6 +34,11 @@ def main():
     logger.info("Disparo de Compras Atualizadas - Hoje")
     logger.info("=" * 80)
     
+    # --force reenvia mesmo que o relatório de hoje já conste no ledger de disparos
+    force = '--force' in sys.argv[1:]
+    if force:
+        logger.info("Modo --force: ignorando o ledger de disparos")
+    
     dispatcher = None
     try:
         # Inicializa o dispatcher
@@ -37,7 +47,7 @@ def main():
         # Busca e envia resumo de compras atualizadas no dia
         logger.info("Buscando compras atualizadas no dia")
         
-        success = dispatcher.send_purchases_summary()
+        success = dispatcher.send_purchases_summary(force=force)
         
         if success:
             logger.info("✅ Disparo concluído com sucesso")
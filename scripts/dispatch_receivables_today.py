@@ -1,5 +1,6 @@
 """
 Script para disparar contas a receber com vencimento para hoje
+Use --force para reenviar um relatório já enviado hoje
 Executado via cron do Railway às 7:30 da manhã
 """
 import sys
@@ -10,6 +11,10 @@ from datetime import date
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("dispatch_receivables_today")
+
 from accounts_receivable_dispatcher import AccountsReceivableDispatcher
 
 # Configuração de logging
@@ -30,6 +35,11 @@ def main():
     logger.info("Disparo de Contas a Receber - Vencimento HOJE")
     logger.info("=" * 80)
     
+    # --force reenvia mesmo que o relatório de hoje já conste no ledger de disparos
+    force = '--force' in sys.argv[1:]
+    if force:
+        logger.info("Modo --force: ignorando o ledger de disparos")
+    
     dispatcher = None
     try:
         # Inicializa o dispatcher
@@ -39,7 +49,7 @@ def main():
         today = date.today()
         logger.info(f"Buscando contas a receber com vencimento para hoje ({today})")
         
-        success = dispatcher.send_accounts_receivable_notification(today, is_today=True)
+        success = dispatcher.send_accounts_receivable_notification(today, is_today=True, force=force)
         
         if success:
             logger.info("✅ Disparo concluído com sucesso")
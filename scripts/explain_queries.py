@@ -0,0 +1,269 @@
+"""
+Script de análise das queries dos dispatchers (EXPLAIN ANALYZE)
+Executa EXPLAIN (ANALYZE, BUFFERS) em todas as queries usadas nos disparos e
+aponta varreduras sequenciais e índices ausentes a criar no lado do Odoo
+Uso: python scripts/explain_queries.py
+"""
+import sys
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Tuple
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from clients import create_postgres_client
+from postgres_client import PostgresClient
+from accounts_receivable_dispatcher import AccountsReceivableDispatcher
+from accounts_payable_dispatcher import AccountsPayableDispatcher
+from accounts_dispatcher import AccountsDispatcher
+from purchases_dispatcher import PurchasesDispatcher
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Índices que atendem aos predicados das queries dos dispatchers: (tabela, colunas)
+RECOMMENDED_INDEXES = [
+    ('account_move_line', ('date_maturity',)),
+    ('account_move_line', ('move_id',)),
+    ('account_move_line', ('account_id',)),
+    ('purchase_order', ('write_date', 'id')),
+    ('purchase_order', ('create_date',)),
+]
+
+# Varreduras sequenciais que descartam menos linhas que isso são ignoradas (tabelas pequenas)
+SEQ_SCAN_MIN_ROWS_REMOVED = 1000
+
+
+class ExplainingClient:
+    """
+    Cliente que, no lugar de executar as queries dos dispatchers, coleta o plano
+    de execução de cada uma via EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+    """
+    
+    def __init__(self, postgres_client: PostgresClient, label: str):
+        """
+        Args:
+            postgres_client: Cliente PostgreSQL real
+            label: Nome da query analisada (usado no relatório)
+        """
+        self.postgres_client = postgres_client
+        self.label = label
+        self.plans = []
+    
+    def execute_query(self, query: str, params: tuple = None, row_mode: str = None,
+                      timeout: float = None, retry: bool = True) -> List[Dict]:
+        """Executa EXPLAIN da query, guarda o plano e retorna lista vazia"""
+        results = self.postgres_client.execute_query(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params, timeout=timeout, retry=retry
+        )
+        self.plans.append((self.label, results[0]['QUERY PLAN'][0]))
+        return []
+    
+    def execute_prepared(self, name: str, query: str, params: tuple = None, row_mode: str = None,
+                         timeout: float = None, retry: bool = True) -> List[Dict]:
+        """Prepared statements são analisados pela query original"""
+        return self.execute_query(query, params, timeout=timeout, retry=retry)
+
+
+def iter_plan_nodes(node: Dict):
+    """Percorre recursivamente os nós de um plano de execução"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def find_seq_scans(plan: Dict) -> List[Dict]:
+    """
+    Encontra varreduras sequenciais relevantes em um plano
+    
+    Args:
+        plan: Plano no formato JSON do EXPLAIN
+    
+    Returns:
+        Lista de dicts com relation, filter e rows_removed
+    """
+    seq_scans = []
+    for node in iter_plan_nodes(plan['Plan']):
+        if node.get('Node Type') != 'Seq Scan':
+            continue
+        rows_removed = node.get('Rows Removed by Filter', 0)
+        if rows_removed < SEQ_SCAN_MIN_ROWS_REMOVED:
+            continue
+        seq_scans.append({
+            'relation': node.get('Relation Name'),
+            'filter': node.get('Filter', ''),
+            'rows_removed': rows_removed,
+        })
+    return seq_scans
+
+
+def get_existing_indexes(postgres_client: PostgresClient, tables: List[str]) -> Dict[str, List[Tuple[str, ...]]]:
+    """
+    Lista as colunas dos índices existentes nas tabelas informadas
+    
+    Args:
+        postgres_client: Cliente PostgreSQL
+        tables: Nomes das tabelas
+    
+    Returns:
+        Dict tabela -> lista de tuplas de colunas (na ordem do índice)
+    """
+    query = """
+        SELECT
+            t.relname as table_name,
+            i.relname as index_name,
+            array_agg(a.attname ORDER BY k.ord) as columns
+        FROM pg_index ix
+        INNER JOIN pg_class t ON t.oid = ix.indrelid
+        INNER JOIN pg_class i ON i.oid = ix.indexrelid
+        INNER JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord) ON true
+        INNER JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE t.relname = ANY(%s)
+        GROUP BY t.relname, i.relname
+    """
+    
+    indexes = {table: [] for table in tables}
+    for row in postgres_client.execute_query(query, (list(tables),)):
+        indexes[row['table_name']].append(tuple(row['columns']))
+    return indexes
+
+
+def find_missing_indexes(existing: Dict[str, List[Tuple[str, ...]]]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Compara os índices recomendados com os existentes
+    
+    Um índice existente atende à recomendação se começar pelas mesmas colunas.
+    
+    Returns:
+        Lista de (tabela, colunas) sem índice correspondente
+    """
+    missing = []
+    for table, columns in RECOMMENDED_INDEXES:
+        covered = any(
+            index_columns[:len(columns)] == columns
+            for index_columns in existing.get(table, [])
+        )
+        if not covered:
+            missing.append((table, columns))
+    return missing
+
+
+def collect_plans(postgres_client: PostgresClient) -> List[Tuple[str, Dict]]:
+    """
+    Executa as buscas de todos os dispatchers coletando os planos de execução
+    
+    Returns:
+        Lista de (nome da query, plano)
+    """
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    
+    receivable_dispatcher = AccountsReceivableDispatcher(postgres_client)
+    payable_dispatcher = AccountsPayableDispatcher(postgres_client)
+    purchases_dispatcher = PurchasesDispatcher(postgres_client)
+    accounts_dispatcher = AccountsDispatcher()
+    
+    checks = [
+        (receivable_dispatcher, 'Contas a receber (hoje)',
+         lambda: receivable_dispatcher.get_accounts_receivable_by_due_date(today)),
+        (receivable_dispatcher, 'Contas a receber (amanhã)',
+         lambda: receivable_dispatcher.get_accounts_receivable_by_due_date(tomorrow)),
+        (payable_dispatcher, 'Contas a pagar (detalhe)',
+         payable_dispatcher.get_accounts_payable_for_today),
+        (payable_dispatcher, 'Contas a pagar (resumo por empresa)',
+         payable_dispatcher.get_accounts_payable_summary_for_today),
+        (accounts_dispatcher, 'Contas a receber e a pagar (consulta única)',
+         lambda: accounts_dispatcher.get_open_accounts_by_due_date(today)),
+        (purchases_dispatcher, 'Compras atualizadas no dia',
+         purchases_dispatcher.get_purchases_updated_today),
+        (purchases_dispatcher, 'Compras alteradas (feed incremental)',
+         lambda: purchases_dispatcher.get_purchases_changed_since(
+             (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1), 0), settings.PURCHASES_FEED_PAGE_SIZE
+         )),
+    ]
+    
+    plans = []
+    try:
+        for dispatcher, label, fetch in checks:
+            original_client = dispatcher.postgres_client
+            explaining_client = ExplainingClient(original_client, label)
+            dispatcher.postgres_client = explaining_client
+            try:
+                fetch()
+            except Exception as e:
+                logger.error(f"Erro ao analisar '{label}': {e}")
+            finally:
+                dispatcher.postgres_client = original_client
+            if not explaining_client.plans:
+                logger.error(f"Nenhum plano coletado para '{label}'")
+            plans.extend(explaining_client.plans)
+    finally:
+        for dispatcher in (receivable_dispatcher, payable_dispatcher, purchases_dispatcher, accounts_dispatcher):
+            dispatcher.close()
+    return plans
+
+
+def main():
+    """Função principal"""
+    logger.info("=" * 80)
+    logger.info("Análise das Queries dos Dispatchers (EXPLAIN ANALYZE)")
+    logger.info("=" * 80)
+    
+    postgres_client = None
+    try:
+        postgres_client = create_postgres_client()
+        plans = collect_plans(postgres_client)
+        
+        for label, plan in plans:
+            root = plan['Plan']
+            logger.info("")
+            logger.info(f"📊 {label}")
+            logger.info(f"   Tempo de execução: {plan.get('Execution Time', 0):.2f} ms "
+                        f"(planejamento: {plan.get('Planning Time', 0):.2f} ms)")
+            logger.info(f"   Linhas: {root.get('Actual Rows', 0)} | Buffers: "
+                        f"{root.get('Shared Hit Blocks', 0)} em cache, {root.get('Shared Read Blocks', 0)} lidos do disco")
+            
+            seq_scans = find_seq_scans(plan)
+            for seq_scan in seq_scans:
+                logger.warning(f"   ⚠️ Seq Scan em {seq_scan['relation']}: {seq_scan['rows_removed']} linha(s) "
+                               f"descartada(s) pelo filtro {seq_scan['filter']}")
+            if not seq_scans:
+                logger.info("   ✅ Nenhuma varredura sequencial relevante")
+        
+        tables = sorted({table for table, _ in RECOMMENDED_INDEXES})
+        missing = find_missing_indexes(get_existing_indexes(postgres_client, tables))
+        
+        logger.info("")
+        logger.info("=" * 80)
+        if missing:
+            logger.warning(f"⚠️ {len(missing)} índice(s) recomendado(s) ausente(s). Criar no banco do Odoo:")
+            for table, columns in missing:
+                index_name = f"{table}_{'_'.join(columns)}_dispatch_idx"
+                logger.warning(f"   CREATE INDEX CONCURRENTLY {index_name} ON {table} ({', '.join(columns)});")
+        else:
+            logger.info("✅ Todos os índices recomendados já existem")
+        logger.info("=" * 80)
+        
+        sys.exit(0)
+    
+    except Exception as e:
+        logger.error(f"❌ Erro fatal: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        if postgres_client:
+            postgres_client.close()
+
+
+if __name__ == "__main__":
+    main()
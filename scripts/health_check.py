@@ -12,11 +12,11 @@ import subprocess
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import (
-    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB,
-    POSTGRES_USER, POSTGRES_PASSWORD,
-    EVOLUTION_API_URL, EVOLUTION_API_KEY, EVOLUTION_INSTANCE
-)
+# Perfil de inicialização (STARTUP_PROFILE=1): antes dos imports do projeto para medi-los
+import startup_profiler
+startup_profiler.start("health_check")
+
+from config import settings, ConfigurationError
 
 # Configuração de logging
 logging.basicConfig(
@@ -71,6 +71,7 @@ def test_imports():
     
     try:
         from postgres_client import PostgresClient
+        from async_postgres_client import AsyncPostgresClient
         from whatsapp_client import WhatsAppClient
         from accounts_receivable_dispatcher import AccountsReceivableDispatcher
         from accounts_payable_dispatcher import AccountsPayableDispatcher
@@ -88,28 +89,25 @@ def test_config():
     logger.info("TESTE 2: Configurações")
     
     config_ok = True
-    missing = []
-    
-    required_configs = [
-        ('POSTGRES_HOST', POSTGRES_HOST),
-        ('POSTGRES_PORT', POSTGRES_PORT),
-        ('POSTGRES_DB', POSTGRES_DB),
-        ('POSTGRES_USER', POSTGRES_USER),
-        ('POSTGRES_PASSWORD', POSTGRES_PASSWORD),
-        ('EVOLUTION_API_URL', EVOLUTION_API_URL),
-        ('EVOLUTION_API_KEY', EVOLUTION_API_KEY),
-        ('EVOLUTION_INSTANCE', EVOLUTION_INSTANCE),
-    ]
+    errors = []
     
-    for name, value in required_configs:
-        if not value or value == 'XYZ':
-            missing.append(name)
+    # Cada subsistema é validado separadamente: a falta das variáveis da
+    # Evolution API não esconde um problema nas do PostgreSQL, e vice-versa
+    for subsystem in ('postgres', 'evolution'):
+        try:
+            settings.validate(subsystem)
+        except ConfigurationError as e:
+            errors.append(f"{subsystem}: {str(e).splitlines()[0].lstrip('❌ ')}")
             config_ok = False
     
+    if config_ok and settings.POSTGRES_HOST == 'XYZ':
+        errors.append("postgres: POSTGRES_HOST com valor de exemplo")
+        config_ok = False
+    
     if config_ok:
         log_test_result("Configurações", True, "Todas as configurações estão presentes")
     else:
-        log_test_result("Configurações", False, f"Configurações faltando: {', '.join(missing)}")
+        log_test_result("Configurações", False, f"Configurações faltando: {'; '.join(errors)}")
     
     return config_ok
 
@@ -119,19 +117,13 @@ def test_postgres_connection():
     logger.info("TESTE 3: Conexão PostgreSQL")
     
     try:
-        from postgres_client import PostgresClient
+        from clients import create_postgres_client
         
-        client = PostgresClient(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD
-        )
+        client = create_postgres_client()
         
         if client.test_connection():
             log_test_result("Conexão PostgreSQL", True, 
-                          f"Conectado a {POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}")
+                          f"Conectado a {settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}")
             client.close()
             return True
         else:
@@ -149,15 +141,9 @@ def test_postgres_query():
     logger.info("TESTE 4: Query PostgreSQL")
     
     try:
-        from postgres_client import PostgresClient
+        from clients import create_postgres_client
         
-        client = PostgresClient(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD
-        )
+        client = create_postgres_client()
         
         query = "SELECT 1 as test"
         results = client.execute_query(query)
@@ -177,46 +163,35 @@ def test_postgres_query():
 
 
 def test_dispatchers_queries():
-    """Testa se os dispatchers conseguem buscar dados"""
+    """Testa se as queries dos dispatchers executam (disparadas em paralelo)"""
     logger.info("TESTE 5: Queries dos Dispatchers")
     
     all_passed = True
     
     try:
-        # Testa Accounts Receivable
-        from accounts_receivable_dispatcher import AccountsReceivableDispatcher
-        dispatcher_receivable = AccountsReceivableDispatcher()
-        today = date.today()
-        accounts = dispatcher_receivable.get_accounts_receivable_by_due_date(today)
-        log_test_result("Query Contas a Receber", True, 
-                       f"Query executada. Encontradas {len(accounts)} conta(s)")
-        dispatcher_receivable.close()
-    except Exception as e:
-        log_test_result("Query Contas a Receber", False, f"Erro: {str(e)}")
-        all_passed = False
-    
-    try:
-        # Testa Accounts Payable
-        from accounts_payable_dispatcher import AccountsPayableDispatcher
-        dispatcher_payable = AccountsPayableDispatcher()
-        accounts = dispatcher_payable.get_accounts_payable_for_today()
-        log_test_result("Query Contas a Pagar", True, 
-                       f"Query executada. Encontradas {len(accounts)} conta(s)")
-        dispatcher_payable.close()
-    except Exception as e:
-        log_test_result("Query Contas a Pagar", False, f"Erro: {str(e)}")
-        all_passed = False
-    
-    try:
-        # Testa Purchases
-        from purchases_dispatcher import PurchasesDispatcher
-        dispatcher_purchases = PurchasesDispatcher()
-        purchases = dispatcher_purchases.get_purchases_updated_today()
-        log_test_result("Query Compras", True, 
-                       f"Query executada. Encontradas {len(purchases)} compra(s)")
-        dispatcher_purchases.close()
+        from clients import create_async_postgres_client
+        
+        with create_async_postgres_client() as client:
+            checks = {
+                "Query Contas a Receber": (client.get_accounts_receivable_by_due_date(date.today()), "conta(s)"),
+                "Query Contas a Pagar": (client.get_accounts_payable_for_today(), "conta(s)"),
+                "Query Compras": (client.get_purchases_updated_today(), "compra(s)"),
+            }
+            results = client.gather_sync(
+                {name: fetch for name, (fetch, _) in checks.items()}, return_exceptions=True
+            )
+            logger.info(f"Prepared statements: {client.client.prepared_stats()}")
+            client.client.close()
+        
+        for name, (_, unit) in checks.items():
+            result = results[name]
+            if isinstance(result, Exception):
+                log_test_result(name, False, f"Erro: {str(result)}")
+                all_passed = False
+            else:
+                log_test_result(name, True, f"Query executada. Encontradas {len(result)} {unit}")
     except Exception as e:
-        log_test_result("Query Compras", False, f"Erro: {str(e)}")
+        log_test_result("Queries dos Dispatchers", False, f"Erro: {str(e)}")
         all_passed = False
     
     return all_passed
@@ -227,16 +202,12 @@ def test_whatsapp_client():
     logger.info("TESTE 6: Cliente WhatsApp")
     
     try:
-        from whatsapp_client import WhatsAppClient
-        
-        client = WhatsAppClient(
-            api_url=EVOLUTION_API_URL,
-            api_key=EVOLUTION_API_KEY,
-            instance=EVOLUTION_INSTANCE
-        )
+        from clients import create_whatsapp_client
         
-        # Testa se consegue verificar o status da instância
-        status = client.check_instance_status()
+        with create_whatsapp_client() as client:
+            # Testa se consegue verificar o status da instância
+            status = client.check_instance_status()
+            logger.info(f"Conexões HTTP com a Evolution API: {client.connection_stats()}")
         if status:
             log_test_result("Cliente WhatsApp", True, "Cliente inicializado e instância verificada")
         else:
@@ -250,6 +221,20 @@ def test_whatsapp_client():
         return False
 
 
+def log_pool_stats():
+    """Registra os contadores do pool PostgreSQL compartilhado (conexões criadas vs. reutilizadas)"""
+    try:
+        from postgres_client import shared_pool_stats
+        
+        for target, stats in shared_pool_stats().items():
+            logger.info(
+                f"Pool PostgreSQL {target}: {stats['created']} conexão(ões) criada(s), "
+                f"{stats['reused']} reutilizada(s), {stats['discarded']} descartada(s)"
+            )
+    except Exception as e:
+        logger.debug(f"Não foi possível obter estatísticas do pool: {e}")
+
+
 def send_discord_notification_on_failure():
     """Envia notificação Discord em caso de falha"""
     webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
@@ -321,6 +306,14 @@ def send_discord_notification_on_failure():
 
 def main():
     """Função principal"""
+    global tests_passed, tests_failed
+    
+    # Zera os contadores: no agendador (main.py) o health check roda várias vezes no mesmo processo
+    tests_passed = 0
+    tests_failed = 0
+    test_results.clear()
+    test_output_lines.clear()
+    
     logger.info("=" * 80)
     logger.info("HEALTH CHECK - Sistema de Notificações Odoo")
     logger.info("=" * 80)
@@ -331,8 +324,14 @@ def main():
     test_imports()
     test_config()
     
-    # Só testa conexões se as configs estiverem ok
-    if POSTGRES_HOST and POSTGRES_HOST != 'XYZ':
+    # Só testa conexões se as configs do PostgreSQL estiverem ok
+    try:
+        settings.validate('postgres')
+        postgres_ok = settings.POSTGRES_HOST != 'XYZ'
+    except ConfigurationError:
+        postgres_ok = False
+    
+    if postgres_ok:
         test_postgres_connection()
         test_postgres_query()
         test_dispatchers_queries()
@@ -341,6 +340,7 @@ def main():
     
     # Resumo final
     logger.info("")
+    log_pool_stats()
     logger.info("=" * 80)
     logger.info("RESUMO DO HEALTH CHECK")
     logger.info("=" * 80)
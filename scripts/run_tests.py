@@ -206,8 +206,9 @@ def test_message_formatting():
         else:
             message = dispatcher.format_accounts_receivable_message(accounts, today, is_today=True)
             if message:
+                parts = dispatcher.format_accounts_receivable_parts(accounts, today, is_today=True)
                 test_result("Formatação de Mensagens", True, 
-                           f"Mensagem formatada com sucesso ({len(message)} caracteres)")
+                           f"Mensagem formatada com sucesso ({len(message)} caracteres, {len(parts)} parte(s))")
             else:
                 test_result("Formatação de Mensagens", False, "Mensagem não foi gerada")
                 dispatcher.close()
@@ -249,24 +250,18 @@ def test_scheduler_setup():
     print("-" * 80)
     
     try:
-        from accounts_receivable_dispatcher import AccountsReceivableDispatcher
-        import schedule
+        from main import WarmDispatchers, build_jobs
+        from scheduler import Scheduler
+        from config import SCHEDULER_TIMEZONE
         
-        dispatcher = AccountsReceivableDispatcher()
-        dispatcher.schedule_dispatches()
+        jobs = build_jobs(WarmDispatchers())
+        scheduler = Scheduler(jobs, timezone=SCHEDULER_TIMEZONE)
+        scheduler.run_pending()  # Apenas calcula o próximo horário de cada job
+        scheduler.stop()
         
-        # Verifica se os jobs foram agendados
-        jobs = schedule.jobs
-        if len(jobs) >= 2:
-            test_result("Configuração do Agendador", True, 
-                       f"{len(jobs)} job(s) agendado(s) com sucesso")
-        else:
-            test_result("Configuração do Agendador", False, 
-                       f"Esperado 2 jobs, encontrados {len(jobs)}")
-            dispatcher.close()
-            return False
-        
-        dispatcher.close()
+        next_runs = ", ".join(f"{job.name} {job.next_run:%d/%m %H:%M}" for job in jobs)
+        test_result("Configuração do Agendador", True, 
+                   f"{len(jobs)} job(s) agendado(s): {next_runs}")
         return True
         
     except Exception as e:
@@ -274,6 +269,39 @@ def test_scheduler_setup():
         return False
 
 
+def test_compact_client_moves():
+    """Testa as consultas de lançamentos com um cliente em row_mode='compact'"""
+    print("TESTE 9: Lançamentos com Cliente Compacto")
+    print("-" * 80)
+    
+    try:
+        from postgres_client import PostgresClient
+        
+        client = PostgresClient(
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT,
+            database=POSTGRES_DB,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+            row_mode='compact'
+        )
+        
+        # Esses métodos ajustam partner_id em cada linha, o que falharia com linhas compactas
+        recent = client.get_recent_moves(hours=24, limit=5)
+        client.get_moves_by_date_range(date.today() - timedelta(days=1), date.today(), limit=5)
+        client.get_moves_by_type('out_invoice', limit=5)
+        by_ids = client.get_moves_by_ids([move['id'] for move in recent])
+        client.close()
+        
+        test_result("Lançamentos com Cliente Compacto", True,
+                   f"Consultas executadas ({len(recent)} lançamento(s) recente(s), {len(by_ids)} por ID)")
+        return True
+        
+    except Exception as e:
+        test_result("Lançamentos com Cliente Compacto", False, f"Erro: {str(e)}")
+        return False
+
+
 def main():
     """Executa todos os testes"""
     global tests_passed, tests_failed
@@ -289,6 +317,7 @@ def main():
         test_accounts_receivable_query()
         test_message_formatting()
         test_scheduler_setup()
+        test_compact_client_moves()
     
     test_whatsapp_client()
     
@@ -0,0 +1,297 @@
+"""
+Perfil de inicialização (cold start) dos pontos de entrada
+Com STARTUP_PROFILE=1, mede o tempo de import de cada módulo, a leitura das configurações
+e o tempo até a primeira conexão/resposta do banco e a primeira resposta HTTP, gravando
+um registro JSON por execução
+
+Só usa a biblioteca padrão: precisa ser importado antes de config, dotenv, psycopg2 e
+requests para que os imports deles entrem na medição. Por isso STARTUP_PROFILE é lido
+direto do ambiente (não do .env).
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib.abc import MetaPathFinder
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Valores de STARTUP_PROFILE que ativam o perfil (mesmos de get_optional_env_bool)
+TRUE_VALUES = ('1', 'true', 'yes', 'sim', 'on')
+
+# Perfil da execução atual (None = desativado; as funções deste módulo viram no-op)
+_profile: Optional['StartupProfile'] = None
+
+
+def _process_age() -> Optional[float]:
+    """
+    Segundos desde a criação do processo, antes de qualquer código Python do projeto
+    
+    Returns:
+        Idade do processo (resolução de 10ms, via /proc), ou None fora do Linux
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # O nome do processo pode ter espaços; os campos seguintes vêm depois do ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        start_ticks = int(fields[19])
+        return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _time_next_exec(loader, profile: 'StartupProfile'):
+    """
+    Mede a próxima execução de import de um loader sem substituí-lo
+    
+    O loader original continua em spec.loader e em module.__loader__, então
+    isinstance() e importlib.reload() seguem funcionando: apenas o exec_module
+    da instância é sobreposto, e a sobreposição é desfeita na primeira chamada.
+    Loaders que são classes (BuiltinImporter, FrozenImporter) ou sem __dict__
+    não são medidos.
+    """
+    attributes = getattr(loader, '__dict__', None)
+    if isinstance(loader, type) or attributes is None or 'exec_module' in attributes:
+        return
+    exec_module = loader.exec_module
+    
+    def timed_exec_module(module):
+        attributes.pop('exec_module', None)
+        with profile.timing_import(module.__name__):
+            exec_module(module)
+    
+    attributes['exec_module'] = timed_exec_module
+
+
+class _ImportTimer(MetaPathFinder):
+    """Finder que delega aos demais e mede o exec_module dos módulos encontrados"""
+    
+    def __init__(self, profile: 'StartupProfile'):
+        self._profile = profile
+        self._local = threading.local()
+    
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, 'searching', False):
+            return None
+        self._local.searching = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        _time_next_exec(spec.loader, self._profile)
+                    return spec
+            return None
+        finally:
+            self._local.searching = False
+
+
+class StartupProfile:
+    """
+    Medições de uma execução: imports, fases (ex.: leitura de configuração) e marcos
+    (primeira ocorrência de um evento), em milissegundos desde o início do perfil
+    """
+    
+    def __init__(self, entry_point: str, output_file: Optional[str] = None):
+        """
+        Inicializa o perfil
+        
+        Args:
+            entry_point: Nome do ponto de entrada (ex.: "dispatch_purchases")
+            output_file: Arquivo JSON Lines de destino (padrão: STARTUP_PROFILE_FILE
+                ou $STATE_DIR/startup_profile.jsonl)
+        """
+        self.entry_point = entry_point
+        self.output_file = output_file
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.process_age = _process_age()
+        self.imports: Dict[str, List[float]] = {}
+        self.phases: Dict[str, float] = {}
+        self.milestones: Dict[str, float] = {}
+        self.finished = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._timer = _ImportTimer(self)
+    
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+    
+    def install(self):
+        """Passa a medir os imports seguintes"""
+        sys.meta_path.insert(0, self._timer)
+    
+    def uninstall(self):
+        """Para de medir imports"""
+        if self._timer in sys.meta_path:
+            sys.meta_path.remove(self._timer)
+    
+    @contextmanager
+    def timing_import(self, module_name: str):
+        """Mede o import de um módulo: tempo total e próprio (sem os imports aninhados)"""
+        stack = self._local.__dict__.setdefault('stack', [])
+        frame = [0.0]  # tempo gasto nos imports aninhados
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = (time.perf_counter() - start) * 1000
+            stack.pop()
+            if stack:
+                stack[-1][0] += total
+            with self._lock:
+                self.imports[module_name] = [round(total, 3), round(total - frame[0], 3)]
+    
+    def add_phase(self, name: str, elapsed_ms: float):
+        """Soma a duração de uma fase"""
+        with self._lock:
+            self.phases[name] = round(self.phases.get(name, 0.0) + elapsed_ms, 3)
+    
+    def add_milestone(self, name: str):
+        """Registra um marco (apenas a primeira ocorrência)"""
+        with self._lock:
+            if name not in self.milestones:
+                self.milestones[name] = round(self._elapsed_ms(), 3)
+    
+    def record(self) -> Dict:
+        """
+        Monta o registro estruturado da execução
+        
+        Returns:
+            Dicionário serializável em JSON
+        """
+        with self._lock:
+            modules = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+            # A soma dos tempos próprios é o tempo total gasto em imports, sem contar duas vezes os aninhados
+            import_ms = sum(self_ms for _, (_, self_ms) in modules)
+            return {
+                'entry_point': self.entry_point,
+                'started_at': self.started_at.isoformat(),
+                'release': os.getenv('RAILWAY_GIT_COMMIT_SHA') or os.getenv('RELEASE'),
+                'python': sys.version.split()[0],
+                'pid': os.getpid(),
+                'interpreter_ms': round(self.process_age * 1000, 1) if self.process_age is not None else None,
+                'total_ms': round(self._elapsed_ms(), 3),
+                'imports': {
+                    'count': len(modules),
+                    'total_ms': round(import_ms, 3),
+                    'modules': [[name, total, self_ms] for name, (total, self_ms) in modules],
+                },
+                'phases': dict(self.phases),
+                'milestones': dict(self.milestones),
+            }
+    
+    def _default_output_file(self) -> str:
+        """Arquivo de destino quando não informado"""
+        output_file = os.getenv('STARTUP_PROFILE_FILE', '').strip()
+        if output_file:
+            return output_file
+        from config import settings
+        return os.path.join(settings.STATE_DIR, 'startup_profile.jsonl')
+    
+    def finish(self) -> Optional[Dict]:
+        """
+        Encerra o perfil e grava o registro (uma linha JSON) no arquivo de destino
+        
+        Returns:
+            Registro gravado, ou None se o perfil já foi encerrado
+        """
+        with self._lock:
+            if self.finished:
+                return None
+            self.finished = True
+        self.uninstall()
+        self.add_milestone('finish')
+        record = self.record()
+        
+        try:
+            output_file = self.output_file or self._default_output_file()
+            directory = os.path.dirname(output_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(output_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o perfil de inicialização: {e}")
+            output_file = None
+        
+        slowest = ', '.join(f"{name} {total:.0f}ms" for name, total, _ in record['imports']['modules'][:5])
+        logger.info(
+            f"⏱️ Perfil de inicialização ({self.entry_point}): total {record['total_ms']:.0f}ms, "
+            f"imports {record['imports']['total_ms']:.0f}ms ({record['imports']['count']} módulos), "
+            f"marcos {record['milestones']}; imports mais lentos: {slowest}"
+            + (f" -> {output_file}" if output_file else "")
+        )
+        return record
+
+
+def is_enabled() -> bool:
+    """Indica se STARTUP_PROFILE está ativado no ambiente"""
+    return os.getenv('STARTUP_PROFILE', '').strip().lower() in TRUE_VALUES
+
+
+def start(entry_point: str, output_file: Optional[str] = None) -> Optional[StartupProfile]:
+    """
+    Inicia o perfil da execução, se STARTUP_PROFILE estiver ativado
+    
+    Deve ser chamado no início do ponto de entrada, antes dos imports do projeto.
+    O registro é gravado em finish() ou, se ele não for chamado, ao fim do processo.
+    
+    Args:
+        entry_point: Nome do ponto de entrada
+        output_file: Arquivo JSON Lines de destino (opcional)
+    
+    Returns:
+        Perfil iniciado, ou None se desativado
+    """
+    global _profile
+    if _profile is not None or not is_enabled():
+        return _profile
+    _profile = StartupProfile(entry_point, output_file)
+    _profile.install()
+    atexit.register(_profile.finish)
+    return _profile
+
+
+def finish() -> Optional[Dict]:
+    """
+    Grava o registro da execução (no-op se o perfil estiver desativado ou já encerrado)
+    
+    Returns:
+        Registro gravado, ou None
+    """
+    if _profile is None:
+        return None
+    return _profile.finish()
+
+
+@contextmanager
+def phase(name: str):
+    """Mede a duração de um bloco como fase do perfil (no-op se desativado)"""
+    profile = _profile
+    if profile is None or profile.finished:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, (time.perf_counter() - start_time) * 1000)
+
+
+def milestone(name: str):
+    """Registra a primeira ocorrência de um evento (no-op se desativado)"""
+    profile = _profile
+    if profile is not None and not profile.finished:
+        profile.add_milestone(name)
@@ -0,0 +1,72 @@
+"""
+Marca d'água persistente para leituras incrementais
+Guarda a última posição (write_date, id) processada em um arquivo JSON local,
+para que cada execução busque apenas as linhas alteradas desde a anterior
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Watermark:
+    """Posição (write_date, id) da última linha processada de um feed incremental"""
+    
+    def __init__(self, path: str):
+        """
+        Inicializa a marca d'água
+        
+        Args:
+            path: Caminho do arquivo JSON onde a posição é gravada
+        """
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def get(self) -> Optional[Tuple[datetime, int]]:
+        """
+        Lê a posição gravada
+        
+        Returns:
+            Tupla (write_date, id), ou None se ainda não houver posição
+            (arquivo ausente ou corrompido)
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return None
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                return datetime.fromisoformat(data['write_date']), int(data['id'])
+            except Exception as e:
+                logger.warning(f"Marca d'água ignorada ({self.path}): {e}")
+                return None
+    
+    def set(self, write_date: datetime, record_id: int):
+        """
+        Grava a posição de forma atômica
+        
+        Args:
+            write_date: write_date da última linha processada
+            record_id: id da última linha processada
+            
+        Raises:
+            OSError: Se não for possível gravar o arquivo
+        """
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'write_date': write_date.isoformat(), 'id': record_id}, f)
+            os.replace(tmp_path, self.path)
+    
+    def reset(self):
+        """Apaga a posição gravada (a próxima leitura recomeça do ponto inicial)"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -2,16 +2,162 @@
 Cliente para integração com Evolution API para envio de mensagens WhatsApp
 """
 import requests
+from requests.adapters import HTTPAdapter
+import json
 import logging
-from typing import Optional, Dict
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Iterator, Tuple
+
+import startup_profiler
+from circuit_breaker import CircuitBreaker
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+# Timeout padrão de cada requisição à Evolution API em segundos
+REQUEST_TIMEOUT = 30
+
+# Status HTTP que indicam que a variante de URL não existe nesta instalação da Evolution API
+ENDPOINT_NOT_FOUND_STATUSES = (404, 405)
+
+# Status HTTP temporários, que justificam nova tentativa
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Classifica um erro de requisição como temporário (repetível) ou definitivo
+    
+    Timeouts, falhas de conexão, 429 e 5xx são temporários; demais 4xx e
+    respostas inválidas são definitivos.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.exceptions.HTTPError) and response is not None:
+        return response.status_code in RETRYABLE_STATUSES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Lê o cabeçalho Retry-After da resposta de erro, em segundos ou data HTTP
+    
+    Returns:
+        Segundos a aguardar ou None se o cabeçalho não existir ou for inválido
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_wrong_endpoint_error(error: Exception) -> bool:
+    """Indica se o erro significa que a URL usada não é a variante correta do endpoint"""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in ENDPOINT_NOT_FOUND_STATUSES
+
+
+def _mark_first_response(response, *args, **kwargs):
+    """Hook de resposta da sessão: registra o primeiro byte recebido da Evolution API"""
+    startup_profiler.milestone('first_http_response')
+
+
+class EndpointCache:
+    """
+    Cache das variantes de URL da Evolution API que funcionaram
+    
+    Mantém os endpoints descobertos em memória e, se um caminho for informado,
+    em um arquivo JSON para reaproveitamento entre execuções dos cron jobs.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Inicializa o cache
+        
+        Args:
+            path: Caminho do arquivo JSON de cache (None para cache apenas em memória)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = self._load()
+    
+    def _load(self) -> Dict[str, str]:
+        """Carrega o cache do disco, ignorando arquivo ausente ou corrompido"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.warning(f"Cache de endpoints ignorado ({self.path}): {e}")
+            return {}
+    
+    def _save(self):
+        """Grava o cache no disco de forma atômica"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache de endpoints ({self.path}): {e}")
+    
+    def get(self, key: str) -> Optional[str]:
+        """Retorna a URL em cache para a chave, se houver"""
+        with self._lock:
+            return self._entries.get(key)
+    
+    def set(self, key: str, url: str):
+        """Registra a URL que funcionou para a chave"""
+        with self._lock:
+            if self._entries.get(key) == url:
+                return
+            self._entries[key] = url
+            self._save()
+        logger.info(f"Endpoint da Evolution API descoberto: {url}")
+    
+    def invalidate(self, key: str):
+        """Remove a URL em cache para a chave"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
 
 class WhatsAppClient:
     """Cliente para enviar mensagens via Evolution API"""
     
-    def __init__(self, api_url: str, api_key: str, instance: str):
+    def __init__(self, api_url: str, api_key: str, instance: str,
+                 pool_connections: int = 4, pool_maxsize: int = 10, keep_alive: bool = True,
+                 endpoint_cache: Optional[EndpointCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         """
         Inicializa o cliente WhatsApp
         
@@ -19,61 +165,205 @@ class WhatsAppClient:
             api_url: URL base da API Evolution
             api_key: Chave de API
             instance: Nome da instância
+            pool_connections: Quantidade de hosts distintos mantidos no pool de conexões
+            pool_maxsize: Máximo de conexões simultâneas por host
+            keep_alive: Se True, reaproveita conexões HTTP entre requisições
+            endpoint_cache: Cache das variantes de URL descobertas (padrão: apenas em memória)
+            rate_limiter: Limitador de taxa aplicado a cada requisição (padrão: sem limite)
+            retry_policy: Política de novas tentativas para erros temporários
+                (padrão: RetryPolicy())
+            circuit_breaker: Circuit breaker da Evolution API; com o circuito aberto
+                os envios falham na hora com CircuitOpenError
         """
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
         self.instance = instance
+        self.pool_maxsize = pool_maxsize
         self.headers = {
             'apikey': api_key,
             'Content-Type': 'application/json'
         }
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+        
+        # Sessão persistente: reaproveita conexões TCP/TLS com a Evolution API
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers.update(self.headers)
+        # Primeira resposta da API no perfil de inicialização (no-op se desativado)
+        self.session.hooks['response'].append(_mark_first_response)
+        
+        self.endpoint_cache = endpoint_cache or EndpointCache()
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        
+        # Métricas de novas tentativas (atualizadas também pelas threads do cliente assíncrono)
+        self._stats_lock = threading.Lock()
+        self.retry_count = 0
+        self.retry_wait_time = 0.0
+        self.retries_exhausted = 0
     
-    def send_message(self, number: str, message: str) -> Dict:
+    def _send_text_urls(self) -> List[str]:
+        """Variantes conhecidas da URL de envio de texto da Evolution API"""
+        return [
+            f"{self.api_url}/{self.instance}/message/sendText",
+            f"{self.api_url}/{self.instance}/sendText",
+            f"{self.api_url}/message/sendText/{self.instance}",
+        ]
+    
+    def _status_urls(self) -> List[str]:
+        """Variantes conhecidas da URL de status da instância"""
+        return [
+            f"{self.api_url}/fetchInstances",
+            f"{self.api_url}/{self.instance}/status",
+            f"{self.api_url}/instance/fetchInstances",
+        ]
+    
+    def _cache_key(self, endpoint: str) -> str:
+        """Chave do cache de endpoints para esta API/instância"""
+        return f"{self.api_url}|{self.instance}|{endpoint}"
+    
+    def _candidate_urls(self, endpoint: str, variants: List[str]) -> Iterator[Tuple[str, bool]]:
         """
-        Envia uma mensagem de texto via WhatsApp
+        Ordena as variantes de URL, começando pela que está em cache
         
         Args:
-            number: Número do destinatário (formato: 5511999999999)
-            message: Texto da mensagem
+            endpoint: Nome lógico do endpoint (chave do cache)
+            variants: Variantes conhecidas da URL
             
         Returns:
-            Resposta da API
+            Iterador de tuplas (url, veio_do_cache)
         """
-        # Tenta diferentes formatos de URL da Evolution API
-        url_variants = [
-            f"{self.api_url}/{self.instance}/message/sendText",
-            f"{self.api_url}/{self.instance}/sendText",
-            f"{self.api_url}/message/sendText/{self.instance}",
-        ]
-        
-        payload = {
-            "number": number,
-            "text": message
-        }
+        cached = self.endpoint_cache.get(self._cache_key(endpoint))
+        if cached:
+            yield cached, True
+        for url in variants:
+            if url != cached:
+                yield url, False
+    
+    def _post_send_text(self, payload: Dict, timeout: float) -> Dict:
+        """
+        Faz uma tentativa de envio, descobrindo a variante de URL se necessário
         
+        Args:
+            payload: Corpo da requisição
+            timeout: Timeout da requisição em segundos
+            
+        Returns:
+            Resposta da API
+            
+        Raises:
+            requests.exceptions.RequestException: Erro mais relevante entre as URLs tentadas
+        """
+        # Usa a variante de URL já descoberta; só tenta as demais se ela deixar de existir
+        cache_key = self._cache_key('send_text')
         last_error = None
-        for url in url_variants:
+        for url, from_cache in self._candidate_urls('send_text', self._send_text_urls()):
             try:
                 logger.debug(f"Tentando enviar mensagem via: {url}")
-                response = requests.post(url, json=payload, headers=self.headers, timeout=30)
+                response = self.session.post(url, json=payload, timeout=timeout)
                 response.raise_for_status()
                 
                 result = response.json()
-                logger.info(f"Mensagem enviada com sucesso para {number}")
+                self.endpoint_cache.set(cache_key, url)
                 return result
             except requests.exceptions.RequestException as e:
-                last_error = e
+                # Um 404/405 só indica URL errada; qualquer outro erro é mais informativo
+                if last_error is None or not is_wrong_endpoint_error(e):
+                    last_error = e
                 logger.debug(f"Tentativa falhou com URL {url}: {e}")
                 if hasattr(e, 'response') and e.response is not None:
                     logger.debug(f"Resposta da API: {e.response.text}")
+                if from_cache:
+                    if not is_wrong_endpoint_error(e):
+                        # Endpoint correto, falha de outra natureza: não adianta testar outras URLs
+                        break
+                    logger.info(f"Endpoint em cache não encontrado ({url}), redescobrindo")
+                    self.endpoint_cache.invalidate(cache_key)
                 continue
         
-        # Se todas as tentativas falharam, lança o último erro
-        logger.error(f"Erro ao enviar mensagem para {number} após tentar todas as URLs: {last_error}")
-        if hasattr(last_error, 'response') and last_error.response is not None:
-            logger.error(f"Resposta da API: {last_error.response.text}")
         raise last_error or Exception("Falha ao enviar mensagem")
     
+    def send_message(self, number: str, message: str) -> Dict:
+        """
+        Envia uma mensagem de texto via WhatsApp
+        
+        Erros temporários (timeout, conexão, 429 e 5xx) são repetidos conforme a
+        política de retry, respeitando Retry-After; erros 4xx falham de imediato.
+        
+        Args:
+            number: Número do destinatário (formato: 5511999999999)
+            message: Texto da mensagem
+            
+        Returns:
+            Resposta da API
+        """
+        payload = {
+            "number": number,
+            "text": message
+        }
+        
+        # Com a Evolution API fora do ar, falha na hora em vez de esperar timeouts.
+        # O circuito conta envios, não tentativas: uma consulta aqui e um único
+        # registro de sucesso ou falha ao final, depois das novas tentativas
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            
+            # Respeita o limite de taxa a cada requisição (vale também para o cliente assíncrono)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(number)
+            
+            remaining = self.retry_policy.remaining(started)
+            timeout = REQUEST_TIMEOUT if remaining is None else max(1.0, min(REQUEST_TIMEOUT, remaining))
+            try:
+                result = self._post_send_text(payload, timeout)
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_success()
+                logger.info(f"Mensagem enviada com sucesso para {number}")
+                return result
+            except requests.exceptions.RequestException as e:
+                delay = None
+                retryable = is_retryable_error(e)
+                if retryable:
+                    delay = self.retry_policy.next_delay(attempt, started, retry_after_seconds(e))
+                
+                if delay is None:
+                    if self.circuit_breaker is not None:
+                        if retryable:
+                            self.circuit_breaker.record_failure()
+                        else:
+                            # Um 4xx mostra que a API está respondendo: não abre o circuito
+                            # e, se esta era a chamada de teste (half-open), o fecha
+                            self.circuit_breaker.record_success()
+                    if attempt > 1:
+                        with self._stats_lock:
+                            self.retries_exhausted += 1
+                    logger.error(f"Erro ao enviar mensagem para {number} após {attempt} tentativa(s): {e}")
+                    if hasattr(e, 'response') and e.response is not None:
+                        logger.error(f"Resposta da API: {e.response.text}")
+                    raise
+                
+                logger.warning(
+                    f"Falha temporária ao enviar para {number} ({e}). "
+                    f"Nova tentativa {attempt + 1}/{self.retry_policy.max_attempts} em {delay:.1f}s"
+                )
+                with self._stats_lock:
+                    self.retry_count += 1
+                    self.retry_wait_time += delay
+                time.sleep(delay)
+    
     def send_formatted_message(self, number: str, title: str, body: str) -> Dict:
         """
         Envia uma mensagem formatada (pode ser usada para templates)
@@ -96,19 +386,15 @@ class WhatsAppClient:
         Returns:
             True se a instância está ativa, False caso contrário
         """
-        # Tenta diferentes endpoints para verificar status
-        url_variants = [
-            f"{self.api_url}/fetchInstances",
-            f"{self.api_url}/{self.instance}/status",
-            f"{self.api_url}/instance/fetchInstances",
-        ]
-        
-        for url in url_variants:
+        # Tenta diferentes endpoints para verificar status, começando pelo já descoberto
+        cache_key = self._cache_key('status')
+        for url, from_cache in self._candidate_urls('status', self._status_urls()):
             try:
-                response = requests.get(url, headers=self.headers, timeout=30)
+                response = self.session.get(url, timeout=REQUEST_TIMEOUT)
                 response.raise_for_status()
                 
                 data = response.json()
+                self.endpoint_cache.set(cache_key, url)
                 
                 # Se a resposta é uma lista de instâncias
                 if isinstance(data, list):
@@ -127,9 +413,73 @@ class WhatsAppClient:
                 return False
             except Exception as e:
                 logger.debug(f"Erro ao verificar status da instância com URL {url}: {e}")
+                if from_cache:
+                    if not is_wrong_endpoint_error(e):
+                        break
+                    self.endpoint_cache.invalidate(cache_key)
                 continue
         
         # Se não conseguiu verificar, assume que está ok para não bloquear envios
         logger.warning("Não foi possível verificar o status da instância. Continuando...")
         return True
-
+    
+    def connection_stats(self) -> Dict:
+        """
+        Retorna contadores de conexões HTTP da sessão
+        
+        handshakes é a quantidade de conexões TCP/TLS abertas; requests é o total
+        de requisições feitas. Com keep-alive, handshakes fica bem abaixo de requests.
+        
+        Returns:
+            Dicionário com handshakes e requests
+        """
+        pools = self._adapter.poolmanager.pools
+        handshakes = 0
+        total_requests = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            handshakes += pool.num_connections
+            total_requests += pool.num_requests
+        return {
+            'handshakes': handshakes,
+            'requests': total_requests,
+        }
+    
+    def rate_limit_stats(self) -> Optional[Dict]:
+        """
+        Retorna métricas de espera do limitador de taxa
+        
+        Returns:
+            Dicionário com tempos de espera na fila ou None se não há limitador
+        """
+        return self.rate_limiter.stats() if self.rate_limiter is not None else None
+    
+    def retry_stats(self) -> Dict:
+        """
+        Retorna métricas de novas tentativas de envio
+        
+        Returns:
+            Dicionário com retries (novas tentativas feitas), retry_wait (segundos
+            aguardando entre tentativas) e exhausted (envios que falharam após repetir)
+        """
+        with self._stats_lock:
+            return {
+                'retries': self.retry_count,
+                'retry_wait': round(self.retry_wait_time, 3),
+                'exhausted': self.retries_exhausted,
+            }
+    
+    def close(self):
+        """Fecha a sessão HTTP e as conexões mantidas no pool"""
+        logger.debug(f"Fechando sessão WhatsApp ({self.connection_stats()})")
+        self.session.close()
+    
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()